@@ -8,6 +8,7 @@ import matplotlib.pyplot as plt
 
 from spl.linalg.stencil             import StencilVector, StencilMatrix
 from spl.linalg.iterative_solvers   import cg
+from spl.linalg                     import kernels
 from spl.fem.splines                import SplineSpace
 from spl.fem.tensor                 import TensorFemSpace
 from spl.fem.basic                  import FemField
@@ -291,6 +292,11 @@ def kernel( p1, p2, nq1, nq2, bs1, bs2, w1, w2, jac_mat, mat_m, mat_s ):
     mat_s : 4D array_like (p1+1, p2+1, 2*p1+1, 2*p2+1)
         Element stiffness matrix (in/out argument).
 
+    Notes
+    -----
+    The kernel is compiled with numba if the compiled backend is enabled
+    (see spl.linalg.kernels).
+
     """
     # Reset element matrices
     mat_m[:,:,:,:] = 0.
@@ -325,8 +331,10 @@ def kernel( p1, p2, nq1, nq2, bs1, bs2, w1, w2, jac_mat, mat_m, mat_s ):
                             # Mapping:
                             #  - from logical coordinates (x1,x2)
                             #  - to Cartesian coordinates (x,y)
-                            [[x_x1, x_x2],
-                             [y_x1, y_x2]] = jac_mat[q1,q2,:,:]
+                            x_x1 = jac_mat[q1,q2,0,0]
+                            x_x2 = jac_mat[q1,q2,0,1]
+                            y_x1 = jac_mat[q1,q2,1,0]
+                            y_x2 = jac_mat[q1,q2,1,1]
 
                             jac_det = x_x1*y_x2 - x_x2*y_x1
                             inv_jac_det = 1./jac_det
@@ -635,7 +643,7 @@ def main( *, test_case, ncells, degree, use_spline_mapping, c1_correction, visua
 
     # Build mass and stiffness matrices, and right-hand side vector
     t0 = time()
-    M, S = assemble_matrices( V, mapping, kernel )
+    M, S = assemble_matrices( V, mapping, kernels.jit( kernel ) if kernels.enabled else kernel )
     b  = assemble_rhs( V, mapping, model.rho )
     t1 = time()
     timing['assembly'] = t1-t0
@@ -237,12 +237,12 @@ def assemble_rhs( V, f ):
     # Data structure
     rhs = StencilVector( V.vector_space )
 
-    # Element range
-    support1, support2 = V.local_support
+    # Element range (no overlap between processes)
+    [sk1, sk2], [ek1, ek2] = V.local_domain
 
     # Build RHS
-    for k1 in support1:
-        for k2 in support2:
+    for k1 in range( sk1, ek1+1 ):
+        for k2 in range( sk2, ek2+1 ):
 
             # Get spline index, B-splines' values and quadrature weights
             is1 =   spans_1[k1]
@@ -268,11 +268,14 @@ def assemble_rhs( V, f ):
                             wvol = w1[q1] * w2[q2]
                             v   += bi_0 * f_quad[q1,q2] * wvol
 
-                    i1 = (is1-p1+il1) % n1
-                    i2 = (is2-p2+il2) % n2
+                    # Global index of test basis (may be in ghost region)
+                    i1 = is1-p1+il1
+                    i2 = is2-p2+il2
+
+                    rhs[i1, i2] += v
 
-                    if s1<=i1<=e1 and s2<=i2<=e2:
-                        rhs[i1, i2] += v
+    # Add contributions to ghost basis functions to the owner processes
+    rhs.accumulate_ghost_regions()
 
     # IMPORTANT: ghost regions must be up-to-date
     rhs.update_ghost_regions()
@@ -7,7 +7,7 @@ from spl.ddm.partition import mpi_compute_dims
 #===============================================================================
 class Cart():
 
-    def __init__( self, npts, pads, periods, reorder, comm=MPI.COMM_WORLD ):
+    def __init__( self, npts, pads, periods, reorder, comm=MPI.COMM_WORLD, nprocs=None ):
 
         # Check input arguments
         # TODO: check that arguments are identical across all processes
@@ -37,7 +37,13 @@ class Cart():
         # ...
         # Know the number of processes along each direction
 #        self._dims = MPI.Compute_dims( self._size, self._ndims )
-        mpi_dims, block_shape = mpi_compute_dims( self._size, npts, pads )
+        if nprocs is None:
+            mpi_dims, block_shape = mpi_compute_dims( self._size, npts, pads )
+        else:
+            # Given decomposition (e.g. same as another Cart object)
+            assert len( nprocs ) == self._ndims
+            assert np.prod( nprocs ) == self._size
+            mpi_dims = list( nprocs )
         self._dims = mpi_dims
         # ...
 
@@ -85,6 +91,10 @@ class Cart():
                 self._shift_info[ dimension, disp ] = \
                         self._compute_shift_info( dimension, disp )
 
+        # Distributed graph topology with all neighbors (created when needed)
+        self._comm_graph    = None
+        self._neighbor_info = None
+
         # Store arrays with all the starts and ends along each direction
         self._global_starts = [None]*self._ndims
         self._global_ends   = [None]*self._ndims
@@ -160,6 +170,18 @@ class Cart():
     def subcomm( self ):
         return self._subcomm
 
+    @property
+    def comm_graph( self ):
+        """
+        Distributed graph communicator (MPI_DIST_GRAPH_CREATE_ADJACENT) that
+        connects each process to all its 3^ndim-1 neighbors in the Cartesian
+        topology, including the diagonal ones. It is created on first access.
+
+        """
+        if self._comm_graph is None:
+            self._create_graph_topology()
+        return self._comm_graph
+
     #---------------------------------------------------------------------------
     def coords_exist( self, coords ):
 
@@ -170,6 +192,98 @@ class Cart():
 
         return self._shift_info[ direction, disp ]
 
+    #---------------------------------------------------------------------------
+    def get_neighbor_info( self ):
+        """
+        Get information for exchanging ghost regions with all neighbors at once,
+        using a neighborhood collective on the graph communicator 'comm_graph'.
+
+        The neighbors are identified by their offset o = (o_1, ..., o_n), with
+        o_i in {-1,0,1}, relative to the coordinates of the process. Each
+        process sends the part of its local data adjacent to the neighbor at
+        offset o, which the neighbor receives into its ghost region at offset
+        -o. Along non-periodic directions, neighbors that do not exist are
+        removed from the graph, hence the corresponding ghost regions are not
+        modified.
+
+        Returns
+        -------
+        info : dict
+            . 'sources'     : ranks of source processes in 'comm_graph'
+            . 'destinations': ranks of destination processes in 'comm_graph'
+            . 'recv_offsets': offsets of ghost regions receiving data from sources
+            . 'send_offsets': offsets of local data blocks sent to destinations
+            . 'buf_shape'   : dict, shape of send/recv subarrays for each offset
+            . 'send_starts' : dict, start location of send subarrays for each offset
+            . 'recv_starts' : dict, start location of recv subarrays for each offset
+
+        """
+        if self._neighbor_info is None:
+            self._create_graph_topology()
+        return self._neighbor_info
+
+    #---------------------------------------------------------------------------
+    def _create_graph_topology( self ):
+
+        # All non-zero offsets, in the same order on every process
+        offsets = [o for o in product( [-1,0,1], repeat=self._ndims ) if any( o )]
+
+        # Rank in Cartesian communicator of process with given coordinates
+        def rank_at( coords ):
+            coords = [c % d for c,d in zip( coords, self._dims )]
+            return self._comm_cart.Get_cart_rank( coords )
+
+        # The j-th message goes from process c to process c+o_j, which
+        # receives it from c = (c+o_j)-o_j: hence if two processes are connected
+        # by multiple edges (few processes along a periodic direction), the
+        # order of the messages is the same at the sender and at the receiver
+        sources      = []
+        destinations = []
+        recv_offsets = []
+        send_offsets = []
+        for o in offsets:
+            c_dest = [c+k for c,k in zip( self._coords, o )]
+            c_src  = [c-k for c,k in zip( self._coords, o )]
+            if self.coords_exist( c_dest ):
+                destinations.append( rank_at( c_dest ) )
+                send_offsets.append( o )
+            if self.coords_exist( c_src ):
+                sources.append( rank_at( c_src ) )
+                recv_offsets.append( tuple( -k for k in o ) )
+
+        # Shape and start location of send/recv subarrays for each offset
+        buf_shape   = {}
+        send_starts = {}
+        recv_starts = {}
+        for o in offsets:
+            shape  = []
+            sstart = []
+            rstart = []
+            for k,s,e,p in zip( o, self._starts, self._ends, self._pads ):
+                n = e-s+1
+                shape .append( n if k == 0 else p )
+                sstart.append( {-1: p, 0: p, 1: n  }[k] )
+                rstart.append( {-1: 0, 0: p, 1: n+p}[k] )
+            buf_shape  [o] = tuple( shape  )
+            send_starts[o] = tuple( sstart )
+            recv_starts[o] = tuple( rstart )
+
+        # Create distributed graph communicator
+        self._comm_graph = self._comm_cart.Create_dist_graph_adjacent(
+            sources      = sources,
+            destinations = destinations,
+            reorder      = False
+        )
+
+        # Store all information into dictionary
+        self._neighbor_info = {'sources'     : tuple( sources      ),
+                               'destinations': tuple( destinations ),
+                               'recv_offsets': tuple( recv_offsets ),
+                               'send_offsets': tuple( send_offsets ),
+                               'buf_shape'   : buf_shape,
+                               'send_starts' : send_starts,
+                               'recv_starts' : recv_starts}
+
     #---------------------------------------------------------------------------
     def _compute_shift_info( self, direction, disp ):
 
@@ -214,5 +328,9 @@ class Cart():
         for s in self._subcomm:
             s.Free()
 
+        # Destroy graph communicator
+        if self._comm_graph is not None:
+            self._comm_graph.Free()
+
         # Destroy Cartesian communicator
         self._comm_cart.Free()
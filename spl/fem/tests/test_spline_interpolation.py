@@ -77,6 +77,55 @@ def test_SplineInterpolation1D_cosine( ncells, degree, periodic ):
 
     assert max_norm_err < err_bound
 
+#===============================================================================
+@pytest.mark.serial
+@pytest.mark.parametrize( "nc1", [5,10,23] )
+@pytest.mark.parametrize( "nc2", [5,10,23] )
+@pytest.mark.parametrize( "deg1", range(1,5) )
+@pytest.mark.parametrize( "deg2", range(1,5) )
+
+def test_SplineInterpolation2D_exact( nc1, nc2, deg1, deg2 ):
+
+    domain1   = [-1.0, 0.8]
+    periodic1 = False
+
+    domain2   = [-0.9, 1.0]
+    periodic2 = False
+
+    # Random coefficients of 1D polynomial
+    poly_coeffs = np.random.random_sample( min(deg1,deg2)+1 ) # 0 <= c < 1
+    poly_coeffs = 1.0 - poly_coeffs                           # 0 < c <= 1
+
+    # 2D exact solution: 1D polynomial of linear combination z=x1-x2/2
+    f = lambda x1,x2 : horner( x1-0.5*x2, *poly_coeffs )
+
+    # 1D spline spaces along x1 and x2, on random grids
+    space1 = SplineSpace( degree=deg1, grid=random_grid( domain1, nc1, 0.1 ), periodic=periodic1 )
+    space2 = SplineSpace( degree=deg2, grid=random_grid( domain2, nc2, 0.1 ), periodic=periodic2 )
+
+    # Tensor-product 2D spline space, serial, and field
+    tensor_space = TensorFemSpace( space1, space2 )
+    tensor_field = FemField( tensor_space, 'T' )
+
+    # Interpolation data on Greville points
+    x1g = space1.greville
+    x2g = space2.greville
+
+    V     = tensor_space.vector_space
+    n1,n2 = V.npts
+    ug    = V.zeros()
+    ug[0:n1,0:n2] = f( *np.meshgrid( x1g, x2g, indexing='ij' ) )
+    ug.update_ghost_regions()
+
+    # Compute 2D spline interpolant
+    tensor_space.compute_interpolant( ug, tensor_field )
+
+    # Verify that solution is exact at Greville points
+    err = [ug[i1,i2] - tensor_field( x1g[i1], x2g[i2] ) for i1 in range( n1 ) for i2 in range( n2 )]
+    interp_error = max( abs( e ) for e in err )
+
+    assert interp_error < 1.0e-14
+
 #===============================================================================
 @pytest.mark.parallel
 @pytest.mark.parametrize( "nc1", [5,10,23] )
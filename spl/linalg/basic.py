@@ -34,6 +34,23 @@ class VectorSpace( metaclass=ABCMeta ):
 
         """
 
+    #-------------------------------------
+    # Concrete methods
+    #-------------------------------------
+    def empty( self ):
+        """
+        Get a new vector of the vector space V, whose components need not be
+        initialized. Subclasses may override this method to skip zero-filling;
+        by default it returns 'zeros()'.
+
+        Returns
+        -------
+        v : Vector
+            A new vector object with uninitialized components.
+
+        """
+        return self.zeros()
+
 #===============================================================================
 class Vector( metaclass=ABCMeta ):
     """
@@ -57,7 +74,7 @@ class Vector( metaclass=ABCMeta ):
         pass
 
     @abstractmethod
-    def copy( self ):
+    def copy( self, out=None ):
         pass
 
     @abstractmethod
@@ -88,6 +105,67 @@ class Vector( metaclass=ABCMeta ):
     def __isub__( self, v ):
         pass
 
+    #-------------------------------------
+    # Concrete methods
+    #-------------------------------------
+    def scale( self, a ):
+        """ In-place scaling: self <- a * self. Return self.
+            Subclasses may override it with a faster implementation.
+        """
+        self *= a
+        return self
+
+    def axpy( self, a, x ):
+        """ In-place update: self <- self + a * x. Return self.
+            Subclasses may override it with a faster implementation (the
+            default one allocates a temporary vector).
+        """
+        self += a * x
+        return self
+
+    def lincomb( self, a, x, b=0.0, y=None ):
+        """
+        In-place linear combination: self <- a * x + b * y.
+
+        No temporary vectors are allocated; 'x' and/or 'y' may coincide with
+        self.
+
+        Parameters
+        ----------
+        a : scalar
+            Coefficient of x.
+
+        x : Vector
+            First vector, in the same space as self.
+
+        b : scalar
+            Coefficient of y (ignored if y is None).
+
+        y : Vector
+            Second vector, in the same space as self (optional).
+
+        Returns
+        -------
+        self : Vector
+            The updated vector.
+
+        """
+        if y is None:
+            if x is not self:
+                x.copy( out=self )
+            return self.scale( a )
+
+        if x is self and y is self:
+            return self.scale( a+b )
+
+        if y is self:
+            a, x, b, y = b, y, a, x
+
+        if x is not self:
+            x.copy( out=self )
+        self.scale( a )
+        return self.axpy( b, y )
+
 Vector.register( ndarray )
 
 #===============================================================================
@@ -57,6 +57,20 @@ class ProductSpace( VectorSpace ):
     #--------------------------------------
     # Other properties/methods
     #--------------------------------------
+    def empty( self ):
+        """
+        Get a new BlockVector of the product space V = [V1, V2, ...], whose
+        blocks are obtained with 'Vi.empty()' (no initialization of data).
+
+        Returns
+        -------
+        v : BlockVector
+            A new vector object with uninitialized components.
+
+        """
+        return BlockVector( self, [Vi.empty() for Vi in self._spaces] )
+
+    # ...
     @property
     def spaces( self ):
         return self._spaces
@@ -114,8 +128,14 @@ class BlockVector( Vector ):
         return sum( b1.dot( b2 ) for b1,b2 in zip( self._blocks, v._blocks ) )
 
     #...
-    def copy( self ):
-        return BlockVector( self._space, [b.copy() for b in self._blocks] )
+    def copy( self, out=None ):
+        if out is None:
+            return BlockVector( self._space, [b.copy() for b in self._blocks] )
+        assert isinstance( out, BlockVector )
+        assert out._space is self._space
+        for b1,b2 in zip( self._blocks, out._blocks ):
+            b1.copy( out=b2 )
+        return out
 
     #...
     def __mul__( self, a ):
@@ -159,6 +179,20 @@ class BlockVector( Vector ):
             b1 -= b2
         return self
 
+    #...
+    def scale( self, a ):
+        for b in self._blocks:
+            b.scale( a )
+        return self
+
+    #...
+    def axpy( self, a, x ):
+        assert isinstance( x, BlockVector )
+        assert x._space is self._space
+        for b1,b2 in zip( self._blocks, x._blocks ):
+            b1.axpy( a, b2 )
+        return self
+
     #--------------------------------------
     # Other properties/methods
     #--------------------------------------
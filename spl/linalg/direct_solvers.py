@@ -1,15 +1,16 @@
 # coding: utf-8
 # Copyright 2018 Jalal Lakhlili, Yaman Güçlü
 
+import numpy as np
 from abc                 import abstractmethod
 from numpy               import ndarray
-from scipy.linalg.lapack import dgbtrf, dgbtrs
+from scipy.linalg.lapack import dgbtrf, dgbtrs, get_lapack_funcs
 from scipy.sparse        import spmatrix
 from scipy.sparse.linalg import splu
 
 from spl.linalg.basic    import LinearSolver
 
-__all__ = ['DirectSolver', 'BandedSolver', 'SparseSolver']
+__all__ = ['DirectSolver', 'BandedSolver', 'SparseSolver', 'DistributedBandedSolver']
 
 #===============================================================================
 class DirectSolver( LinearSolver ):
@@ -76,7 +77,26 @@ class BandedSolver ( DirectSolver ):
 
     #...
     def solve( self, rhs, out=None ):
-
+        """
+        Solve linear system for one or more right-hand sides.
+
+        Parameters
+        ----------
+        rhs : numpy.ndarray
+            Right-hand side b, with shape (n,) or (n, nrhs): in the latter
+            case all columns are solved with a single LAPACK call (DGBTRS),
+            ideally with Fortran ordering to avoid a copy.
+
+        out : numpy.ndarray
+            Solution x, with same shape as rhs (optional).
+
+        Returns
+        -------
+        out : numpy.ndarray
+            Solution x.
+
+        """
+        assert rhs.ndim in (1, 2)
         assert rhs.shape[0] == self._bmat.shape[1]
 
         if out is None:
@@ -115,7 +135,25 @@ class SparseSolver ( DirectSolver ):
 
     #...
     def solve( self, rhs, out=None ):
+        """
+        Solve linear system for one or more right-hand sides.
+
+        Parameters
+        ----------
+        rhs : numpy.ndarray
+            Right-hand side b, with shape (n,) or (n, nrhs): in the latter
+            case all columns are solved with a single call to SuperLU.
+
+        out : numpy.ndarray
+            Solution x, with same shape as rhs (optional).
+
+        Returns
+        -------
+        out : numpy.ndarray
+            Solution x.
 
+        """
+        assert rhs.ndim in (1, 2)
         assert rhs.shape[0] == self._splu.shape[1]
 
         if out is None:
@@ -128,5 +166,262 @@ class SparseSolver ( DirectSolver ):
         return out
 
 #===============================================================================
+class DistributedBandedSolver( DirectSolver ):
+    """
+    Solve the equation Ax = b for x, assuming A is banded matrix, with the rows
+    of b and x distributed among the processes of an MPI communicator (e.g. the
+    sub-communicator 'Cart.subcomm[d]' along one direction): b is not gathered.
+
+    The SPIKE algorithm is used. At construction, each process factorizes its
+    diagonal block A_j (DGBTRF), and computes the 'spikes' V_j = A_j^{-1} B_j and
+    W_j = A_j^{-1} C_j, where B_j and C_j couple A_j with the first u unknowns
+    of the next process and the last l unknowns of the previous one. The reduced
+    system for the first u and last l unknowns of all processes, which has size
+    P*(u+l) and is banded with bandwidth 2*(u+l)-1, is assembled in LAPACK band
+    storage and factorized on every process.
+
+    Each solve requires one local solve with A_j, one exchange of the first u
+    and last l entries of A_j^{-1} b_j among the processes, and one solve of the
+    reduced system: the communication volume is proportional to the bandwidth,
+    rather than to the number of rows.
+
+    Parameters
+    ----------
+    u : integer
+        Number of non-zero upper diagonal.
+
+    l : integer
+        Number of non-zero lower diagonal.
+
+    bmat : nd-array
+        Banded matrix (whole matrix, same on all processes), in same format
+        as for BandedSolver. Its type selects the LAPACK routines (e.g. SGBTRF
+        for float32, DGBTRF for float64); the solution of a right-hand side
+        has the common type of bmat and of the right-hand side.
 
+    comm : mpi4py.MPI.Comm
+        Communicator of the processes among which the rows are distributed.
 
+    starts : array_like (int)
+        Index of first row owned by each process of the communicator.
+
+    ends : array_like (int)
+        Index of last row owned by each process of the communicator. Each
+        process must own at least max(u,l) rows.
+
+    Notes
+    -----
+    No pivoting is done across the processes: the diagonal blocks A_j must be
+    non-singular, which is the case for diagonally dominant matrices.
+
+    Since the reduced system is replicated, each process needs O(P*(u+l)^2)
+    memory and O(P*(u+l)^3) operations at construction, and O(P*(u+l)^2)
+    operations per solve, for P processes. This is small compared with the
+    local work as long as P*(u+l) is small compared with the number of rows
+    per process; beyond that, a recursive SPIKE scheme would be needed.
+
+    """
+    def __init__( self, u, l, bmat, comm, starts, ends ):
+
+        starts = np.asarray( starts )
+        ends   = np.asarray( ends   )
+
+        assert bmat.shape[0] == 1+u+2*l
+        assert len( starts ) == len( ends ) == comm.Get_size()
+        assert np.all( ends-starts+1 >= max( u, l, 1 ) )
+
+        rank = comm.Get_rank()
+        size = comm.Get_size()
+        s    = starts[rank]
+        e    = ends  [rank]
+        n    = e-s+1
+        m    = u+l
+
+        self._u      = u
+        self._l      = l
+        self._comm   = comm
+        self._starts = starts
+        self._ends   = ends
+        self._space  = ndarray
+
+        # LAPACK routines for the type of the matrix
+        gbtrf, = get_lapack_funcs( ('gbtrf',), (bmat,) )
+        dtype  = np.dtype( gbtrf.dtype )
+        self._dtype = dtype
+
+        # Diagonal block: remove entries outside of local rows, and factorize
+        rows = np.arange( 1+u+2*l )[:,None] - l - u + np.arange( s, e+1 )[None,:]
+        ab   = np.where( (rows >= s) & (rows <= e), bmat[:,s:e+1], 0 ).astype( dtype )
+        self._bmat, self._ipiv, self._finfo = gbtrf( ab, l, u )
+
+        # Spikes: V = A_j^{-1} B_j (last u rows) and W = A_j^{-1} C_j (first l rows)
+        V = np.zeros( (n,u), dtype=dtype )
+        W = np.zeros( (n,l), dtype=dtype )
+        if rank < size-1:
+            V[n-u:,:] = self._dense_block( bmat, u, l, range( e-u+1, e+1 ), range( e+1, e+u+1 ) )
+        if rank > 0:
+            W[:l,:]   = self._dense_block( bmat, u, l, range( s, s+l ), range( s-l, s ) )
+        self._V = self._local_solve( V )
+        self._W = self._local_solve( W )
+
+        # Rows of reduced system for unknowns [x_j[:u], x_j[-l:]] of process j:
+        # x_j + V_j x_{j+1}[:u] + W_j x_{j-1}[-l:] = A_j^{-1} b_j
+        # The system is banded, with rl lower and ru upper diagonals: row i is
+        # stored by diagonals, with R[i,rl+d] the entry in column i+d
+        self._rl = rl = max( m+l-1, 0 )
+        self._ru = ru = max( m+u-1, 0 )
+
+        r = np.arange( m )[:,None]
+        R = np.zeros( (m, rl+1+ru), dtype=dtype )
+        R[r[:,0], rl] = 1
+        if rank < size-1:
+            R[r, rl+m-r+np.arange( u )] = self._interface( self._V )
+        if rank > 0:
+            R[r, rl-l-r+np.arange( l )] = self._interface( self._W )
+
+        # Assemble reduced system on all processes in LAPACK band storage,
+        # and factorize it
+        R_glob = np.empty( (size*m, rl+1+ru), dtype=dtype )
+        comm.Allgather( R, R_glob )
+
+        i = np.arange( size*m )[:,None]
+        d = np.arange( -rl, ru+1 )[None,:]
+        valid = (i+d >= 0) & (i+d < size*m)
+        k, j  = np.broadcast_to( rl+ru-d, valid.shape )[valid], (i+d)[valid]
+
+        R_bnd = np.zeros( (1+ru+2*rl, size*m), dtype=dtype )
+        R_bnd[k, j] = R_glob[valid]
+        if m > 0:
+            self._R_bmat, self._R_ipiv, R_info = gbtrf( R_bnd, rl, ru )
+            self._finfo = max( self._finfo, R_info )
+
+        self._sinfo = None
+
+    @property
+    def finfo( self ):
+        return self._finfo
+
+    @property
+    def sinfo( self ):
+        return self._sinfo
+
+    @property
+    def comm( self ):
+        return self._comm
+
+    @property
+    def dtype( self ):
+        return self._dtype
+
+    @property
+    def starts( self ):
+        return self._starts
+
+    @property
+    def ends( self ):
+        return self._ends
+
+    #--------------------------------------
+    # Abstract interface
+    #--------------------------------------
+    @property
+    def space( self ):
+        return self._space
+
+    #...
+    def solve( self, rhs, out=None ):
+        """
+        Solve linear system for one or more right-hand sides.
+
+        Parameters
+        ----------
+        rhs : numpy.ndarray
+            Rows of right-hand side b owned by the process, with shape
+            (n_loc,) or (n_loc, nrhs).
+
+        out : numpy.ndarray
+            Rows of solution x owned by the process, with same shape as rhs
+            (optional).
+
+        Returns
+        -------
+        out : numpy.ndarray
+            Rows of solution x owned by the process, with the common type of
+            rhs and of the matrix.
+
+        """
+        comm = self._comm
+        rank = comm.Get_rank()
+        size = comm.Get_size()
+        u, l = self._u, self._l
+        m    = u+l
+
+        assert rhs.ndim in (1, 2)
+        assert rhs.shape[0] == self._ends[rank] - self._starts[rank] + 1
+
+        # Same type on all processes, for the exchange of interface values
+        dtype = np.result_type( rhs.dtype, self._dtype )
+
+        b = rhs.reshape( rhs.shape[0], -1 ).astype( dtype, copy=False )
+        k = b.shape[1]
+
+        # Local solve
+        g = self._local_solve( b )
+
+        # Reduced system for interface unknowns of all processes
+        y = np.empty( (size, m, k), dtype=dtype )
+        comm.Allgather( np.ascontiguousarray( self._interface( g ) ), y )
+        y = y.reshape( size*m, k )
+        if y.size:
+            gbtrs, = get_lapack_funcs( ('gbtrs',), (y,) )
+            R_bmat = self._R_bmat.astype( dtype, copy=False )
+            y, self._sinfo = gbtrs( R_bmat, self._rl, self._ru, y, self._R_ipiv )
+
+        # Remove contributions of neighbors: x_j = g_j - V_j x_{j+1}[:u] - W_j x_{j-1}[-l:]
+        if rank < size-1:
+            g -= self._V.dot( y[(rank+1)*m:(rank+1)*m+u] )
+        if rank > 0:
+            g -= self._W.dot( y[rank*m-l:rank*m] )
+
+        x = g.reshape( rhs.shape )
+
+        if out is None:
+            out = x
+        else:
+            assert out.shape == rhs.shape
+            out[:] = x
+
+        return out
+
+    #--------------------------------------
+    # Private methods
+    #--------------------------------------
+    def _local_solve( self, b ):
+        """
+        Solve A_j x = b with LU factors of local diagonal block, in the type of
+        b (the factors of a real matrix are cast for a complex right-hand side).
+
+        """
+        if b.size == 0:
+            return np.array( b )
+        gbtrs, = get_lapack_funcs( ('gbtrs',), (b,) )
+        bmat   = self._bmat.astype( b.dtype, copy=False )
+        x, self._sinfo = gbtrs( bmat, self._l, self._u, b, self._ipiv )
+        return x
+
+    # ...
+    def _interface( self, x ):
+        """ Rows of local array corresponding to interface unknowns.
+        """
+        return np.concatenate( [x[:self._u], x[x.shape[0]-self._l:]] )
+
+    # ...
+    @staticmethod
+    def _dense_block( bmat, u, l, rows, cols ):
+        """ Dense block A[rows,cols] of banded matrix (zero outside band).
+        """
+        i = np.asarray( rows, dtype=int )[:,None]
+        j = np.asarray( cols, dtype=int )[None,:]
+        k = l+u+i-j
+        valid = (k >= l) & (k <= 2*l+u)
+        return np.where( valid, bmat[np.clip( k, 0, bmat.shape[0]-1 ), j], 0.0 )
@@ -2,8 +2,40 @@
 """
 This module provides iterative solvers and precondionners.
 """
+import numpy as np
 
-__all__ = ['cg','pcg', 'jacobi', 'weighted_jacobi']
+from spl.linalg.basic import LinearOperator
+
+__all__ = ['cg','pcg', 'jacobi', 'weighted_jacobi', 'mixed_precision_refinement']
+
+# ...
+def _axpy( y, a, x ):
+    """ In-place update y <- y + a*x, also for numpy arrays (no 'axpy' method).
+    """
+    if isinstance( y, np.ndarray ):
+        y += a*x
+    else:
+        y.axpy( a, x )
+
+# ...
+def _lincomb( y, a, x, b, z ):
+    """ In-place update y <- a*x + b*z, also for numpy arrays (no 'lincomb' method).
+    """
+    if isinstance( y, np.ndarray ):
+        y[...] = a*x + b*z
+    else:
+        y.lincomb( a, x, b, z )
+
+# ...
+def _dot( A, p, out=None ):
+    """ Product A*p, written into 'out' if A is a LinearOperator (or ndarray);
+        other operators (e.g. scipy.sparse matrices) only provide dot(p).
+    """
+    if out is not None and isinstance( A, LinearOperator ):
+        A.dot( p, out=out )
+        return out
+    else:
+        return A.dot( p )
 
 # ...
 def cg( A, b, x0=None, tol=1e-6, maxiter=1000, verbose=False ):
@@ -16,7 +48,8 @@ def cg( A, b, x0=None, tol=1e-6, maxiter=1000, verbose=False ):
     A : spl.linalg.basic.LinearOperator
         Left-hand-side matrix A of linear system; individual entries A[i,j]
         can't be accessed, but A has 'shape' attribute and provides 'dot(p)'
-        function (i.e. matrix-vector product A*p).
+        function (i.e. matrix-vector product A*p). If A is a LinearOperator,
+        the product is written in place with 'dot(p, out=v)'.
 
     b : spl.linalg.basic.Vector
         Right-hand-side vector of linear system. Individual entries b[i] need
@@ -61,7 +94,9 @@ def cg( A, b, x0=None, tol=1e-6, maxiter=1000, verbose=False ):
         x = x0.copy()
 
     # First values
-    r  = b - A.dot( x )
+    v  = A.dot( x )
+    r  = b.copy()
+    _axpy( r, -1.0, v )
     am = r.dot( r )
     p  = r.copy()
 
@@ -75,18 +110,19 @@ def cg( A, b, x0=None, tol=1e-6, maxiter=1000, verbose=False ):
         template = "| {:7d} | {:19.2e} |"
 
     # Iterate to convergence
+    # NOTE: vectors are updated in place (no allocations)
     for m in range( 1, maxiter+1 ):
 
         if am < tol_sqr:
             m -= 1
             break
 
-        v   = A.dot( p )
+        v   = _dot( A, p, out=v )
         l   = am / v.dot( p )
-        x  += l*p
-        r  -= l*v
+        _axpy( x,  l, p )
+        _axpy( r, -l, v )
         am1 = r.dot( r )
-        p   = r + (am1/am)*p
+        _lincomb( p, 1.0, r, am1/am, p )
         am  = am1
 
         if verbose:
@@ -153,14 +189,16 @@ def pcg(A, b, pc, x0=None, tol=1e-6, maxiter=1000, verbose=False):
         x = x0.copy()
 
     # First values
-    r = b - A.dot(x)
+    r = b.copy()
+    _axpy( r, -1.0, A.dot(x) )
 
     nrmr0_sqr = r.dot(r)
     tol_sqr = tol**2
 
     psolve = eval(pc)
     s = psolve(A, r)
-    p = s
+    p = s.copy()
+    q = None
     sr = s.dot(r)
 
     if verbose:
@@ -171,15 +209,14 @@ def pcg(A, b, pc, x0=None, tol=1e-6, maxiter=1000, verbose=False):
         template = "| {:7d} | {:19.2e} |"
 
     # Iterate to convergence
+    # NOTE: vectors are updated in place (only the preconditioner allocates)
     for k in range(1, maxiter+1):
 
-        q = A.dot(p)
+        q = _dot( A, p, out=q )
         alpha  = sr / p.dot(q)
 
-        x  = x + alpha*p
-        r  = r - alpha*q
-
-        s = A.dot(r)
+        _axpy( x,  alpha, p )
+        _axpy( r, -alpha, q )
 
         nrmr_sqr = r.dot(r)
 
@@ -194,7 +231,7 @@ def pcg(A, b, pc, x0=None, tol=1e-6, maxiter=1000, verbose=False):
 
         beta = sr/srold
 
-        p = s + beta*p
+        _lincomb( p, 1.0, s, beta, p )
 
         if verbose:
             print( template.format(k, sqrt(nrmr_sqr)))
@@ -225,53 +262,19 @@ def jacobi(A, b):
         Converged solution.
 
     """
-    from spl.linalg.stencil import StencilVector
-
     n = A.shape[0]
 
     assert(A.shape == (n,n))
     assert(b.shape == (n, ))
 
     V = b.space
-    x = StencilVector(V)
-
-    # ...
-    if V.ndim == 1:
-        [s1] = V.starts
-        [e1] = V.ends
-        [p1] = V.pads
-
-        x[:] = 0.
-
-        for i1 in range(s1, e1+1):
-                x[i1] = A[i1, 0]
-                x[i1] = b[i1]/ x[i1]
-
-    elif V.ndim == 2:
-        [s1, s2] = V.starts
-        [e1, e2] = V.ends
-        [p1, p2] = V.pads
 
-        x[:,:] = 0.
+    # Locally owned entries, in any dimension
+    index = tuple( slice(s, e+1) for s,e in zip(V.starts, V.ends) )
 
-        for i1 in range(s1, e1+1):
-            for i2 in range(s2, e2+1):
-                x[i1, i2] = A[i1, i2, 0, 0]
-                x[i1, i2] = b[i1, i2]/ x[i1, i2]
-
-    elif V.ndim == 3:
-        [s1, s2, s3] = V.starts
-        [e1, e2, e3] = V.ends
-        [p1, p2, p3] = V.pads
-
-        x[:,:, :] = 0.
-
-        for i1 in range(s1, e1+1):
-            for i2 in range(s2, e2+1):
-                for i3 in range(s3, e3+1):
-                    x[i1, i2. i3] = A[i1, i2, i3, 0, 0, 0]
-                    x[i1, i2, i3] = b[i1, i2, i3]/ x[i1, i2, i3]
-    #...
+    # Solution x = b / diag(A)
+    x = A.diagonal()
+    x[index] = b[index] / x[index]
 
     x.update_ghost_regions()
 
@@ -313,16 +316,19 @@ def weighted_jacobi(A, b, x0=None, omega= 2./3, tol=1e-10, maxiter=100, verbose=
 
     """
     from math import sqrt
-    from spl.linalg.stencil import StencilVector
 
     n = A.shape[0]
 
     assert(A.shape == (n,n))
     assert(b.shape == (n, ))
 
-    V  = b.space
-    s = V.starts
-    e = V.ends
+    V = b.space
+
+    # Locally owned entries, in any dimension
+    index = tuple( slice(s, e+1) for s,e in zip(V.starts, V.ends) )
+
+    # Diagonal of A
+    d = A.diagonal()
 
     # First guess of solution
     if x0 is None:
@@ -331,9 +337,13 @@ def weighted_jacobi(A, b, x0=None, omega= 2./3, tol=1e-10, maxiter=100, verbose=
         assert( x0.shape == (n,) )
         x = x0.copy()
 
-    dr = 0.0 * b.copy()
+    r  = b.space.zeros()
+    dr = b.space.zeros()
     tol_sqr = tol**2
 
+    # Weights omega/d of residual, in locally owned entries
+    w = omega / d[index]
+
     if verbose:
         print( "Weighted Jacobi iterative method:" )
         print( "+---------+---------------------+")
@@ -342,22 +352,17 @@ def weighted_jacobi(A, b, x0=None, omega= 2./3, tol=1e-10, maxiter=100, verbose=
         template = "| {:7d} | {:19.2e} |"
 
     # Iterate to convergence
+    # NOTE: vectors are updated in place (no allocations)
     for k in range(1, maxiter+1):
-        r = b - A.dot(x)
-
-        # TODO build new external method get_diagonal and add 3d case
-        if V.ndim ==1:
-            for i1 in range(s[0], e[0]+1):
-                dr[i1] = omega*r[i1]/A[i1, 0]
-
-        elif V.ndim ==2:
-            for i1 in range(s[0], e[0]+1):
-                for i2 in range(s[1], e[1]+1):
-                    dr[i1, i2] = omega*r[i1, i2]/A[i1, i2, 0, 0]
-        # ...
+
+        # Residual r = b - A*x
+        A.dot(x, out=r)
+        r.lincomb( 1.0, b, -1.0, r )
+
+        np.multiply( r[index], w, out=dr[index] )
         dr.update_ghost_regions()
 
-        x  = x + dr
+        x.axpy( 1.0, dr )
 
         nrmr = dr.dot(dr)
         if nrmr < tol_sqr:
@@ -375,3 +380,128 @@ def weighted_jacobi(A, b, x0=None, omega= 2./3, tol=1e-10, maxiter=100, verbose=
 
     return x
 # ...
+
+# ...
+def mixed_precision_refinement( A, b, solver, dtype='float32', x0=None, tol=1e-10,
+                                maxiter=20, verbose=False ):
+    """
+    Mixed-precision iterative refinement for solving linear system Ax=b: the
+    residual r = b - A*x is computed in the (high) precision of A and b, while
+    the correction d is obtained by solving A*d = r with a given solver in low
+    precision, using copies of A and r of data type 'dtype'.
+
+    Since the inner solver only needs to reduce the residual by a fixed
+    factor, it can use e.g. float32 storage and arithmetic, which halves its
+    memory traffic; the final accuracy is that of the outer (high-precision)
+    residual. Before each inner solve the residual is normalized, hence the
+    tolerance of the inner solver acts as a relative one.
+
+    Parameters
+    ----------
+    A : spl.linalg.stencil.StencilMatrix
+        Left-hand-side matrix A of linear system; it must provide method
+        'astype( dtype )'.
+
+    b : spl.linalg.stencil.StencilVector
+        Right-hand-side vector of linear system; it must provide method
+        'astype( dtype, out=None )'.
+
+    solver : callable
+        Inner solver, called as 'solver( A_low, r_low )' and returning a tuple
+        (d_low, info) like the functions in this module, e.g.
+        functools.partial( cg, tol=1e-4, maxiter=100 ).
+
+    dtype : data-type
+        Data type used by the inner solver (default is float32).
+
+    x0 : spl.linalg.basic.Vector
+        First guess of solution (optional).
+
+    tol : float
+        Absolute tolerance for L2-norm of residual r = A*x - b.
+
+    maxiter: int
+        Maximum number of refinement steps (i.e. of inner solves).
+
+    verbose : bool
+        If True, L2-norm of residual r is printed at each step.
+
+    Returns
+    -------
+    x : spl.linalg.basic.Vector
+        Converged solution.
+
+    info : dict
+        Convergence information, with the total number of inner iterations
+        (if provided by the inner solver) under key 'niter_inner'.
+
+    """
+    from math import sqrt
+
+    n = A.shape[0]
+
+    assert( A.shape == (n,n) )
+    assert( b.shape == (n, ) )
+
+    # Low-precision copy of the matrix, created once
+    A_low = A.astype( dtype )
+
+    # First guess of solution
+    if x0 is None:
+        x = b.space.zeros()
+    else:
+        assert( x0.shape == (n,) )
+        x = x0.copy()
+
+    # First values (high precision)
+    Ax = A.dot( x )
+    r  = b.copy()
+    r.axpy( -1.0, Ax )
+
+    r_low = r.astype( dtype )
+    d     = x.space.zeros()
+
+    nrmr        = sqrt( r.dot( r ) )
+    niter_inner = 0
+
+    if verbose:
+        print( "Mixed-precision iterative refinement:" )
+        print( "+---------+---------------------+")
+        print( "+ Iter. # | L2-norm of residual |")
+        print( "+---------+---------------------+")
+        template = "| {:7d} | {:19.2e} |"
+
+    # Iterate to convergence
+    for k in range( 1, maxiter+1 ):
+
+        if nrmr < tol:
+            k -= 1
+            break
+
+        # Correction in low precision, for normalized residual
+        r.astype( dtype, out=r_low )
+        r_low.scale( 1.0 / nrmr )
+        d_low, info_inner = solver( A_low, r_low )
+        niter_inner += info_inner.get( 'niter', 0 )
+
+        # Update solution and residual in high precision
+        d_low.astype( b.space.dtype, out=d )
+        x.axpy( nrmr, d )
+
+        A.dot( x, out=Ax )
+        b.copy( out=r )
+        r.axpy( -1.0, Ax )
+
+        nrmr = sqrt( r.dot( r ) )
+
+        if verbose:
+            print( template.format( k, nrmr ) )
+
+    if verbose:
+        print( "+---------+---------------------+")
+
+    # Convergence information
+    info = {'niter': k, 'success': nrmr < tol, 'res_norm': nrmr,
+            'niter_inner': niter_inner }
+
+    return x, info
@@ -1,36 +1,58 @@
 #coding = utf-8
 import numpy as np
+from functools                 import reduce
+from scipy.sparse              import kron as sp_kron
 
-from spl.linalg.basic   import LinearOperator, LinearSolver
-from spl.linalg.stencil import StencilVectorSpace, StencilVector, StencilMatrix
+from spl.linalg                import kernels
+from spl.linalg.basic          import LinearOperator, LinearSolver
+from spl.linalg.stencil        import StencilVectorSpace, StencilVector, StencilMatrix
+from spl.linalg.stencil        import SymmetricStencilMatrix
+from spl.linalg.direct_solvers import DistributedBandedSolver
 
-__all__ = ['KroneckerStencilMatrix_2D',
+__all__ = ['KroneckerStencilMatrix',
+           'KroneckerStencilMatrix_2D',
            'kronecker_solve_2d_par',
            'kronecker_solve_3d_par',
            'kronecker_solve']
 
 #==============================================================================
-class KroneckerStencilMatrix_2D( LinearOperator ):
+class KroneckerStencilMatrix( LinearOperator ):
+    """
+    Kronecker product A = kron( A_1, A_2, ..., A_n ) of 1D stencil matrices,
+    acting on n-dimensional stencil vectors: the matrix A is not assembled, and
+    only the 1D matrices are stored.
 
-    def __init__( self, V, W, A1, A2 ):
+    Parameters
+    ----------
+    V : StencilVectorSpace
+        Domain of the linear operator (n-dimensional).
+
+    W : StencilVectorSpace
+        Codomain of the linear operator (same as V).
+
+    *mats : StencilMatrix
+        1D stencil matrices A_i along each direction, with A_i.pads <= V.pads[i]
+        (symmetric storage is not supported).
+
+    """
+    def __init__( self, V, W, *mats ):
 
         assert isinstance( V, StencilVectorSpace )
         assert isinstance( W, StencilVectorSpace )
         assert V is W
-        assert V.ndim == 2
+        assert V.ndim == len( mats )
 
-        assert isinstance( A1, StencilMatrix )
-        assert A1.domain.ndim == 1
-        assert A1.domain.npts[0] == V.npts[0]
-
-        assert isinstance( A2, StencilMatrix )
-        assert A2.domain.ndim == 1
-        assert A2.domain.npts[0] == V.npts[1]
+        for d,A in enumerate( mats ):
+            assert isinstance( A, StencilMatrix )
+            assert not isinstance( A, SymmetricStencilMatrix ), \
+                    "Full stencil storage is required for the 1D matrices."
+            assert A.domain.ndim == 1
+            assert A.domain.npts[0] == V.npts[d]
+            assert A.pads[0] <= V.pads[d]
 
         self._space = V
-        self._A1    = A1
-        self._A2    = A2
-        self._Y     = StencilVector( V )
+        self._mats  = tuple( mats )
+        self._work  = None
 
     #--------------------------------------
     # Abstract interface
@@ -46,9 +68,17 @@ class KroneckerStencilMatrix_2D( LinearOperator ):
 
     # ...
     def dot( self, X, out=None ):
+        """
+        Matrix-vector product, computed one direction at a time: for each
+        multi-index i, and starting from the last direction,
+
+        Z^{(d)}[..., i_d, ...] = sum_{l_d} A_d[i_d,l_d] * Z^{(d+1)}[..., i_d+l_d-p_d, ...]
 
-        dot = np.dot
+        with Z^{(n+1)} = X and out = Z^{(1)}. Each step is a banded product
+        along one axis, vectorized over all the other axes, with a cost
+        proportional to the number of entries times (2*p_d+1).
 
+        """
         assert isinstance( X, StencilVector )
         assert X.space is self.domain
 
@@ -58,23 +88,52 @@ class KroneckerStencilMatrix_2D( LinearOperator ):
         else:
             out = StencilVector( self.codomain )
 
-        [s1, s2] = self._space.starts
-        [e1, e2] = self._space.ends
-        [p1, p2] = self._space.pads
+        if not X.ghost_regions_in_sync:
+            X.update_ghost_regions()
+
+        V     = self._space
+        nd    = V.ndim
+        pads  = V.pads
+        nrows = [e-s+1 for s,e in zip( V.starts, V.ends )]
+        mats  = self._get_local_rows()
+
+        # Compiled kernel for 2D case, if available (same padding only)
+        if nd == 2 and all( A.shape[1] == 2*p+1 for A,p in zip( mats, pads ) ):
+            if self._work is None:
+                self._work = np.empty_like( X._data )
+            if kernels.kron_dot_2d( *mats, X._data, self._work, out._data ):
+                out._flag_owned_entries_changed()
+                out._update_stale_ghost_regions()
+                return out
+
+        Z = X._data
 
-        A1 = self._A1
-        A2 = self._A2
-        Y  = self._Y
+        for d in reversed( range( nd ) ):
 
-        for j1 in range(s1-p1, e1+p1+1):
-            for i2 in range(s2, e2+1):
-                 Y[j1,i2] = dot( X[j1,i2-p2:i2+p2+1], A2[i2,:])
+            A = mats[d]
+            n = nrows[d]
+            q = (A.shape[1]-1)//2
 
-        for i1 in range(s1, e1+1):
-            for i2 in range(s2, e2+1):
-                 out[i1,i2] = dot( A1[i1,:], Y[i1-p1:i1+p1+1,i2] )
+            # Broadcast 1D matrix entries over all other axes
+            bb = tuple( slice( None ) if k == d else None for k in range( nd ) )
 
-        out.update_ghost_regions()
+            shape    = list( Z.shape )
+            shape[d] = n
+            Y        = np.zeros( shape, dtype=Z.dtype )
+
+            for l in range( 2*q+1 ):
+                jj = tuple( slice( pads[d]-q+l, pads[d]-q+l+n ) if k == d else slice( None )
+                            for k in range( nd ) )
+                Y += A[:,l][bb] * Z[jj]
+
+            Z = Y
+
+        index = tuple( slice( p, p+n ) for p,n in zip( pads, nrows ) )
+        out._data[index] = Z
+
+        # Only directions with neighbors are exchanged
+        out._flag_owned_entries_changed()
+        out._update_stale_ghost_regions()
 
         return out
 
@@ -95,13 +154,24 @@ class KroneckerStencilMatrix_2D( LinearOperator ):
     def pads( self ):
         return self._space.pads
 
+    # ...
+    @property
+    def mats( self ):
+        return self._mats
+
     # ...
     def __getitem__(self, key):
         raise NotImplementedError('TODO')
 
     # ...
     def tocoo( self ):
-        raise NotImplementedError('TODO')
+        """
+        Global sparse matrix kron( A_1, ..., A_n ) in COO format, consistent
+        with the row-major ordering of the entries in StencilVector.toarray().
+
+        """
+        return reduce( lambda A,B: sp_kron( A, B, format='coo' ),
+                       [A.tocoo() for A in self._mats] )
 
     #...
     def tocsr( self ):
@@ -113,14 +183,46 @@ class KroneckerStencilMatrix_2D( LinearOperator ):
 
     #...
     def copy( self ):
-        M = KroneckerStencilMatrix_2D( self.domain, self.codomain, self._A1, self._A2 )
-        return M
+        return KroneckerStencilMatrix( self.domain, self.codomain, *self._mats )
+
+    #...
+    def transpose( self ):
+        """
+        Transpose matrix kron( A_1^T, ..., A_n^T ) (new object).
+        """
+        mats = [A.transpose() for A in self._mats]
+        return KroneckerStencilMatrix( self.codomain, self.domain, *mats )
+
+    #--------------------------------------
+    # Private methods
+    #--------------------------------------
+    def _get_local_rows( self ):
+        """ Stencil data of 1D matrices in rows owned by process.
+        """
+        return [A._get_local_data()[s-A.starts[0]:e+1-A.starts[0]]
+                for A,s,e in zip( self._mats, self.starts, self.ends )]
+
+#==============================================================================
+class KroneckerStencilMatrix_2D( KroneckerStencilMatrix ):
+    """
+    Kronecker product A = kron( A1, A2 ) of 1D stencil matrices, acting on 2D
+    stencil vectors (see KroneckerStencilMatrix).
+
+    """
+    def __init__( self, V, W, A1, A2 ):
+
+        assert V.ndim == 2
+        super().__init__( V, W, A1, A2 )
 
 #==============================================================================
 def kronecker_solve_2d_par( A1, A2, rhs, out=None ):
     """
     Solve linear system Ax=b with A=kron(A2,A1).
 
+    Along each direction, the lines are redistributed among the processes with
+    one collective call, and solved with one call to the 1D solver with a
+    matrix right-hand side (see '_kronecker_solve_axis').
+
     Parameters
     ----------
     A1 : LinearSolver
@@ -136,64 +238,19 @@ def kronecker_solve_2d_par( A1, A2, rhs, out=None ):
     assert isinstance( A1 , LinearSolver  )
     assert isinstance( A2 , LinearSolver  )
     assert isinstance( rhs, StencilVector )
+    assert rhs.space.ndim == 2
 
-    if out is not None:
-        assert isinstance( out, StencilVector )
-        assert out.space is rhs.space
-    else:
-        out = StencilVector( rhs.space )
-
-    # ...
-    V = rhs.space
-
-    s1, s2 = V.starts
-    e1, e2 = V.ends
-    n1, n2 = V.npts
-
-    subcomm_1 = V.cart.subcomm[0]
-    subcomm_2 = V.cart.subcomm[1]
-
-    disps1 = V.cart.global_starts[0]
-    disps2 = V.cart.global_starts[1]
-
-    sizes1 = V.cart.global_ends[0] - V.cart.global_starts[0] + 1
-    sizes2 = V.cart.global_ends[1] - V.cart.global_starts[1] + 1
-
-    # TODO: make MPI type available through property
-    mpi_type = V._mpi_type
-    # ...
-
-    # ...
-    # 2D slices
-    X = rhs[s1:e1+1,s2:e2+1]
-    Y = out[s1:e1+1,s2:e2+1]
-
-    # 1D global arrays
-    X_glob_1 = np.zeros( n1 )
-    Y_glob_2 = np.zeros( n2 )
-    # ...
-
-    for i2 in range(e2-s2+1):
-        X_loc = X[:,i2].copy()  # need 1D contiguous copy
-        subcomm_1.Allgatherv( X_loc, [X_glob_1, sizes1, disps1, mpi_type] )
-        Y[:,i2] = A1.solve( X_glob_1 )[s1:e1+1]
-
-    for i1 in range(e1-s1+1):
-        Y_loc = Y[i1,:]  # 1D contiguous slice
-        subcomm_2.Allgatherv( Y_loc, [Y_glob_2, sizes2, disps2, mpi_type] )
-        Y[i1,:] = A2.solve( Y_glob_2 )[s2:e2+1]
-
-    # ...
-    out.update_ghost_regions()
-    # ...
-
-    return out
+    return kronecker_solve( [A1, A2], rhs, out=out )
 
 #==============================================================================
 def kronecker_solve_3d_par( A1, A2, A3, rhs, out=None ):
     """
     Solve linear system Ax=b with A=kron(A3,A2,A1).
 
+    Along each direction, the lines are redistributed among the processes with
+    one collective call, and solved with one call to the 1D solver with a
+    matrix right-hand side (see '_kronecker_solve_axis').
+
     Parameters
     ----------
     A1 : LinearSolver
@@ -213,70 +270,9 @@ def kronecker_solve_3d_par( A1, A2, A3, rhs, out=None ):
     assert isinstance( A2 , LinearSolver  )
     assert isinstance( A3 , LinearSolver  )
     assert isinstance( rhs, StencilVector )
+    assert rhs.space.ndim == 3
 
-    if out is not None:
-        assert isinstance( out, StencilVector )
-        assert out.space is rhs.space
-    else:
-        out = StencilVector( rhs.space )
-
-    # ...
-    V = rhs.space
-
-    s1, s2, s3 = V.starts
-    e1, e2, e3 = V.ends
-    n1, n2, n3 = V.npts
-
-    subcomm_1 = V.cart.subcomm[0]
-    subcomm_2 = V.cart.subcomm[1]
-    subcomm_3 = V.cart.subcomm[2]
-
-    disps1 = V.cart.global_starts[0]
-    disps2 = V.cart.global_starts[1]
-    disps3 = V.cart.global_starts[2]
-
-    sizes1 = V.cart.global_ends[0] - V.cart.global_starts[0] + 1
-    sizes2 = V.cart.global_ends[1] - V.cart.global_starts[1] + 1
-    sizes3 = V.cart.global_ends[2] - V.cart.global_starts[2] + 1
-
-    # TODO: make MPI type available through property
-    mpi_type = V._mpi_type
-    # ...
-
-    # ...
-    # 3D slices
-    X = rhs[s1:e1+1, s2:e2+1, s3:e3+1]
-    Y = out[s1:e1+1, s2:e2+1, s3:e3+1]
-
-    # 1D global arrays
-    X_glob_1 = np.zeros( n1 )
-    Y_glob_2 = np.zeros( n2 )
-    Y_glob_3 = np.zeros( n3 )
-    # ...
-
-    for i3 in range(e3-s3+1):
-        for i2 in range(e2-s2+1):
-            X_loc = X[:, i2, i3].copy()  # need 1D contiguous copy
-            subcomm_1.Allgatherv( X_loc, [X_glob_1, sizes1, disps1, mpi_type] )
-            Y[:, i2, i3] = A1.solve( X_glob_1 )[s1:e1+1]
-
-    for i3 in range(e3-s3+1):
-        for i1 in range(e1-s1+1):
-            Y_loc = Y[i1, :, i3].copy()  # need 1D contiguous copy
-            subcomm_2.Allgatherv( Y_loc, [Y_glob_2, sizes2, disps2, mpi_type] )
-            Y[i1, :, i3] = A2.solve( Y_glob_2 )[s2:e2+1]
-
-    for i2 in range(e2-s2+1):
-        for i1 in range(e1-s1+1):
-            Y_loc = Y[i1, i2, :]  # 1D contiguous slice
-            subcomm_3.Allgatherv( Y_loc, [Y_glob_3, sizes3, disps3, mpi_type] )
-            Y[i1, i2, :] = A3.solve( Y_glob_3 )[s3:e3+1]
-
-    # ...
-    out.update_ghost_regions()
-    # ...
-
-    return out
+    return kronecker_solve( [A1, A2, A3], rhs, out=out )
 
 #==============================================================================
 def kronecker_solve( solvers, rhs, out=None ):
@@ -286,14 +282,28 @@ def kronecker_solve( solvers, rhs, out=None ):
 
     x_n = L_n.solve( b_n )
 
+    Works in serial and parallel, for any number of dimensions. The 1D solvers
+    are applied along each direction in turn, to all lines of the local block
+    at once (see '_kronecker_solve_axis').
+
     Parameters
     ----------
     solvers : list( LinearSolver )
         List of linear solvers along each direction: [L_1, L_2, ..., L_n].
+        Each solver must accept a 2D array as right-hand side, with one
+        column per 1D problem.
 
     rhs : StencilVector
         Right hand side vector of linear system Ax=b.
 
+    out : StencilVector
+        Solution vector x (optional).
+
+    Returns
+    -------
+    out : StencilVector
+        Solution vector x.
+
     """
     assert hasattr( solvers, '__iter__' )
     for solver in solvers:
@@ -310,22 +320,125 @@ def kronecker_solve( solvers, rhs, out=None ):
 
     space = rhs.space
 
-    # 1D case
-    # TODO: should also work in parallel
-    if space.ndim == 1:
-        if space.parallel:
-            raise NotImplementedError( "1D Kronecker solver only works in serial." )
-        else:
-            solver[0].solve( rhs, out )
+    # Multi-dimensional index range local to process
+    index = tuple( slice( s, e+1 ) for s,e in zip( space.starts, space.ends ) )
 
-    # 2D/3D cases
-    # TODO: should also work in serial
-    # TODO: should work in any number of dimensions
-    else:
-        if not space.parallel:
-            raise NotImplementedError( "Multi-dimensional Kronecker solver only works in parallel." )
+    Y = rhs[index]
+    for axis, solver in enumerate( solvers ):
+        Y = _kronecker_solve_axis( solver, Y, axis, space )
 
-        if   space.ndim == 2: kronecker_solve_2d_par( *solvers, rhs=rhs, out=out )
-        elif space.ndim == 3: kronecker_solve_3d_par( *solvers, rhs=rhs, out=out )
-        else:
-            raise NotImplementedError( "Kronecker solver does not work in more than 3 dimensions." )
+    out[index] = Y
+
+    # Only directions with neighbors are exchanged
+    out._flag_owned_entries_changed()
+    out._update_stale_ghost_regions()
+
+    return out
+
+#==============================================================================
+def _kronecker_solve_axis( solver, X, axis, space ):
+    """
+    Apply 1D linear solver along one direction of the local block of a vector:
+    the block is reshaped into a 2D array with one line per row, and all lines
+    are solved at once with a single call to 'solver.solve' (the right-hand
+    side is passed in Fortran order, i.e. with contiguous columns).
+
+    In the parallel case, each line is distributed among the processes of the
+    sub-communicator along the given direction. The 2D array is transposed
+    across those processes ('pencil' transpose, with MPI_ALLTOALLV): each
+    process receives whole lines for a subset of the transverse indices, solves
+    them, and sends the solution back with the inverse transpose. Hence every
+    line is solved only once, and memory per process does not grow with the
+    number of processes.
+
+    If the solver is a DistributedBandedSolver, no transpose is needed: the
+    solver is called directly on the local entries of the lines, and only
+    exchanges interface values among the processes.
+
+    Parameters
+    ----------
+    solver : LinearSolver
+        Solver for the 1D problem along the given direction.
+
+    X : numpy.ndarray
+        Right-hand side: entries of vector owned by the process.
+
+    axis : int
+        Direction along which the 1D problems are solved.
+
+    space : StencilVectorSpace
+        Space of the vector.
+
+    Returns
+    -------
+    Y : numpy.ndarray
+        Solution, with same shape as X.
+
+    """
+    # 2D contiguous array with one line per row: shape (m, n_loc)
+    Xt    = np.moveaxis( X, axis, -1 )
+    shape = Xt.shape
+    Xt    = np.ascontiguousarray( Xt ).reshape( -1, shape[-1] )
+
+    if not space.parallel:
+        Yt = solver.solve( Xt.T ).T
+        return np.moveaxis( Yt.reshape( shape ), -1, axis )
+
+    cart = space.cart
+
+    if isinstance( solver, DistributedBandedSolver ):
+        assert solver.comm.Get_size() == cart.subcomm[axis].Get_size()
+        assert np.array_equal( solver.starts, cart.global_starts[axis] )
+        assert np.array_equal( solver.ends  , cart.global_ends  [axis] )
+        Yt = solver.solve( Xt.T ).T
+        return np.moveaxis( Yt.reshape( shape ), -1, axis )
+
+    comm = cart.subcomm[axis]
+    size = comm.Get_size()
+    rank = comm.Get_rank()
+
+    # Distribution of line entries among processes: [s_r, e_r]
+    n   = space.npts[axis]
+    s_r = cart.global_starts[axis]
+    n_r = cart.global_ends  [axis] - s_r + 1
+
+    # Distribution of lines among processes after transpose: [c_q, c_{q+1})
+    m   = Xt.shape[0]
+    c_q = np.array( [(q*m)//size for q in range( size+1 )] )
+    m_q = np.diff( c_q )
+
+    # Number of entries sent to each process, and their positions:
+    # block of lines for process q, with local entries of each line
+    lines_counts = m_q * Xt.shape[1]
+    lines_displs = c_q[:-1] * Xt.shape[1]
+
+    # Number of entries received from each process, and their positions:
+    # block of local lines, with entries owned by process r
+    block_counts = m_q[rank] * n_r
+    block_displs = m_q[rank] * s_r
+
+    # Forward transpose: lines [c_q, c_{q+1}) with all their entries
+    recv = np.empty( m_q[rank] * n, dtype=Xt.dtype )
+    comm.Alltoallv( [Xt, (lines_counts, lines_displs)], [recv, (block_counts, block_displs)] )
+
+    L = np.empty( (m_q[rank], n), dtype=Xt.dtype )
+    for r in range( size ):
+        L[:, s_r[r]:s_r[r]+n_r[r]] = recv[block_displs[r]:block_displs[r]+block_counts[r]].reshape( m_q[rank], n_r[r] )
+
+    # Solve local lines (if any), with Fortran-ordered right-hand side
+    Y = solver.solve( L.T ).T if L.size else L
+
+    # Same type of solution on all processes, with no communication: that of
+    # the right-hand side (processes without lines do not call the solver,
+    # whose output type may differ from that of the input)
+    Y = Y.astype( Xt.dtype, copy=False )
+
+    # Inverse transpose: local entries of all lines
+    send = np.empty( Y.size, dtype=Y.dtype )
+    for r in range( size ):
+        send[block_displs[r]:block_displs[r]+block_counts[r]] = Y[:, s_r[r]:s_r[r]+n_r[r]].reshape( -1 )
+
+    Yt = np.empty( Xt.shape, dtype=Y.dtype )
+    comm.Alltoallv( [send, (block_counts, block_displs)], [Yt, (lines_counts, lines_displs)] )
+
+    return np.moveaxis( Yt.reshape( shape ), -1, axis )
@@ -2,14 +2,61 @@
 #
 # Copyright 2018 Yaman Güçlü
 
+import weakref
 import numpy as np
-from scipy.sparse import coo_matrix
-from mpi4py import MPI
+from numpy.lib.stride_tricks import as_strided
+from scipy.sparse      import coo_matrix, csr_matrix
+from scipy.linalg.blas import get_blas_funcs
+from mpi4py            import MPI
 
 from spl.linalg.basic import VectorSpace, Vector, LinearOperator
+from spl.linalg       import kernels
 from spl.ddm.cart     import Cart
 
-__all__ = ['StencilVectorSpace','StencilVector','StencilMatrix']
+__all__ = ['StencilVectorSpace','StencilVector','StencilMultiVector','StencilMatrix',
+           'SymmetricStencilMatrix']
+
+# Approximate number of entries in each slab of a large array (see '_slabs')
+_slab_size = 2**20
+
+# Approximate number of entries in each slab which should stay in cache
+_cache_slab_size = 2**18
+
+# Bases of the MPI tags (base+disp, with disp = -1 or +1) of the ghost region
+# exchanges: their ranges are disjoint, since several exchanges may be in
+# flight at the same time on the same communicator
+_tag_update        = 42
+_tag_accumulate    = 142
+_tag_update_blocks = 242
+
+#===============================================================================
+def _slabs( a, b, stride, size=None ):
+    """
+    Split range [a,b) of indices along the first axis of an array into slabs
+    [c,d) of consecutive indices, each of them containing about 'size'
+    entries of the array (at least one index). Loops over the slabs bound the
+    size of temporary arrays, e.g. for vectors stored on disk.
+
+    Parameters
+    ----------
+    a, b : int
+        Range of indices along first axis.
+
+    stride : int
+        Number of array entries per index along first axis.
+
+    size : int
+        Number of entries in each slab (default: '_slab_size').
+
+    Returns
+    -------
+    slabs : list of (int, int)
+        Range [c,d) of each slab.
+
+    """
+    size = _slab_size if size is None else size
+    step = max( 1, size // max( 1, stride ) )
+    return [(c, min( c+step, b )) for c in range( a, b, step )]
 
 #===============================================================================
 class StencilVectorSpace( VectorSpace ):
@@ -18,7 +65,7 @@ class StencilVectorSpace( VectorSpace ):
     are possible:
 
     - serial  : StencilVectorSpace( npts, pads, periods, dtype=float )
-    - parallel: StencilVectorSpace( cart, dtype=float )
+    - parallel: StencilVectorSpace( cart, dtype=float, exchange='shift' )
 
     Parameters
     ----------
@@ -38,6 +85,16 @@ class StencilVectorSpace( VectorSpace ):
     cart : spl.ddm.cart.Cart
         MPI Cartesian topology.
 
+    exchange : str
+        Engine used for updating the ghost regions in the parallel case:
+
+        . 'shift'   : one direction at a time, with point-to-point messages
+                      to the two neighbors along that direction (default);
+
+        . 'neighbor': a single neighborhood collective (MPI_NEIGHBOR_ALLTOALLW)
+                      with all the 3^ndim-1 neighbors, including the diagonal
+                      ones, on the graph communicator 'cart.comm_graph'.
+
     """
     def __init__( self, *args, **kwargs ):
 
@@ -46,6 +103,17 @@ class StencilVectorSpace( VectorSpace ):
         else:
             self._init_serial  ( *args, **kwargs )
 
+        # Same space with different data types (created when needed). Weak
+        # references avoid a reference cycle: hence the space, and its MPI
+        # communicators, are freed as soon as they are no longer used, and
+        # not by the garbage collector at different times on each process
+        self._astype_spaces = weakref.WeakValueDictionary()
+        self._astype_spaces[np.dtype( self._dtype )] = self
+
+        # Same space with different padding (created when needed)
+        self._padded_spaces = weakref.WeakValueDictionary()
+        self._padded_spaces[tuple( self._pads )] = self
+
     # ...
     def _init_serial( self, npts, pads, periods, dtype=float ):
 
@@ -64,9 +132,10 @@ class StencilVectorSpace( VectorSpace ):
         self._npts   = tuple( npts )
 
     # ...
-    def _init_parallel( self, cart, dtype=float ):
+    def _init_parallel( self, cart, dtype=float, exchange='shift' ):
 
         assert isinstance( cart, Cart )
+        assert exchange in ('shift', 'neighbor')
         self._parallel = True
 
         # Sequential attributes
@@ -88,6 +157,13 @@ class StencilVectorSpace( VectorSpace ):
         self._mpi_type   = mpi_type
         self._send_types = send_types
         self._recv_types = recv_types
+        self._exchange   = exchange
+
+        if exchange == 'neighbor':
+            self._neighbor_types = self._create_neighbor_types( cart, mpi_type )
+
+        # Datatypes for exchanging blocks of entries (created when needed)
+        self._block_types = {}
 
     #--------------------------------------
     # Abstract interface
@@ -115,6 +191,144 @@ class StencilVectorSpace( VectorSpace ):
     #--------------------------------------
     # Other properties/methods
     #--------------------------------------
+    def empty( self ):
+        """
+        Get a new StencilVector of the space V, without initializing its data
+        (i.e. no zero-filling). Ghost regions are flagged as not up-to-date.
+
+        Returns
+        -------
+        v : StencilVector
+            A new vector object with uninitialized components.
+
+        """
+        sizes = [e-s+2*p+1 for s,e,p in zip(self.starts, self.ends, self.pads)]
+        data  = np.empty( sizes, dtype=self.dtype )
+        return StencilVector._from_data( self, data, [False]*self.ndim )
+
+    # ...
+    def memmap( self, filename, mode='w+', offset=0 ):
+        """
+        Get a new StencilVector of the space V whose data array (ghost regions
+        included, in C order) is a memory-map to a binary file on disk, rather
+        than being stored in memory. Hence vectors larger than the available
+        memory can be used, e.g. for post-processing: slicing, 'toarray', 'dot'
+        and 'StencilMatrix.dot' process the data in slabs along x1.
+
+        Parameters
+        ----------
+        filename : str or file-like object
+            File containing the data array (see numpy.memmap). In the parallel
+            case, each process should use a different file.
+
+        mode : str
+            'w+' : create or overwrite file, with all components equal to zero;
+            'r+' : read and write existing file;
+            'r'  : read-only existing file;
+            'c'  : copy-on-write existing file (changes are not saved).
+
+        offset : int
+            Position of data array in the file, in bytes. For example, data may
+            be stored in a contiguous (not chunked) dataset 'dset' of an HDF5
+            file, with the shape of the padded array: the dataset is mapped
+            without copies with 'offset=dset.id.get_offset()'.
+
+        Returns
+        -------
+        v : StencilVector
+            A new vector object backed by the file. Its ghost regions are
+            flagged as up-to-date: for an existing file, the ghost regions
+            stored in it are trusted (as when the file was written from a
+            vector with updated ghost regions), so that a read-only vector can
+            be used in 'dot' and 'StencilMatrix.dot'. Otherwise, in modes
+            'r+' and 'c', call 'update_ghost_regions' before using the vector.
+
+        """
+        sizes = [e-s+2*p+1 for s,e,p in zip(self.starts, self.ends, self.pads)]
+        data  = np.memmap( filename, dtype=self.dtype, mode=mode, offset=offset,
+                           shape=tuple( sizes ) )
+        return StencilVector.from_buffer( self, data, ghost_regions_in_sync=True )
+
+    # ...
+    def astype( self, dtype ):
+        """
+        Get the space with the same distribution and padding but a different
+        type of scalar entries (e.g. numpy.float32 for low-precision solvers).
+        As long as it is in use, only one such space exists for each data
+        type, hence converting back and forth gives the same space objects.
+
+        Parameters
+        ----------
+        dtype : type
+            Type of scalar entries.
+
+        Returns
+        -------
+        W : spl.linalg.stencil.StencilVectorSpace
+            Space with the requested data type (self if dtype is the same).
+
+        """
+        key = np.dtype( dtype )
+
+        W   = self._astype_spaces.get( key )
+
+        if W is None:
+            if self._parallel:
+                W = StencilVectorSpace( self._cart, dtype=dtype, exchange=self._exchange )
+            else:
+                W = StencilVectorSpace( self._npts, self._pads, self._periods, dtype=dtype )
+            # Share cache, so that all spaces know each other
+            W._astype_spaces = self._astype_spaces
+            self._astype_spaces[key] = W
+
+        return W
+
+    # ...
+    def with_pads( self, pads ):
+        """
+        Get the space with the same distribution and type of scalar entries,
+        but a different padding: e.g. a matrix product has a wider stencil,
+        hence it acts on vectors with wider ghost regions. As long as it is
+        in use, only one such space exists for each padding.
+
+        Parameters
+        ----------
+        pads : tuple of int
+            Padding along each dimension. In the parallel case, it cannot
+            exceed the smallest number of entries owned by a process.
+
+        Returns
+        -------
+        W : spl.linalg.stencil.StencilVectorSpace
+            Space with the requested padding (self if pads are the same).
+
+        """
+        key = tuple( int( p ) for p in pads )
+        assert len( key ) == self._ndim
+        W   = self._padded_spaces.get( key )
+
+        if W is None:
+            if self._parallel:
+                cart = self._cart
+                assert all( n//d >= p for n,d,p in zip( self._npts, cart.nprocs, key ) ), \
+                        "Padding {} is larger than the local data.".format( key )
+                # Processes have the same coordinates in the new topology
+                cart = Cart( npts    = self._npts,
+                             pads    = key,
+                             periods = self._periods,
+                             reorder = False,
+                             comm    = cart.comm_cart,
+                             nprocs  = cart.nprocs )
+                W = StencilVectorSpace( cart, dtype=self._dtype, exchange=self._exchange )
+            else:
+                W = StencilVectorSpace( self._npts, key, self._periods, dtype=self._dtype )
+            # Share cache, so that all spaces know each other
+            W._padded_spaces = self._padded_spaces
+            self._padded_spaces[key] = W
+
+        return W
+
+    # ...
     @property
     def parallel( self ):
         return self._parallel
@@ -159,6 +373,11 @@ class StencilVectorSpace( VectorSpace ):
     def ndim( self ):
         return self._ndim
 
+    # ...
+    @property
+    def exchange( self ):
+        return self._exchange if self._parallel else None
+
     #---------------------------------------------------------------------------
     # PARALLEL FACILITIES
     #---------------------------------------------------------------------------
@@ -199,6 +418,199 @@ class StencilVectorSpace( VectorSpace ):
 
         return send_types, recv_types
 
+    # ...
+    @staticmethod
+    def _create_neighbor_types( cart, mpi_type ):
+        """ Create MPI subarray datatypes for exchanging data with all
+            neighbors at once (MPI_NEIGHBOR_ALLTOALLW).
+        """
+        data_shape = cart.shape
+        info       = cart.get_neighbor_info()
+
+        send_types = [mpi_type.Create_subarray(
+                          sizes    = data_shape,
+                          subsizes = info['buf_shape'  ][o],
+                          starts   = info['send_starts'][o],
+                      ).Commit() for o in info['send_offsets']]
+
+        recv_types = [mpi_type.Create_subarray(
+                          sizes    = data_shape,
+                          subsizes = info['buf_shape'  ][o],
+                          starts   = info['recv_starts'][o],
+                      ).Commit() for o in info['recv_offsets']]
+
+        # Each subarray is counted once, with zero displacement (in bytes)
+        send_counts = [1]*len( send_types )
+        recv_counts = [1]*len( recv_types )
+        send_displs = [0]*len( send_types )
+        recv_displs = [0]*len( recv_types )
+
+        return ((send_counts, send_displs), send_types), \
+               ((recv_counts, recv_displs), recv_types)
+
+    # ...
+    def _create_persistent_requests( self, data ):
+        """
+        Create persistent MPI requests (MPI_SEND_INIT/MPI_RECV_INIT) for
+        exchanging the ghost regions of a given data array, which must be
+        compatible with the local shape of this space.
+
+        Parameters
+        ----------
+        data : numpy.ndarray
+            Data array (with ghost regions) of a StencilVector in this space.
+
+        Returns
+        -------
+        requests : list of list of mpi4py.MPI.Prequest
+            For each direction, the inactive requests [recv(-1), recv(+1),
+            send(-1), send(+1)], to be started with MPI.Prequest.Startall.
+
+        """
+        assert self._parallel
+        assert data.shape == self._cart.shape
+
+        cart      = self._cart
+        comm_cart = cart.comm_cart
+
+        # NOTE: tag at receiver must match message tag at sender
+        tag = lambda disp: _tag_update+disp
+
+        requests = []
+        for direction in range( self._ndim ):
+
+            recv_reqs = []
+            send_reqs = []
+
+            for disp in [-1,1]:
+                info     = cart.get_shift_info( direction, disp )
+                recv_buf = (data, 1, self._recv_types[direction,disp])
+                send_buf = (data, 1, self._send_types[direction,disp])
+                recv_reqs.append( comm_cart.Recv_init( recv_buf, info['rank_source'], tag(disp) ) )
+                send_reqs.append( comm_cart.Send_init( send_buf, info['rank_dest'  ], tag(disp) ) )
+
+            requests.append( recv_reqs + send_reqs )
+
+        return requests
+
+    # ...
+    def _update_ghost_regions_blocks( self, data ):
+        """
+        Update the ghost regions of an array whose leading axes have the local
+        shape of this space (with ghost regions), and whose trailing axes form
+        a block of entries which is exchanged as a whole: e.g. all vectors of
+        a StencilMultiVector, or all stored diagonals of a matrix row.
+        Blocking, and collective in the parallel case.
+
+        Parameters
+        ----------
+        data : numpy.ndarray
+            C-contiguous array with shape (n1+2*p1, ..., nn+2*pn, ...).
+
+        """
+        nd = self._ndim
+
+        if self._parallel:
+
+            assert data.shape[:nd] == self._cart.shape
+            assert data.flags.c_contiguous
+
+            # MPI subarray datatypes with one block as elementary type
+            # (created only once for each block size)
+            block_size = int( np.prod( data.shape[nd:] ) )
+            if block_size not in self._block_types:
+                block_type = self._mpi_type.Create_contiguous( block_size ).Commit()
+                self._block_types[block_size] = \
+                        self._create_buffer_types( self._cart, block_type )
+                block_type.Free()
+
+            send_types, recv_types = self._block_types[block_size]
+            comm_cart = self._cart.comm_cart
+
+            # Directions are processed in sequence in order to fill corners
+            for direction in range( nd ):
+                for disp in [-1,1]:
+                    info = self._cart.get_shift_info( direction, disp )
+                    comm_cart.Sendrecv(
+                        sendbuf = (data, 1, send_types[direction,disp]),
+                        dest    = info['rank_dest'],
+                        sendtag = _tag_update_blocks+disp,
+                        recvbuf = (data, 1, recv_types[direction,disp]),
+                        source  = info['rank_source'],
+                        recvtag = _tag_update_blocks+disp,
+                    )
+
+        else:
+            for direction in range( nd ):
+
+                p   = self._pads[direction]
+                idx = lambda s: (slice(None),)*direction + (s,)
+
+                if self._periods[direction]:
+                    data[idx( slice(-p,None) )] = data[idx( slice( p, 2*p) )]
+                    data[idx( slice(None, p) )] = data[idx( slice(-2*p,-p) )]
+                else:
+                    data[idx( slice(-p,None) )] = 0
+                    data[idx( slice(None, p) )] = 0
+
+    # ...
+    def _accumulate_ghost_regions( self, data ):
+        """
+        Reverse of the ghost region update: the values in the ghost regions of
+        an array are sent back to the process which owns the corresponding
+        entries, and added to them; the ghost regions are then set to zero.
+        Along non-periodic directions, the values in the ghost regions beyond
+        the domain boundary are discarded. Blocking, and collective in the
+        parallel case.
+
+        Parameters
+        ----------
+        data : numpy.ndarray
+            Array with shape (n1+2*p1, ..., nn+2*pn, ...), whose leading axes
+            have the local shape of this space (with ghost regions).
+
+        """
+        nd = self._ndim
+
+        # Directions are processed in reverse order, so that the contributions
+        # to corners are first added to the ghost regions of the neighbors
+        for direction in reversed( range( nd ) ):
+
+            p   = self._pads[direction]
+            idx = lambda s: (slice(None),)*direction + (s,)
+
+            # Ghost regions filled by the shift 'disp' in the forward update,
+            # and owned entries which the neighbors copy into them
+            ghost = {-1: idx( slice(-p,None) ), 1: idx( slice(None, p) )}
+            owned = {-1: idx( slice( p, 2*p) ), 1: idx( slice(-2*p,-p) )}
+
+            if self._parallel:
+
+                comm_cart = self._cart.comm_cart
+
+                for disp in [-1,1]:
+                    # Same neighbors as in the ghost region update, but data
+                    # moves in opposite direction: receive from 'rank_dest'
+                    info    = self._cart.get_shift_info( direction, disp )
+                    sendbuf = np.ascontiguousarray( data[ghost[disp]] )
+                    recvbuf = np.zeros_like( sendbuf )
+                    comm_cart.Sendrecv(
+                        sendbuf = sendbuf,
+                        dest    = info['rank_source'],
+                        sendtag = _tag_accumulate+disp,
+                        recvbuf = recvbuf,
+                        source  = info['rank_dest'],
+                        recvtag = _tag_accumulate+disp,
+                    )
+                    data[owned[disp]] += recvbuf
+
+            elif self._periods[direction]:
+                data[owned[-1]] += data[ghost[-1]]
+                data[owned[ 1]] += data[ghost[ 1]]
+
+            data[ghost[-1]] = 0
+            data[ghost[ 1]] = 0
+
     # ...
     def get_send_type( self, direction, disp ):
         return self._send_types[direction,disp] if self._parallel else None
@@ -226,8 +638,17 @@ class StencilVector( Vector ):
         self._data  = np.zeros( sizes, dtype=V.dtype )
         self._space = V
 
-        # TODO: distinguish between different directions
-        self._sync  = True
+        # Ghost regions are up-to-date along each direction
+        self._sync  = [True]*V.ndim
+
+        # Pending non-blocking ghost region update (if any)
+        self._requests   = None
+        self._directions = None
+        self._exchanged  = None
+
+        # Persistent MPI requests for ghost region update (created when needed)
+        self._persistent_data     = None
+        self._persistent_requests = None
 
     #--------------------------------------
     # Abstract interface
@@ -243,7 +664,13 @@ class StencilVector( Vector ):
         assert v._space is self._space
 
         index = tuple( slice(p,-p) for p in self.pads )
-        res   = np.dot( self._data[index].flat, v._data[index].flat )
+        x     = self._data[index]
+        y     = v._data[index]
+
+        # Sum contributions of slabs along x1 (no copies of whole arrays)
+        res = np.dtype( self._space.dtype ).type( 0 )
+        for c,d in _slabs( 0, x.shape[0], x[0].size ):
+            res += np.dot( x[c:d].ravel(), y[c:d].ravel() )
 
         if self._space.parallel:
             res = self._space.cart.comm_cart.allreduce( res, op=MPI.SUM )
@@ -251,43 +678,37 @@ class StencilVector( Vector ):
         return res
 
     #...
-    def copy( self ):
-        w = StencilVector( self._space )
-        w._data[:] = self._data[:]
-        w._sync    = self._sync
-        return w
+    def copy( self, out=None ):
+        if out is None:
+            return StencilVector._from_data( self._space, self._data.copy(), list( self._sync ) )
+        assert isinstance( out, StencilVector )
+        assert out._space is self._space
+        if out is not self:
+            np.copyto( out._data, self._data )
+            out._sync = list( self._sync )
+        return out
 
     #...
     def __mul__( self, a ):
-        w = StencilVector( self._space )
-        w._data = self._data * a
-        w._sync = self._sync
-        return w
+        return StencilVector._from_data( self._space, self._data * a, list( self._sync ) )
 
     #...
     def __rmul__( self, a ):
-        w = StencilVector( self._space )
-        w._data = a * self._data
-        w._sync = self._sync
-        return w
+        return StencilVector._from_data( self._space, a * self._data, list( self._sync ) )
 
     #...
     def __add__( self, v ):
         assert isinstance( v, StencilVector )
         assert v._space is self._space
-        w = StencilVector( self._space )
-        w._data = self._data  +  v._data
-        w._sync = self._sync and v._sync
-        return w
+        data = self._data + v._data
+        return StencilVector._from_data( self._space, data, self._combine_sync( v ) )
 
     #...
     def __sub__( self, v ):
         assert isinstance( v, StencilVector )
         assert v._space is self._space
-        w = StencilVector( self._space )
-        w._data = self._data  -  v._data
-        w._sync = self._sync and v._sync
-        return w
+        data = self._data - v._data
+        return StencilVector._from_data( self._space, data, self._combine_sync( v ) )
 
     #...
     def __imul__( self, a ):
@@ -299,7 +720,7 @@ class StencilVector( Vector ):
         assert isinstance( v, StencilVector )
         assert v._space is self._space
         self._data += v._data
-        self._sync  = v._sync and self._sync
+        self._sync  = self._combine_sync( v )
         return self
 
     #...
@@ -307,12 +728,109 @@ class StencilVector( Vector ):
         assert isinstance( v, StencilVector )
         assert v._space is self._space
         self._data -= v._data
-        self._sync  = v._sync and self._sync
+        self._sync  = self._combine_sync( v )
+        return self
+
+    #...
+    def scale( self, a ):
+        self._data *= a
+        return self
+
+    #...
+    def axpy( self, a, x ):
+        assert isinstance( x, StencilVector )
+        assert x._space is self._space
+
+        y = self._data
+
+        # Use BLAS routine (no temporaries) on contiguous data, if BLAS
+        # supports the type of entries (not e.g. for integers)
+        if y.dtype.char in 'fdFD' and y.flags.c_contiguous and x._data.flags.c_contiguous:
+            axpy = get_blas_funcs( 'axpy', (y,) )
+            axpy( x._data.reshape(-1), y.reshape(-1), a=a )
+        else:
+            y += a * x._data
+
+        self._sync = self._combine_sync( x )
         return self
 
     #--------------------------------------
     # Other properties/methods
     #--------------------------------------
+    def astype( self, dtype, out=None ):
+        """
+        Convert vector to a different type of scalar entries (ghost regions
+        included), in the corresponding space 'self.space.astype( dtype )'.
+
+        Parameters
+        ----------
+        dtype : type
+            Type of scalar entries.
+
+        out : spl.linalg.stencil.StencilVector
+            Existing vector of the converted space, where data is copied
+            (optional).
+
+        Returns
+        -------
+        out : spl.linalg.stencil.StencilVector
+            Converted vector.
+
+        """
+        W = self._space.astype( dtype )
+
+        if out is None:
+            return StencilVector._from_data( W, self._data.astype( W.dtype ), list( self._sync ) )
+
+        assert isinstance( out, StencilVector )
+        assert out._space is W
+        np.copyto( out._data, self._data, casting='same_kind' )
+        out._sync = list( self._sync )
+        return out
+
+    # ...
+    @staticmethod
+    def from_buffer( V, data, *, ghost_regions_in_sync=False ):
+        """
+        Create a StencilVector of the space V which adopts an existing array
+        as its data (no copy): hence the vector and the caller share memory,
+        e.g. for coupling with external codes at each time step.
+
+        Parameters
+        ----------
+        V : spl.linalg.stencil.StencilVectorSpace
+            Space to which the new vector belongs.
+
+        data : numpy.ndarray or buffer-like object
+            Array with the local padded layout of V, i.e. with ghost regions
+            of size p along each direction: shape (e1-s1+1+2*p1, ...), and
+            same scalar type as V. The array must be C-contiguous, since the
+            MPI datatypes used for the ghost regions assume C order. Objects
+            exposing the buffer protocol are wrapped with numpy.asarray (no
+            copy).
+
+        ghost_regions_in_sync : bool
+            True if the ghost regions of the given array are up-to-date.
+
+        Returns
+        -------
+        v : spl.linalg.stencil.StencilVector
+            A new vector object which wraps the given array.
+
+        """
+        assert isinstance( V, StencilVectorSpace )
+
+        if not isinstance( data, np.ndarray ):
+            data = np.asarray( data )
+
+        sizes = tuple( e-s+2*p+1 for s,e,p in zip(V.starts, V.ends, V.pads) )
+        assert data.shape == sizes
+        assert data.dtype == np.dtype( V.dtype )
+        assert data.flags.c_contiguous, "Buffer must be C-contiguous."
+
+        return StencilVector._from_data( V, data, [ghost_regions_in_sync]*V.ndim )
+
+    # ...
     @property
     def starts(self):
         return self._space.starts
@@ -327,6 +845,45 @@ class StencilVector( Vector ):
     def pads(self):
         return self._space.pads
 
+    # ...
+    @property
+    def data( self ):
+        """ Local data array, including ghost regions (no copy).
+        """
+        return self._data
+
+    # ...
+    @property
+    def owned_data( self ):
+        """ View of local data array restricted to the entries owned by the
+            process (no ghost regions), with shape (e1-s1+1, ...).
+        """
+        index = tuple( slice(p,p+e-s+1) for s,e,p in zip(self.starts, self.ends, self.pads) )
+        return self._data[index]
+
+    # Arithmetic operators of numpy arrays and scalars defer to StencilVector,
+    # e.g. numpy.float64 * v calls v.__rmul__ (no conversion with __array__)
+    __array_ufunc__ = None
+
+    # ...
+    def __array__( self, dtype=None, copy=None ):
+        """
+        Export the entries owned by the process as a numpy array, without copy
+        unless required (e.g. numpy.asarray( v ) is a view of 'owned_data').
+        In the parallel case, this is only the local block of the vector.
+
+        """
+        a = self.owned_data
+        if dtype is not None and np.dtype( dtype ) != a.dtype:
+            return a.astype( dtype )
+        return a.copy() if copy else a
+
+    # ...
+    def __buffer__( self, flags ):
+        """ Buffer protocol (Python >= 3.12): memoryview of 'owned_data'.
+        """
+        return memoryview( self.owned_data )
+
     # ...
     def __str__(self):
         txt  = '\n'
@@ -367,7 +924,7 @@ class StencilVector( Vector ):
 
     # ...
     def _toarray_parallel_no_pads( self ):
-        a         = np.zeros( self.space.npts )
+        a         = np.zeros( self.space.npts, dtype=self.space.dtype )
         idx_from  = tuple( slice(p,-p) for p in self.pads )
         idx_to    = tuple( slice(s,e+1) for s,e in zip(self.starts,self.ends) )
         a[idx_to] = self._data[idx_from]
@@ -378,7 +935,7 @@ class StencilVector( Vector ):
 
         # Step 0: create extended n-dimensional array with zero values
         shape = tuple( n+2*p for n,p in zip( self.space.npts, self.pads ) )
-        a = np.zeros( shape )
+        a = np.zeros( shape, dtype=self.space.dtype )
 
         # Step 1: write extended data chunk (local to process) onto array
         idx = tuple( slice(s,e+2*p+1) for s,e,p in
@@ -443,14 +1000,36 @@ class StencilVector( Vector ):
     # ...
     @property
     def ghost_regions_in_sync( self ):
-        return self._sync
+        return all( self._sync )
 
     # ...
     # NOTE: this property must be set collectively
     @ghost_regions_in_sync.setter
     def ghost_regions_in_sync( self, value ):
         assert isinstance( value, bool )
-        self._sync = value
+        self._sync = [value]*self._space.ndim
+
+    # ...
+    @property
+    def ghost_regions_sync( self ):
+        """
+        Tuple of booleans, one for each direction: True if the ghost regions
+        along that direction are up-to-date. A direction is stale only if the
+        vector elements within 'pad' distance of the boundaries normal to it
+        have changed; corner regions are therefore stale whenever any of their
+        directions is.
+
+        """
+        return tuple( self._sync )
+
+    # ...
+    # NOTE: this property must be set collectively
+    @ghost_regions_sync.setter
+    def ghost_regions_sync( self, value ):
+        value = tuple( value )
+        assert len( value ) == self._space.ndim
+        assert all( isinstance( v, bool ) for v in value )
+        self._sync = list( value )
 
     # ...
     # TODO: maybe change name to 'exchange'
@@ -479,12 +1058,124 @@ class StencilVector( Vector ):
             assert isinstance( direction, int )
             assert 0 <= direction < ndim
             update_ghost_regions( direction )
+            self._sync[direction] = True
+            return
+
+        if parallel and self._space.exchange == 'neighbor':
+            # PARALLEL CASE: all directions at once with neighborhood collective
+            self._update_ghost_regions_neighbor()
         else:
             for direction in range(ndim):
                 update_ghost_regions( direction )
 
         # Flag ghost regions as up-to-date
-        self._sync = True
+        self._sync = [True]*ndim
+
+    # ...
+    def accumulate_ghost_regions( self ):
+        """
+        Reverse of 'update_ghost_regions': add the values stored in the ghost
+        regions to the corresponding entries of the process which owns them,
+        then set the ghost regions to zero. This allows one to assemble a
+        vector by looping over the elements local to the process only (see
+        'TensorFemSpace.local_domain'), without any overlap, while adding the
+        contributions to all basis functions, including the ghost ones.
+
+        Along non-periodic directions, the values in the ghost regions beyond
+        the domain boundary are discarded.
+
+        """
+        assert self._requests is None, "Ghost region update in progress."
+
+        self._space._accumulate_ghost_regions( self._data )
+
+        # Flag ghost regions as not up-to-date
+        self._sync = [False]*self._space.ndim
+
+    # ...
+    def start_update_ghost_regions( self, *, directions=None ):
+        """
+        Start a non-blocking update of the ghost regions. In the parallel case
+        with the 'shift' exchange engine, the exchange along the first direction
+        is posted and the method returns immediately; the following directions
+        are posted by subsequent calls to 'finish_update_ghost_regions' (or to
+        the private '_progress_ghost_regions', which never blocks). With the
+        'neighbor' engine, a single non-blocking neighborhood collective is
+        posted if all directions are requested.
+
+        The vector data must not be modified until the exchange is completed.
+
+        Parameters
+        ----------
+        directions : list of int
+            Directions along which to operate (if not specified, all of them).
+            Directions are always processed in increasing order.
+
+        """
+        assert self._requests is None, "Ghost region update already in progress."
+
+        ndim = self._space.ndim
+
+        if directions is None:
+            directions = list( range( ndim ) )
+        else:
+            directions = sorted( set( directions ) )
+            assert all( isinstance( d, int ) and 0 <= d < ndim for d in directions )
+
+        self._exchanged = directions
+
+        if not directions:
+            self._directions = []
+            self._requests   = []
+        elif self._space.parallel and self._space.exchange == 'neighbor' \
+                and len( directions ) == ndim:
+            self._directions = []
+            self._requests   = [self._start_update_ghost_regions_neighbor()]
+        elif self._space.parallel:
+            self._directions = list( directions )
+            self._requests   = self._start_update_ghost_regions_parallel( self._directions.pop(0) )
+        else:
+            for direction in directions:
+                self._update_ghost_regions_serial( direction )
+            self._directions = []
+            self._requests   = []
+
+    # ...
+    def finish_update_ghost_regions( self ):
+        """
+        Complete a ghost region update started with 'start_update_ghost_regions',
+        and flag ghost regions as up-to-date.
+
+        """
+        assert self._requests is not None, "No ghost region update in progress."
+
+        while True:
+            MPI.Request.Waitall( self._requests )
+            if not self._directions:
+                break
+            self._requests = self._start_update_ghost_regions_parallel( self._directions.pop(0) )
+
+        # Flag ghost regions as up-to-date along the exchanged directions
+        for direction in self._exchanged:
+            self._sync[direction] = True
+
+        self._requests  = None
+        self._exchanged = None
+
+    # ...
+    def _progress_ghost_regions( self ):
+        """
+        Advance an ongoing ghost region update without blocking: if the data
+        exchange along the current direction has completed, post the exchange
+        along the next direction (corners require the directions to be
+        processed in sequence).
+
+        """
+        if self._requests is None:
+            return
+
+        while self._directions and MPI.Request.Testall( self._requests ):
+            self._requests = self._start_update_ghost_regions_parallel( self._directions.pop(0) )
 
     # ...
     def _update_ghost_regions_serial( self, direction: int ):
@@ -521,42 +1212,117 @@ class StencilVector( Vector ):
     # ...
     def _update_ghost_regions_parallel( self, direction: int ):
 
-        u         = self._data
-        space     = self._space
-        cart      = space.cart
-        comm_cart = cart.comm_cart
-
-        # Choose non-negative invertible function tag(disp) >= 0
-        # NOTES:
-        #   . different values of disp must return different tags!
-        #   . tag at receiver must match message tag at sender
-        tag = lambda disp: 42+disp
-
-        # Requests' handles
-        requests = []
-
-        # Start receiving data (MPI_IRECV)
-        for disp in [-1,1]:
-            info     = cart.get_shift_info( direction, disp )
-            recv_typ = space.get_recv_type( direction, disp )
-            recv_buf = (u, 1, recv_typ)
-            recv_req = comm_cart.Irecv( recv_buf, info['rank_source'], tag(disp) )
-            requests.append( recv_req )
-
-        # Start sending data (MPI_ISEND)
-        for disp in [-1,1]:
-            info     = cart.get_shift_info( direction, disp )
-            send_typ = space.get_send_type( direction, disp )
-            send_buf = (u, 1, send_typ)
-            send_req = comm_cart.Isend( send_buf, info['rank_dest'], tag(disp) )
-            requests.append( send_req )
+        requests = self._start_update_ghost_regions_parallel( direction )
 
         # Wait for end of data exchange (MPI_WAITALL)
         MPI.Request.Waitall( requests )
 
-    #--------------------------------------
+    # ...
+    def _start_update_ghost_regions_parallel( self, direction: int ):
+
+        # Persistent requests are created only once for each data buffer
+        if self._persistent_requests is None or self._persistent_data is not self._data:
+            self._free_persistent_requests()
+            self._persistent_data     = self._data
+            self._persistent_requests = \
+                    self._space._create_persistent_requests( self._data )
+
+        # Start receiving and sending data (MPI_STARTALL)
+        requests = self._persistent_requests[direction]
+        MPI.Prequest.Startall( requests )
+
+        return requests
+
+    # ...
+    def _update_ghost_regions_neighbor( self ):
+
+        u         = self._data
+        comm      = self._space.cart.comm_graph
+        send_spec, recv_spec = self._space._neighbor_types
+
+        # NOTE: send and receive subarrays are disjoint regions of 'u'
+        comm.Neighbor_alltoallw( [u, *send_spec], [u, *recv_spec] )
+
+    # ...
+    def _start_update_ghost_regions_neighbor( self ):
+
+        u         = self._data
+        comm      = self._space.cart.comm_graph
+        send_spec, recv_spec = self._space._neighbor_types
+
+        return comm.Ineighbor_alltoallw( [u, *send_spec], [u, *recv_spec] )
+
+    # ...
+    def _free_persistent_requests( self ):
+
+        if self._persistent_requests and not MPI.Is_finalized():
+            for requests in self._persistent_requests:
+                for req in requests:
+                    req.Free()
+
+        self._persistent_data     = None
+        self._persistent_requests = None
+
+    # ...
+    def __del__( self ):
+
+        # Free persistent requests (if any)
+        if getattr( self, '_persistent_requests', None ):
+            self._free_persistent_requests()
+
+    #--------------------------------------
     # Private methods
     #--------------------------------------
+    @staticmethod
+    def _from_data( V, data, sync ):
+        """ Create StencilVector of space V which wraps array 'data' (no copy).
+        """
+        w = StencilVector.__new__( StencilVector )
+        w._data  = data
+        w._space = V
+        w._sync  = sync
+        w._requests   = None
+        w._directions = None
+        w._exchanged  = None
+        w._persistent_data     = None
+        w._persistent_requests = None
+        return w
+
+    # ...
+    def _combine_sync( self, v ):
+        """ Sync flags of a linear combination of self and v.
+        """
+        return [a and b for a,b in zip( self._sync, v._sync )]
+
+    # ...
+    def _flag_owned_entries_changed( self ):
+        """
+        Flag ghost regions as not up-to-date after (possibly all) the entries
+        owned by the process have changed, e.g. in the output of a library
+        operation: only along the directions with neighbors, i.e. periodic or
+        split among several processes. Along the other directions the ghost
+        regions lie beyond the domain boundary, hence they are not affected
+        (the flags of those directions are left unchanged).
+
+        """
+        V      = self._space
+        nprocs = V.cart.nprocs if V.parallel else [1]*V.ndim
+
+        for d,(periodic,n) in enumerate( zip( V.periods, nprocs ) ):
+            if periodic or n > 1:
+                self._sync[d] = False
+
+    # ...
+    def _update_stale_ghost_regions( self ):
+        """ Update ghost regions along the directions which are not up-to-date.
+        """
+        stale = [d for d,sync in enumerate( self._sync ) if not sync]
+
+        if stale:
+            self.start_update_ghost_regions( directions=stale )
+            self.finish_update_ghost_regions()
+
+    # ...
     def _getindex( self, key ):
 
         # TODO: check if we should ignore padding elements
@@ -574,6 +1340,170 @@ class StencilVector( Vector ):
             index.append(l)
         return tuple(index)
 
+#===============================================================================
+class StencilMultiVector:
+    """
+    Collection of vectors in n-dimensional stencil format, which belong to the
+    same space and are stored along the trailing axis of a single array (with
+    ghost regions). The ghost regions of all vectors are updated with a single
+    data exchange, and the matrix-vector product with a StencilMatrix is
+    computed for all vectors in one pass over the matrix entries.
+
+    Parameters
+    ----------
+    V : spl.linalg.stencil.StencilVectorSpace
+        Space to which all vectors belong.
+
+    nvec : int
+        Number of vectors.
+
+    """
+    def __init__( self, V, nvec ):
+
+        assert isinstance( V, StencilVectorSpace )
+        assert isinstance( nvec, int ) and nvec > 0
+
+        sizes = [e-s+2*p+1 for s,e,p in zip(V.starts, V.ends, V.pads)]
+        self._data  = np.zeros( sizes+[nvec], dtype=V.dtype )
+        self._space = V
+        self._nvec  = nvec
+        self._sync  = True
+
+    #--------------------------------------
+    # Properties
+    #--------------------------------------
+    @property
+    def space( self ):
+        return self._space
+
+    # ...
+    @property
+    def nvec( self ):
+        return self._nvec
+
+    # ...
+    @property
+    def starts( self ):
+        return self._space.starts
+
+    # ...
+    @property
+    def ends( self ):
+        return self._space.ends
+
+    # ...
+    @property
+    def pads( self ):
+        return self._space.pads
+
+    #--------------------------------------
+    # Methods
+    #--------------------------------------
+    def dot( self, w ):
+        """
+        Inner products between corresponding vectors of self and w, computed
+        with a single global reduction in the parallel case.
+
+        Parameters
+        ----------
+        w : spl.linalg.stencil.StencilMultiVector
+            Multi-vector with the same space and number of vectors.
+
+        Returns
+        -------
+        res : numpy.ndarray
+            Array of shape (nvec,), with res[j] = self[j].dot( w[j] ).
+
+        """
+        assert isinstance( w, StencilMultiVector )
+        assert w._space is self._space
+        assert w._nvec  == self._nvec
+
+        index = tuple( slice(p,-p) for p in self.pads )
+        u     = self._data[index].reshape( -1, self._nvec )
+        v     =    w._data[index].reshape( -1, self._nvec )
+        res   = np.einsum( 'ij,ij->j', u, v )
+
+        if self._space.parallel:
+            self._space.cart.comm_cart.Allreduce( MPI.IN_PLACE, res, op=MPI.SUM )
+
+        return res
+
+    # ...
+    def copy( self ):
+        w = StencilMultiVector( self._space, self._nvec )
+        w._data[...] = self._data
+        w._sync      = self._sync
+        return w
+
+    # ...
+    def get_vector( self, j ):
+        """ Copy of j-th vector, as a new StencilVector.
+        """
+        v = StencilVector( self._space )
+        v._data[...] = self._data[...,j]
+        v.ghost_regions_in_sync = self._sync
+        return v
+
+    # ...
+    def set_vector( self, j, v ):
+        """ Copy data (with ghost regions) of StencilVector v into j-th vector.
+        """
+        assert isinstance( v, StencilVector )
+        assert v.space is self._space
+        self._data[...,j] = v._data
+        self._sync = self._sync and v.ghost_regions_in_sync
+
+    # ...
+    def __getitem__( self, key ):
+        index = self._getindex( key )
+        return self._data[index]
+
+    # ...
+    def __setitem__( self, key, value ):
+        index = self._getindex( key )
+        self._data[index] = value
+
+    # ...
+    @property
+    def ghost_regions_in_sync( self ):
+        return self._sync
+
+    # ...
+    # NOTE: this property must be set collectively
+    @ghost_regions_in_sync.setter
+    def ghost_regions_in_sync( self, value ):
+        assert isinstance( value, bool )
+        self._sync = value
+
+    # ...
+    def update_ghost_regions( self ):
+        """
+        Update ghost regions of all vectors at once: one message per neighbor
+        in the parallel case, independently of the number of vectors.
+
+        """
+        self._space._update_ghost_regions_blocks( self._data )
+        self._sync = True
+
+    #--------------------------------------
+    # Private methods
+    #--------------------------------------
+    def _getindex( self, key ):
+        """
+        Global multi-index (i1,...,in) plus optional vector index j, to local
+        index in data array.
+
+        """
+        if not isinstance( key, tuple ):
+            key = (key,)
+
+        nd    = self._space.ndim
+        index = [StencilMatrix._shift_index( i, p-s )
+                 for i,s,p in zip( key[:nd], self.starts, self.pads )]
+
+        return tuple( index ) + tuple( key[nd:] )
+
 #===============================================================================
 class StencilMatrix( LinearOperator ):
     """
@@ -592,18 +1522,25 @@ class StencilMatrix( LinearOperator ):
     W : spl.linalg.stencil.StencilVectorSpace
         Codomain of the new linear operator.
 
+    compact : bool
+        If True, only store the rows owned by the process: unlike the default
+        layout, no ghost rows are allocated around them (they are never used
+        by the matrix-vector product). Only owned rows can then be accessed.
+
     """
-    def __init__( self, V, W ):
+    def __init__( self, V, W, *, compact=False ):
 
         assert isinstance( V, StencilVectorSpace )
         assert isinstance( W, StencilVectorSpace )
         assert V is W
 
-        dims        = [e-s+2*p+1 for s,e,p in zip(V.starts, V.ends, V.pads)]
+        row_pads    = (0,)*V.ndim if compact else tuple( V.pads )
+        dims        = [e-s+2*r+1 for s,e,r in zip(V.starts, V.ends, row_pads)]
         diags       = [2*p+1 for p in V.pads]
         self._data  = np.zeros( dims+diags, dtype=V.dtype )
         self._space = V
         self._ndim  = len( dims )
+        self._row_pads = row_pads
 
     #--------------------------------------
     # Abstract interface
@@ -620,45 +1557,181 @@ class StencilMatrix( LinearOperator ):
     # ...
     def dot( self, v, out=None ):
 
+        if isinstance( v, StencilMultiVector ):
+            return self._dot_multi( v, out )
+
         assert isinstance( v, StencilVector )
         assert v.space is self.domain
 
-        # Necessary if vector space is distributed across processes
-        if not v.ghost_regions_in_sync:
-            v.update_ghost_regions()
-
         if out is not None:
             assert isinstance( out, StencilVector )
             assert out.space is self.codomain
         else:
             out = StencilVector( self.codomain )
 
-        # Shortcuts
-        ss = self.starts
-        ee = self.ends
-        pp = self.pads
+        # Number of rows in matrix (along each dimension)
+        nrows = [e-s+1 for s,e in zip(self.starts, self.ends)]
+        pads  = self.pads
 
-        dot = np.dot
+        # Directions along which ghost regions are not up-to-date
+        stale = [d for d,sync in enumerate( v.ghost_regions_sync ) if not sync]
 
-        # Index for k=i-j
-        kk = [slice(None)] * self._ndim
+        if not stale:
+            # Ghost regions are up-to-date: compute all rows at once
+            bounds = [(0,n) for n in nrows]
+            self._dot( self._data, v._data, out._data, bounds, pads, self._row_pads )
 
-        # Number of rows in matrix (along each dimension)
-        nrows = [e-s+1 for s,e in zip(ss,ee)]
+        else:
+            # Start exchanging stale ghost regions (non-blocking in parallel case)
+            v.start_update_ghost_regions( directions=stale )
+
+            # Compute interior rows (which do not need any stale ghost data) in
+            # slabs, while advancing the data exchange between slabs
+            interior = [(p,n-p) if d in stale else (0,n)
+                        for d,(n,p) in enumerate( zip( nrows, pads ) )]
+            if all( a < b for a,b in interior ):
+                a0, b0 = interior[0]
+                for c0 in np.array_split( np.arange( a0, b0 ), self._ndim ):
+                    if len( c0 ):
+                        bounds = [(c0[0],c0[-1]+1)] + interior[1:]
+                        self._dot( self._data, v._data, out._data, bounds, pads, self._row_pads )
+                    v._progress_ghost_regions()
+            else:
+                interior = None
+
+            # Wait for end of data exchange
+            v.finish_update_ghost_regions()
+
+            # Compute boundary rows
+            for bounds in self._boundary_blocks( nrows, pads, interior ):
+                if all( a < b for a,b in bounds ):
+                    self._dot( self._data, v._data, out._data, bounds, pads, self._row_pads )
+
+        # IMPORTANT: flag that ghost regions are not up-to-date (only along
+        # directions with neighbors)
+        out._flag_owned_entries_changed()
+
+        return out
+
+    # ...
+    @staticmethod
+    def _dot( mat, x, out, bounds, pads, row_pads ):
+        """
+        Matrix-vector product on the padded data arrays: for each selected row
+        i, out[i] is the sum of mat[i,l] * x[i+k] over all multi-indices l = p+k
+        of the stencil, computed for a slab of rows at once by contracting the
+        stencil axes of mat with a strided window view of x.
+
+        Parameters
+        ----------
+        mat : numpy.ndarray
+            Data array of StencilMatrix, with shape (n1+2*r1, ..., 2*p1+1, ...).
+
+        x : numpy.ndarray
+            Data array of StencilVector (input), with shape (n1+2*p1, ...),
+            or of StencilMultiVector, with an additional trailing axis.
+
+        out : numpy.ndarray
+            Data array of StencilVector (output), with same shape as x.
+
+        bounds : list of (int, int)
+            Range [a,b) of local rows to be computed along each dimension,
+            relative to the first row owned by the process.
+
+        pads : tuple of int
+            Padding along each dimension.
+
+        row_pads : tuple of int
+            Number of ghost rows r in the matrix data, along each dimension
+            (r=p for the default layout, r=0 for the compact one).
+
+        """
+        # Use compiled kernel if available (not for multi-vectors)
+        if kernels.stencil_dot( mat, x, out, bounds, pads, row_pads ):
+            return
+
+        nd = len( pads )
+        ww = [2*p+1 for p in pads]
+
+        # Read-only view of x with the stencil window of each row as trailing
+        # axes: xw[i,...,l] = x[i+l,...], i.e. column j-s+p = (i-s)+l
+        xw = as_strided( x,
+                shape   = [n-w+1 for n,w in zip( x.shape, ww )] + list( x.shape[nd:] ) + ww,
+                strides = x.strides + x.strides[:nd],
+                writeable = False )
+
+        # Contraction over the whole stencil of each row (and broadcast over
+        # trailing axes of x, for multi-vectors): no Python loop over the
+        # diagonals, and the entries of each row are read contiguously
+        w    = 'abcdefgh'[:nd]
+        v    = 'z' * (x.ndim - nd)
+        expr = '...{w},...{v}{w}->...{v}'.format( w=w, v=v )
+
+        # Rows are processed in slabs along x1, small enough for the matrix
+        # entries to stay in cache
+        (a1,b1), *inner = bounds
+        stride = int( np.prod( [b-a for a,b in inner] + list( mat.shape[nd:] ) ) )
+
+        for c1,d1 in _slabs( a1, b1, stride, _cache_slab_size ):
+
+            slab = [(c1,d1), *inner]
+
+            # Index of selected rows in padded arrays and in window view
+            ii = tuple( slice(p+a,p+b) for (a,b),p in zip(slab,pads) )
+            mm = tuple( slice(r+a,r+b) for (a,b),r in zip(slab,row_pads) )
+            jj = tuple( slice(a,b) for a,b in slab )
+
+            np.einsum( expr, mat[mm], xw[jj], out=out[ii], casting='same_kind' )
+
+    # ...
+    def _dot_multi( self, v, out ):
+        """
+        Apply matrix to all vectors of StencilMultiVector v in one pass over
+        the matrix entries, after one ghost region update for all of them.
 
-        for xx in np.ndindex( *nrows ):
+        """
+        assert v.space is self.domain
+
+        if out is not None:
+            assert isinstance( out, StencilMultiVector )
+            assert out.space is self.codomain
+            assert out.nvec  == v.nvec
+        else:
+            out = StencilMultiVector( self.codomain, v.nvec )
 
-            ii    = tuple( s+x for s,x in zip(ss,xx) )
-            jj    = tuple( slice(i-p,i+p+1) for i,p in zip(ii,pp) )
-            ii_kk = tuple( list(ii) + kk )
+        if not v.ghost_regions_in_sync:
+            v.update_ghost_regions()
 
-            out[ii] = dot( self[ii_kk].flat, v[jj].flat )
+        bounds = [(0,e-s+1) for s,e in zip(self.starts, self.ends)]
+        self._dot( self._data, v._data, out._data, bounds, self.pads, self._row_pads )
 
         # IMPORTANT: flag that ghost regions are not up-to-date
         out.ghost_regions_in_sync = False
 
         return out
 
+    # ...
+    @staticmethod
+    def _boundary_blocks( nrows, pads, interior ):
+        """
+        Split the local rows that are not in the 'interior' box into disjoint
+        boxes. If 'interior' is None, a single box with all rows is returned.
+
+        """
+        if interior is None:
+            return [[(0,n) for n in nrows]]
+
+        blocks = []
+        ndim   = len( nrows )
+        for d in range( ndim ):
+            (a,b)  = interior[d]
+            front  = interior[:d]
+            back   = [(0,n) for n in nrows[d+1:]]
+            blocks.append( front + [(0,a)       ] + back )
+            blocks.append( front + [(b,nrows[d])] + back )
+
+        return blocks
+
     #--------------------------------------
     # Other properties/methods
     #--------------------------------------
@@ -687,55 +1760,123 @@ class StencilMatrix( LinearOperator ):
         self._data[index] = value
 
     #...
-    def tocoo( self ):
+    def tocoo( self, *, remove_spurious=False ):
+        """
+        Convert the locally owned rows of the matrix to a sparse matrix in
+        COOrdinate format (global row and column indices, zeros removed).
+
+        Parameters
+        ----------
+        remove_spurious : bool
+            If True, along non-periodic directions discard the entries which
+            would couple opposite ends of the domain (see method
+            'remove_spurious_entries'), without modifying the stencil data.
+
+        Returns
+        -------
+        M : scipy.sparse.coo_matrix
+            Sparse matrix of shape (N,N), with N the global number of rows.
+
+        """
+        rows, cols, data = self._get_coo_arrays( remove_spurious )
 
-        # Shortcuts
         nn = self._space.npts
-        nd = self._ndim
 
-        ss = self.starts
-        pp = self.pads
+        return coo_matrix(
+                (data,(rows,cols)),
+                shape = [np.prod(nn)]*2,
+                dtype = self._space.dtype
+        )
 
-        ravel_multi_index = np.ravel_multi_index
+    #...
+    def tocsr( self, *, remove_spurious=False ):
+        """
+        Convert the locally owned rows of the matrix to a sparse matrix in
+        Compressed Sparse Row format, without passing through COO format.
 
-        # COO storage
-        rows = []
-        cols = []
-        data = []
+        Parameters
+        ----------
+        remove_spurious : bool
+            If True, along non-periodic directions discard the entries which
+            would couple opposite ends of the domain.
 
-        # Range of data owned by local process (no ghost regions)
-        local = tuple( [slice(p,-p) for p in pp] + [slice(None)] * nd )
+        Returns
+        -------
+        M : scipy.sparse.csr_matrix
+            Sparse matrix of shape (N,N), with N the global number of rows.
 
-        for (index,value) in np.ndenumerate( self._data[local] ):
+        """
+        rows, cols, data = self._get_coo_arrays( remove_spurious )
 
-            # index = [i1-s1, i2-s2, ..., p1+j1-i1, p2+j2-i2, ...]
+        # Rows are already sorted: only count the entries in each row
+        nrows = np.prod( self._space.npts )
 
-            xx = index[:nd]  # x=i-s
-            ll = index[nd:]  # l=p+k
+        return self._sorted_rows_to_csr( rows, cols, data, [nrows]*2 )
 
-            ii = [s+x for s,x in zip(ss,xx)]
-            jj = [(i+l-p) % n for (i,l,n,p) in zip(ii,ll,nn,pp)]
+    #...
+    def tocsr_local( self, *, remove_spurious=False ):
+        """
+        Convert the locally owned rows of the matrix to a pair of rank-local
+        sparse matrices in CSR format, following the 'diagonal/off-diagonal'
+        split of distributed AIJ matrices (as in PETSc's MPIAIJ format):
 
-            I = ravel_multi_index( ii, dims=nn, order='C' )
-            J = ravel_multi_index( jj, dims=nn, order='C' )
+          - the 'diagonal' block couples the local rows to the columns owned
+            by the same process, both numbered in C order of the local box
+            [starts, ends];
 
-            rows.append( I )
-            cols.append( J )
-            data.append( value )
+          - the 'off-diagonal' block couples the local rows to the ghost
+            columns, which are numbered according to 'col_map'.
 
-        M = coo_matrix(
-                (data,(rows,cols)),
-                shape = [np.prod(nn)]*2,
-                dtype = self._space.dtype
-        )
+        The global index space is never allocated: the product of the matrix
+        with a vector x is computed as
 
-        M.eliminate_zeros()
+            y_local = A_diag.dot( x_local ) + A_offd.dot( x_global[col_map] ).
 
-        return M
+        Parameters
+        ----------
+        remove_spurious : bool
+            If True, along non-periodic directions discard the entries which
+            would couple opposite ends of the domain.
 
-    #...
-    def tocsr( self ):
-        return self.tocoo().tocsr()
+        Returns
+        -------
+        A_diag : scipy.sparse.csr_matrix
+            Square block of shape (n_local, n_local).
+
+        A_offd : scipy.sparse.csr_matrix
+            Block of shape (n_local, n_ghost).
+
+        col_map : numpy.ndarray
+            Sorted global indices (C order) of the n_ghost ghost columns.
+
+        """
+        ss = self.starts
+        ee = self.ends
+        nn = self._space.npts
+        nl = [e-s+1 for s,e in zip( ss, ee )]
+
+        ii, jj, data = self._get_local_entries( remove_spurious )
+
+        # Columns owned by local process
+        owned = np.ones( data.shape, dtype=bool )
+        for j,s,e in zip( jj, ss, ee ):
+            owned &= (s <= j) & (j <= e)
+        ghost = ~owned
+
+        # Local row indices (sorted)
+        rows = np.ravel_multi_index( [i-s for i,s in zip( ii, ss )], dims=nl, order='C' )
+        nrows = np.prod( nl )
+
+        # Diagonal block: local column indices
+        cols   = np.ravel_multi_index( [j[owned]-s for j,s in zip( jj, ss )], dims=nl, order='C' )
+        A_diag = self._sorted_rows_to_csr( rows[owned], cols, data[owned], [nrows]*2 )
+
+        # Off-diagonal block: compressed global indices of ghost columns
+        cols = np.ravel_multi_index( [j[ghost] for j in jj], dims=nn, order='C' )
+        col_map, cols = np.unique( cols, return_inverse=True )
+        A_offd = self._sorted_rows_to_csr( rows[ghost], cols, data[ghost], [nrows,len( col_map )] )
+
+        return A_diag, A_offd, col_map
 
     #...
     def toarray( self ):
@@ -745,12 +1886,425 @@ class StencilMatrix( LinearOperator ):
     def max( self ):
         return self._data.max()
 
+    #...
+    @property
+    def compact( self ):
+        """ True if no ghost rows are stored (see constructor).
+        """
+        return not any( self._row_pads )
+
     #...
     def copy( self ):
-        M = StencilMatrix( self.domain, self.codomain )
-        M._data[:] = self._data[:]
+        M = StencilMatrix.__new__( type( self ) )
+        M.__dict__.update( self.__dict__ )
+        M._data = self._data.copy()
+        return M
+
+    #...
+    def astype( self, dtype ):
+        """
+        Copy of the matrix with a different type of scalar entries, which maps
+        the space 'self.domain.astype( dtype )' to itself.
+
+        """
+        M = StencilMatrix.__new__( type( self ) )
+        M.__dict__.update( self.__dict__ )
+        M._space = self._space.astype( dtype )
+        M._data  = self._data.astype( M._space.dtype )
         return M
 
+    #...
+    def transpose( self ):
+        """
+        Transpose matrix in stencil format: since A^T[i,j] = A[j,i], the entry
+        of the new matrix on row i and diagonal k is M[i,k] = A[i+k,-k].
+        In the parallel case, the rows of A which are owned by the neighbors
+        are obtained with one ghost region update of the matrix data.
+
+        Returns
+        -------
+        M : spl.linalg.stencil.StencilMatrix
+            New matrix with the same storage layout (compact or not).
+
+        """
+        V  = self._space
+        nd = self._ndim
+        pp = self.pads
+
+        # Full stencil of all local rows, including ghost rows
+        nrows  = [e-s+1 for s,e in zip( self.starts, self.ends )]
+        local  = tuple( slice(p,p+n) for p,n in zip( pp, nrows ) )
+        shape  = [n+2*p for p,n in zip( pp, nrows )] + [2*p+1 for p in pp]
+        data   = np.zeros( shape, dtype=self._data.dtype )
+        data[local] = self._get_local_data()
+        V._update_ghost_regions_blocks( data )
+
+        M = StencilMatrix( V, V, compact=self.compact )
+        y = M._get_local_data()
+
+        # Row i+k of A is found at local index (p+i+k) = (i+l) in padded data
+        for ll in np.ndindex( *shape[nd:] ):
+            ii = tuple( slice(l,l+n) for l,n in zip( ll, nrows ) )
+            kk = tuple( 2*p-l for l,p in zip( ll, pp ) )
+            y[(Ellipsis,)+ll] = data[ii+kk]
+
+        return M
+
+    #...
+    def dot_transpose( self, v, out=None ):
+        """
+        Matrix-free product with the transpose matrix, i.e. y = A^T v, which
+        only needs the entries of v owned by the process: each row i of A
+        contributes A[i,k]*v[i] to y[i+k], hence also to the ghost regions of
+        y. In the parallel case these contributions are sent back to their
+        owners and added to them, with a reverse ghost region exchange.
+
+        Parameters
+        ----------
+        v : spl.linalg.stencil.StencilVector
+            Vector in the codomain of the matrix.
+
+        out : spl.linalg.stencil.StencilVector
+            Vector in the domain of the matrix, where the result is stored
+            (optional).
+
+        Returns
+        -------
+        out : spl.linalg.stencil.StencilVector
+            Result of the product (ghost regions are not up-to-date).
+
+        """
+        assert isinstance( v, StencilVector )
+        assert v.space is self.codomain
+
+        if out is not None:
+            assert isinstance( out, StencilVector )
+            assert out.space is self.domain
+        else:
+            out = StencilVector( self.domain )
+
+        nrows = [e-s+1 for s,e in zip(self.starts, self.ends)]
+        self._dot_transpose( self._get_local_data(), v._data, out._data, nrows, self.pads )
+        self._space._accumulate_ghost_regions( out._data )
+
+        # IMPORTANT: flag that ghost regions are not up-to-date (only along
+        # directions with neighbors)
+        out._flag_owned_entries_changed()
+
+        return out
+
+    #...
+    def matmul( self, B ):
+        """
+        Matrix-matrix product C = A*B in stencil format. Since the entry of C
+        on row i and diagonal k is
+
+            C[i,k] = sum_{k1+k2=k} A[i,k1] * B[i+k1,k2],
+
+        the stencil width of C is the sum of those of A and B: hence C acts on
+        the space with the same distribution and wider padding, obtained with
+        'self.domain.with_pads'. In the parallel case, the rows of B which are
+        owned by the neighbors are obtained with one ghost region update of
+        the matrix data.
+
+        Parameters
+        ----------
+        B : spl.linalg.stencil.StencilMatrix
+            Matrix on a space with the same distribution as self.domain, but
+            possibly different padding.
+
+        Returns
+        -------
+        C : spl.linalg.stencil.StencilMatrix
+            New matrix with pads equal to the sum of those of A and B.
+
+        """
+        assert isinstance( B, StencilMatrix )
+        self._check_distribution( B )
+
+        Va = self.domain
+        nd = self._ndim
+        pa = self.pads
+        pb = B.pads
+
+        # Full stencil of B on local rows, with as many ghost rows as the
+        # stencil width of A
+        nrows = [e-s+1 for s,e in zip( self.starts, self.ends )]
+        local = tuple( slice(p,p+n) for p,n in zip( pa, nrows ) )
+        shape = [n+2*p for p,n in zip( pa, nrows )] + [2*q+1 for q in pb]
+        data  = np.zeros( shape, dtype=B._data.dtype )
+        data[local] = B._get_local_data()
+        Va._update_ghost_regions_blocks( data )
+
+        W = Va.with_pads( [p+q for p,q in zip( pa, pb )] )
+        C = StencilMatrix( W, W, compact=self.compact and B.compact )
+        a = self._get_local_data()
+        c = C._get_local_data()
+
+        for l1 in np.ndindex( *[2*p+1 for p in pa] ):
+
+            # Rows i+k1 of B, at local index (p+i+k1) = (i+l1) in padded data
+            ii = tuple( slice(l,l+n) for l,n in zip( l1, nrows ) )
+
+            # Diagonals l = l1+l2 of C, for all diagonals l2 of B
+            ll = tuple( slice(l,l+2*q+1) for l,q in zip( l1, pb ) )
+
+            c[(Ellipsis,)+ll] += a[(Ellipsis,)+l1+(None,)*nd] * data[ii]
+
+        # Entries coupling opposite ends of the domain come from spurious
+        # entries of B, which may be non-zero
+        C.remove_spurious_entries()
+
+        return C
+
+    #...
+    def __matmul__( self, B ):
+        return self.matmul( B )
+
+    #...
+    def triple_product( self, P, R=None ):
+        """
+        Triple product R*A*P in stencil format, e.g. the Galerkin projection
+        of the matrix A = self onto the space spanned by the columns of P.
+
+        The stencil format only represents square matrices on a given grid,
+        hence P and R must map the space of A to itself (up to the padding).
+        A rectangular P, e.g. a prolongation from a coarser space for the
+        coarse operator P^T*A*P between different spaces, is not supported.
+
+        Parameters
+        ----------
+        P : spl.linalg.stencil.StencilMatrix
+            Right factor, on a space with the same distribution as self.domain.
+
+        R : spl.linalg.stencil.StencilMatrix
+            Left factor (optional, default is the transpose of P), on a space
+            with the same distribution as self.domain.
+
+        Returns
+        -------
+        C : spl.linalg.stencil.StencilMatrix
+            New matrix with pads equal to the sum of those of R, A and P.
+
+        Raises
+        ------
+        ValueError
+            If P or R is not a StencilMatrix on the same grid as self, e.g.
+            because it maps between different spaces.
+
+        """
+        V = self.domain
+        for name, F in [('P', P), ('R', R)]:
+            if F is None:
+                continue
+            if not isinstance( F, StencilMatrix ) or \
+                    any( getattr( F.domain, a ) != getattr( V, a ) for a in ('npts', 'periods', 'starts', 'ends') ):
+                raise ValueError( "Factor {} of the triple product must be a StencilMatrix "
+                        "mapping the space of self to itself (only the padding may differ): "
+                        "factors between different spaces are not supported.".format( name ) )
+
+        if R is None:
+            R = P.transpose()
+
+        return R.matmul( self.matmul( P ) )
+
+    #...
+    def __mul__( self, a ):
+        M = self.copy()
+        M._data *= a
+        return M
+
+    #...
+    def __rmul__( self, a ):
+        return self.__mul__( a )
+
+    #...
+    def __add__( self, B ):
+        return self._lincomb( B, 1.0 )
+
+    #...
+    def __sub__( self, B ):
+        return self._lincomb( B, -1.0 )
+
+    #...
+    def __imul__( self, a ):
+        self._data *= a
+        return self
+
+    #...
+    def __iadd__( self, B ):
+        return self.axpy( 1.0, B )
+
+    #...
+    def __isub__( self, B ):
+        return self.axpy( -1.0, B )
+
+    #...
+    def axpy( self, a, B ):
+        """
+        In-place update self = self + a*B, directly on the stencil data.
+
+        Parameters
+        ----------
+        a : scalar
+            Coefficient of B.
+
+        B : spl.linalg.stencil.StencilMatrix
+            Matrix on a space with the same distribution as self.domain, and
+            padding not larger than that of self (a wider stencil does not
+            fit in place: use 'self + a*B' instead). If its storage layout
+            differs (e.g. symmetric, compact or narrower stencil), only the
+            owned rows of self are updated, using the full stencil of B.
+
+        Returns
+        -------
+        self : spl.linalg.stencil.StencilMatrix
+            Updated matrix.
+
+        """
+        assert isinstance( B, StencilMatrix )
+        self._check_distribution( B )
+        assert all( q <= p for p,q in zip( self.pads, B.pads ) ), \
+                "Stencil of B is wider than that of self."
+
+        if self._same_layout( B ):
+            y = self._data
+            x = B._data
+        else:
+            # Stencil of B is embedded in the central diagonals of self
+            ll = tuple( slice(p-q,p+q+1) for p,q in zip( self.pads, B.pads ) )
+            y  = self._get_local_data()[(Ellipsis,)+ll]
+            x  = B._get_local_data()
+
+        # Use BLAS routine (no temporaries) on contiguous data, if BLAS
+        # supports the type of entries (not e.g. for integers)
+        if y.dtype.char in 'fdFD' and y.flags.c_contiguous and x.flags.c_contiguous:
+            axpy = get_blas_funcs( 'axpy', (y,) )
+            axpy( x.reshape(-1), y.reshape(-1), a=a )
+        else:
+            y += a * x
+
+        return self
+
+    #...
+    def diagonal( self, out=None ):
+        """
+        Main diagonal of the matrix, i.e. the entries A[i,i] of all locally
+        owned rows, extracted with a single slice of the stencil data.
+
+        Parameters
+        ----------
+        out : spl.linalg.stencil.StencilVector
+            Vector in the codomain of the matrix, where the result is stored
+            (optional).
+
+        Returns
+        -------
+        out : spl.linalg.stencil.StencilVector
+            Diagonal entries (ghost regions are not up-to-date).
+
+        """
+        if out is not None:
+            assert isinstance( out, StencilVector )
+            assert out.space is self.codomain
+        else:
+            out = StencilVector( self.codomain )
+
+        nrows = [e-s+1 for s,e in zip( self.starts, self.ends )]
+        rows  = tuple( slice(r,r+n) for r,n in zip( self._row_pads, nrows ) )
+        local = tuple( slice(p,p+n) for p,n in zip( self.pads, nrows ) )
+
+        out._data[local] = self._data[rows + self._diagonal_index()]
+
+        # IMPORTANT: flag that ghost regions are not up-to-date (only along
+        # directions with neighbors)
+        out._flag_owned_entries_changed()
+
+        return out
+
+    #...
+    def scale_rows( self, d ):
+        """
+        In-place scaling of the rows, i.e. self = D*self with D = diag(d).
+
+        Parameters
+        ----------
+        d : spl.linalg.stencil.StencilVector
+            Scaling factors, in the codomain of the matrix.
+
+        Returns
+        -------
+        self : spl.linalg.stencil.StencilMatrix
+            Updated matrix.
+
+        """
+        assert isinstance( d, StencilVector )
+        assert d.space is self.codomain
+
+        nd    = self._ndim
+        nrows = [e-s+1 for s,e in zip( self.starts, self.ends )]
+        rows  = tuple( slice(r,r+n) for r,n in zip( self._row_pads, nrows ) )
+        local = tuple( slice(p,p+n) for p,n in zip( self.pads, nrows ) )
+
+        self._data[rows] *= d._data[local + (None,)*nd]
+
+        return self
+
+    #...
+    def scale_cols( self, d ):
+        """
+        In-place scaling of the columns, i.e. self = self*D with D = diag(d).
+        The ghost regions of d are updated if needed.
+
+        Parameters
+        ----------
+        d : spl.linalg.stencil.StencilVector
+            Scaling factors, in the domain of the matrix.
+
+        Returns
+        -------
+        self : spl.linalg.stencil.StencilMatrix
+            Updated matrix.
+
+        """
+        assert isinstance( d, StencilVector )
+        assert d.space is self.domain
+
+        if not d.ghost_regions_in_sync:
+            d.update_ghost_regions()
+
+        nrows = [e-s+1 for s,e in zip( self.starts, self.ends )]
+        rows  = tuple( slice(r,r+n) for r,n in zip( self._row_pads, nrows ) )
+
+        for ll in np.ndindex( *self._data.shape[self._ndim:] ):
+
+            # Local column indices: j-s+p = (i-s)+l
+            jj = tuple( slice(l,l+n) for l,n in zip( ll, nrows ) )
+
+            self._data[rows+ll] *= d._data[jj]
+
+        return self
+
+    #...
+    def scale_symmetric( self, d ):
+        """
+        In-place symmetric scaling self = D*self*D with D = diag(d), which
+        preserves the symmetry of the matrix: e.g. with d = 1/sqrt(diag(A))
+        all diagonal entries become 1.
+
+        Parameters
+        ----------
+        d : spl.linalg.stencil.StencilVector
+            Scaling factors, in the domain of the matrix.
+
+        Returns
+        -------
+        self : spl.linalg.stencil.StencilMatrix
+            Updated matrix.
+
+        """
+        return self.scale_rows( d ).scale_cols( d )
+
     #...
     def remove_spurious_entries( self ):
         """
@@ -793,6 +2347,171 @@ class StencilMatrix( LinearOperator ):
     #--------------------------------------
     # Private methods
     #--------------------------------------
+    def _same_layout( self, B ):
+        """ True if data of self and B have the same shape and meaning.
+        """
+        return type( B ) is type( self ) and B._row_pads == self._row_pads \
+                and tuple( B.pads ) == tuple( self.pads )
+
+    # ...
+    def _check_distribution( self, B ):
+        """ Check that the domains of self and B only differ by their padding.
+        """
+        Va = self.domain
+        Vb = B.domain
+        assert Va.npts    == Vb.npts
+        assert Va.periods == Vb.periods
+        assert Va.starts  == Vb.starts
+        assert Va.ends    == Vb.ends
+
+    # ...
+    def _lincomb( self, B, b ):
+        """
+        New matrix self + b*B, with a layout which can store both: if the pads
+        differ, the result acts on the space with the larger padding along each
+        direction (see 'StencilVectorSpace.with_pads').
+
+        """
+        assert isinstance( B, StencilMatrix )
+        self._check_distribution( B )
+
+        if self._same_layout( B ):
+            M = self.copy()
+        else:
+            W = self.domain.with_pads( [max( p, q ) for p,q in zip( self.pads, B.pads )] )
+            M = StencilMatrix( W, W, compact=self.compact and B.compact )
+            M.axpy( 1.0, self )
+
+        return M.axpy( b, B )
+
+    # ...
+    def _diagonal_index( self ):
+        """ Index l of the main diagonal (k=0) in the stencil data.
+        """
+        return tuple( self.pads )
+
+    # ...
+    def _get_local_data( self ):
+        """ Stencil data of locally owned rows (no ghost regions).
+        """
+        local = tuple( slice(r,r+e-s+1) for s,e,r in zip( self.starts, self.ends, self._row_pads ) )
+        return self._data[local]
+
+    # ...
+    def _get_local_entries( self, remove_spurious ):
+        """
+        Compute global multi-indices (i1,...,in) and (j1,...,jn) of rows and
+        columns, and values, of all non-zero entries in the locally owned rows,
+        with no loops over the entries: each index array is obtained by
+        broadcasting 1D arrays along the 2*ndim axes of the local data, i.e.
+        (i1,...,in,l1,...,ln). Entries are sorted by row index.
+
+        """
+        nn = self._space.npts
+        nd = self._ndim
+        ss = self.starts
+        ee = self.ends
+        pp = self.pads
+        PP = self._space.periods
+
+        data  = self._get_local_data()
+        mask  = data != 0
+
+        ii = []
+        jj = []
+        for d,(n,s,e,p,P) in enumerate( zip( nn, ss, ee, pp, PP ) ):
+
+            # Global row index i and column index j=i+l-p along direction d
+            shape_i = [1]*(2*nd); shape_i[d]    = e-s+1
+            shape_l = [1]*(2*nd); shape_l[nd+d] = 2*p+1
+
+            i = np.arange( s, e+1 ).reshape( shape_i )
+            j = i + np.arange( -p, p+1 ).reshape( shape_l )
+
+            if remove_spurious and not P:
+                mask = mask & (0 <= j) & (j < n)
+
+            ii.append( i )
+            jj.append( j % n )
+
+        ii = [np.broadcast_to( i, data.shape )[mask] for i in ii]
+        jj = [np.broadcast_to( j, data.shape )[mask] for j in jj]
+
+        return ii, jj, data[mask]
+
+    # ...
+    def _get_coo_arrays( self, remove_spurious ):
+        """
+        Compute global row indices, global column indices and values of all
+        non-zero entries in the locally owned rows (sorted by row index).
+
+        """
+        nn = self._space.npts
+        ii, jj, data = self._get_local_entries( remove_spurious )
+
+        rows = np.ravel_multi_index( ii, dims=nn, order='C' )
+        cols = np.ravel_multi_index( jj, dims=nn, order='C' )
+
+        return rows, cols, data
+
+    # ...
+    @staticmethod
+    def _dot_transpose( mat, x, out, nrows, pads ):
+        """
+        Transposed matrix-vector product on the data arrays: for each
+        multi-index l = p+k of the stencil, all owned rows i scatter the
+        contribution mat[i,l] * x[i] to out[i+k], which may be a ghost entry.
+
+        Parameters
+        ----------
+        mat : numpy.ndarray
+            Stencil data of owned rows, with shape (n1, ..., 2*p1+1, ...).
+
+        x : numpy.ndarray
+            Data array of StencilVector (input), with shape (n1+2*p1, ...).
+
+        out : numpy.ndarray
+            Data array of StencilVector (output), with same shape as x;
+            ghost regions are overwritten.
+
+        nrows : list of int
+            Number of owned rows along each dimension.
+
+        pads : tuple of int
+            Padding along each dimension.
+
+        """
+        ii = tuple( slice(p,p+n) for n,p in zip(nrows,pads) )
+
+        out[...] = 0.0
+        tmp = np.empty_like( x[ii] )
+
+        for ll in np.ndindex( *[2*p+1 for p in pads] ):
+
+            # Local column indices: j-s+p = (i-s)+l
+            jj = tuple( slice(l,l+n) for n,l in zip(nrows,ll) )
+
+            np.multiply( mat[(Ellipsis,)+ll], x[ii], out=tmp )
+            out[jj] += tmp
+
+    # ...
+    @staticmethod
+    def _sorted_rows_to_csr( rows, cols, data, shape ):
+        """
+        Create CSR matrix from COO arrays which are already sorted by row.
+
+        """
+        indptr = np.zeros( shape[0]+1, dtype=np.int64 )
+        np.cumsum( np.bincount( rows, minlength=shape[0] ), out=indptr[1:] )
+
+        M = csr_matrix( (data,cols,indptr), shape=shape )
+
+        # Periodic wrapping of small domains may give repeated columns
+        M.sum_duplicates()
+
+        return M
+
+    # ...
     def _getindex( self, key ):
 
         nd = self._ndim
@@ -801,8 +2520,11 @@ class StencilMatrix( LinearOperator ):
 
         index = []
 
-        for i,s,p in zip( ii, self.starts, self.pads ):
-            x = self._shift_index( i, p-s )
+        for i,s,e,r in zip( ii, self.starts, self.ends, self._row_pads ):
+            # Compact layout: negative local indices would silently wrap around
+            if r == 0:
+                self._check_owned_rows( i, s, e )
+            x = self._shift_index( i, r-s )
             index.append( x )
 
         for k,p in zip( kk, self.pads ):
@@ -811,6 +2533,24 @@ class StencilMatrix( LinearOperator ):
 
         return tuple(index)
 
+    # ...
+    @staticmethod
+    def _check_owned_rows( index, s, e ):
+        """
+        Raise IndexError if the row index (integer or slice) selects rows out
+        of the range [s,e] owned by the process, or if a slice bound is out of
+        [s,e+1]: with the compact layout there are no ghost rows, and such an
+        index would be converted to a negative local index.
+
+        """
+        if isinstance( index, slice ):
+            bounds = [b for b in (index.start, index.stop) if b is not None]
+            if any( b < s or b > e+1 for b in bounds ):
+                raise IndexError( "Slice {} of rows not within rows [{},{}] owned by "
+                        "process (compact layout).".format( index, s, e ) )
+        elif not s <= index <= e:
+            raise IndexError( "Row {} not owned by process (compact layout).".format( index ) )
+
     # ...
     @staticmethod
     def _shift_index( index, shift ):
@@ -821,5 +2561,497 @@ class StencilMatrix( LinearOperator ):
         else:
             return index + shift
 
+#===============================================================================
+class SymmetricStencilMatrix( StencilMatrix ):
+    """
+    Symmetric matrix in n-dimensional stencil format, which only stores the
+    upper half of the stencil: since M[i,k] = M[i+k,-k], only the diagonals
+    k = (k1,k2,...,kn) with k >= 0 in lexicographic order are kept, i.e.
+    k = 0 and those whose first non-zero component is positive. The storage
+    of each row has shape (p1+1, 2*p2+1, ..., 2*pn+1) instead of
+    (2*p1+1, ..., 2*pn+1): in the plane k1 = 0, the slots of the diagonals
+    k < 0 are not used.
+
+    Entries with k < 0 can be read (they are mirrored transparently from
+    the rows i+k, which requires up-to-date ghost regions), but not set:
+    assembly should only accumulate the upper half, e.g. in 2D
+    M[i1,i2,0,0:] += mat[p1,p2:] and M[i1,i2,1:,:] += mat[p1+1:,:]. As in
+    StencilMatrix, M[i1,i2] is the full stencil of row (i1,i2).
+
+    The mirrored entries are taken from the rows in the ghost regions, which
+    are updated by 'update_ghost_regions', or by 'remove_spurious_entries'
+    at the end of the assembly. In the serial case this happens
+    automatically when needed. In the parallel case setting entries only
+    affects the local process, and these calls are collective: computing the
+    product with a vector, or converting the matrix to other formats, raises
+    a RuntimeError on a process which set entries since the last update.
+    Reading mirrored entries is not collective, and raises a RuntimeError
+    whenever the ghost regions are not up-to-date.
+    Other methods which modify the entries are collective, and the ghost
+    regions are then updated automatically when needed.
+
+    Scaling the rows or the columns does not preserve the symmetry, hence
+    'scale_rows' and 'scale_cols' raise a TypeError: use 'scale_symmetric',
+    or convert to a general matrix with 'tostencil' first.
+
+    Parameters
+    ----------
+    V : spl.linalg.stencil.StencilVectorSpace
+        Domain of the new linear operator.
+
+    W : spl.linalg.stencil.StencilVectorSpace
+        Codomain of the new linear operator.
+
+    """
+    def __init__( self, V, W ):
+
+        assert isinstance( V, StencilVectorSpace )
+        assert isinstance( W, StencilVectorSpace )
+        assert V is W
+
+        dims        = [e-s+2*p+1 for s,e,p in zip(V.starts, V.ends, V.pads)]
+        diags       = [V.pads[0]+1] + [2*p+1 for p in V.pads[1:]]
+        self._data  = np.zeros( dims+diags, dtype=V.dtype )
+        self._space = V
+        self._ndim  = len( dims )
+        self._row_pads = tuple( V.pads )
+
+        # Ghost regions (rows owned by neighbors) are up-to-date: this flag is
+        # the same on all processes, since only collective methods change it
+        self._sync = True
+
+        # Entries were set on this process since the last update of the ghost
+        # regions (local flag, only relevant in the parallel case)
+        self._modified = False
+
+    #--------------------------------------
+    # Abstract interface
+    #--------------------------------------
+    def dot( self, v, out=None ):
+
+        # Mirrored entries are taken from rows in the ghost regions
+        self._update_stale_ghost_regions()
+
+        if isinstance( v, StencilMultiVector ):
+            return self._dot_multi( v, out )
+
+        assert isinstance( v, StencilVector )
+        assert v.space is self.domain
+
+        if out is not None:
+            assert isinstance( out, StencilVector )
+            assert out.space is self.codomain
+        else:
+            out = StencilVector( self.codomain )
+
+        # All rows are computed in a single pass over the stored entries, which
+        # also contribute to the rows i+k: ghost regions of v are needed first
+        v._update_stale_ghost_regions()
+
+        bounds = [(0,e-s+1) for s,e in zip( self.starts, self.ends )]
+        self._dot( self._data, v._data, out._data, bounds, self.pads, self._row_pads )
+
+        # IMPORTANT: flag that ghost regions are not up-to-date (only along
+        # directions with neighbors)
+        out._flag_owned_entries_changed()
+
+        return out
+
+    # ...
+    @staticmethod
+    def _dot( mat, x, out, bounds, pads, row_pads ):
+        """
+        Matrix-vector product on the padded data arrays. Each stored entry
+        a = M[i,k] is read once, and applied to both out[i] += a*x[i+k] and,
+        if k > 0, out[i+k] += a*x[i] (mirrored entry M[i+k,-k]): the source
+        rows i include the rows in the ghost regions, which must be
+        up-to-date. The arguments are the same as for 'StencilMatrix._dot',
+        but 'bounds' must select all local rows.
+
+        """
+        assert all( a == 0 for a,b in bounds )
+        assert tuple( row_pads ) == tuple( pads )
+
+        nrows = [b for a,b in bounds]
+
+        # Use compiled kernel if available (not for multi-vectors)
+        if kernels.symmetric_stencil_dot( mat, x, out, nrows, pads ):
+            return
+
+        # Broadcast matrix entries over trailing axes of x (multi-vectors)
+        bb = (None,) * (x.ndim - len( pads ))
+
+        (n1,*inner), (p1,*inner_pads) = nrows, pads
+
+        out[tuple( slice(p,p+n) for p,n in zip( pads, nrows ) )] = 0.0
+
+        # Source rows are processed in slabs along x1, small enough for their
+        # entries to stay in cache between the two products
+        stride = mat[0].size * int( np.prod( x.shape[len( pads ):] ) )
+
+        for c1,d1 in _slabs( -p1, n1, stride, _cache_slab_size ):
+
+            tmp = np.empty( (d1-c1,) + x.shape[1:], dtype=out.dtype )
+
+            for ll in np.ndindex( *mat.shape[len( pads ):] ):
+
+                kk   = (ll[0],) + tuple( l-p for l,p in zip( ll[1:], inner_pads ) )
+                sign = SymmetricStencilMatrix._diagonal_sign( kk )
+
+                # Unused slot of the plane k1 = 0
+                if sign < 0:
+                    continue
+
+                # Upper half: out[i] += M[i,k] * x[i+k], for owned rows i
+                rows = [(max( c1, 0 ), d1)] + [(0,n) for n in inner]
+                if rows[0][0] < rows[0][1]:
+                    ii = tuple( slice(p+a,p+b) for (a,b),p in zip( rows, pads ) )
+                    jj = tuple( slice(p+a+k,p+b+k) for (a,b),p,k in zip( rows, pads, kk ) )
+                    y  = tmp[tuple( slice(0,b-a) for a,b in rows )]
+                    np.multiply( mat[ii+ll+bb], x[jj], out=y )
+                    out[ii] += y
+
+                # Lower half: out[i+k] += M[i,k] * x[i], for owned rows i+k
+                k1 = kk[0]
+                rows = [(max( c1, -k1 ), min( d1, n1-k1 ))] + [(-k,n-k) for n,k in zip( inner, kk[1:] )]
+                if sign > 0 and rows[0][0] < rows[0][1]:
+                    ii = tuple( slice(p+a,p+b) for (a,b),p in zip( rows, pads ) )
+                    jj = tuple( slice(p+a+k,p+b+k) for (a,b),p,k in zip( rows, pads, kk ) )
+                    y  = tmp[tuple( slice(0,b-a) for a,b in rows )]
+                    np.multiply( mat[ii+ll+bb], x[ii], out=y )
+                    out[jj] += y
+
+    #--------------------------------------
+    # Other properties/methods
+    #--------------------------------------
+    def axpy( self, a, B ):
+
+        # A general matrix cannot be added to the upper half only
+        assert isinstance( B, SymmetricStencilMatrix ), \
+                "Only symmetric matrices can be added to a symmetric matrix."
+        assert B.domain is self.domain, \
+                "Only matrices with the same pads can be added to a symmetric matrix."
+
+        super().axpy( a, B )
+        self._sync     = self._sync and B._sync
+        self._modified = self._modified or B._modified
+
+        return self
+
+    # ...
+    def transpose( self ):
+        return self.copy()
+
+    # ...
+    def dot_transpose( self, v, out=None ):
+        return self.dot( v, out=out )
+
+    # ...
+    def tostencil( self ):
+        """
+        Convert to a general StencilMatrix, with the full stencil stored in
+        each row. Collective in the parallel case.
+
+        Returns
+        -------
+        M : spl.linalg.stencil.StencilMatrix
+            New matrix with the same entries.
+
+        """
+        V = self._space
+        M = StencilMatrix( V, V )
+
+        local = tuple( slice(p,p+e-s+1) for s,e,p in zip( self.starts, self.ends, self.pads ) )
+        M._data[local] = self._get_local_data()
+
+        return M
+
+    # ...
+    def scale_rows( self, d ):
+        raise TypeError( "Scaling the rows of a symmetric matrix breaks symmetry: "
+                "use 'scale_symmetric', or 'tostencil().scale_rows'." )
+
+    # ...
+    def scale_cols( self, d ):
+        raise TypeError( "Scaling the columns of a symmetric matrix breaks symmetry: "
+                "use 'scale_symmetric', or 'tostencil().scale_cols'." )
+
+    # ...
+    def scale_symmetric( self, d ):
+
+        assert isinstance( d, StencilVector )
+        assert d.space is self.domain
+
+        if not d.ghost_regions_in_sync:
+            d.update_ghost_regions()
+
+        nd    = self._ndim
+        pp    = self.pads
+        nrows = [e-s+1 for s,e in zip( self.starts, self.ends )]
+        local = tuple( slice(p,p+n) for p,n in zip( pp, nrows ) )
+
+        # Stored entry M[i,k] is scaled by d[i]*d[i+k]
+        for ll in np.ndindex( *self._data.shape[nd:] ):
+            kk = (ll[0],) + tuple( l-p for l,p in zip( ll[1:], pp[1:] ) )
+            jj = tuple( slice(p+k,p+k+n) for p,k,n in zip( pp, kk, nrows ) )
+            self._data[local+ll] *= d._data[local] * d._data[jj]
+
+        # Rows in ghost regions must be updated
+        self._sync = False
+
+        return self
+
+    # ...
+    def __getitem__( self, key ):
+
+        key = self._complete_key( key )
+
+        # Entries with k < 0 are mirrored from the entries in rows i+k, which
+        # must be up-to-date (this method is not collective)
+        if self._reads_lower_half( key ):
+            self._update_stale_ghost_regions( collective=False )
+            return self._get_full_stencil( key )
+
+        index = self._getindex( key )
+        return self._data[index]
+
+    # ...
+    def __setitem__( self, key, value ):
+
+        key = self._complete_key( key )
+
+        if self._reads_lower_half( key ):
+            raise IndexError( "Only the upper half (k >= 0 in lexicographic order) of a symmetric matrix can be set." )
+
+        index = self._getindex( key )
+        self._data[index] = value
+        self._modified = True
+
+    # ...
+    @property
+    def ghost_regions_in_sync( self ):
+        return self._sync and not self._modified
+
+    # ...
+    # NOTE: this property must be set collectively
+    @ghost_regions_in_sync.setter
+    def ghost_regions_in_sync( self, value ):
+        assert isinstance( value, bool )
+        self._sync     = value
+        self._modified = False
+
+    # ...
+    def update_ghost_regions( self ):
+        """
+        Update the rows in the ghost regions, which are needed for mirroring
+        the lower half of the stencil: with data from the neighbors in the
+        parallel case; along periodic directions (otherwise set to zero) in the
+        serial case. Collective in the parallel case.
+
+        """
+        # All stored diagonals of a row are exchanged as a single block
+        self._space._update_ghost_regions_blocks( self._data )
+
+        self._sync     = True
+        self._modified = False
+
+    # ...
+    def remove_spurious_entries( self ):
+        """
+        If any dimension is NOT periodic, make sure that the corresponding
+        periodic corners are set to zero. Along the first direction, only
+        the bottom-left corner (k1 > 0) is stored: the top-right corner is its
+        mirror image.
+
+        This method completes the assembly: it is collective, and the ghost
+        regions are updated when needed.
+
+        """
+        ndim  = self._space.ndim
+
+        for direction in range(ndim):
+
+            periodic = self._space.periods[direction]
+
+            if not periodic:
+
+                n = self._space.npts[direction]
+
+                s = self.starts[direction]
+                e = self.ends  [direction]
+                p = self.pads  [direction]
+
+                # Only k1 >= 0 is stored (the unused slots k < 0 are zeroed too)
+                idx_front = [slice(None)]*direction
+                idx_diags = [slice(0,None)]*(direction > 0) + idx_front[1:]
+                idx_back  = [slice(None)]*(ndim-direction-1)
+
+                # Top-right corner
+                if direction > 0:
+                    for i in range( max(0,s), min(p,e+1) ):
+                        index = tuple( idx_front + [i]            + idx_back +
+                                       idx_diags + [slice(-p,-i)] + idx_back )
+                        self._data[self._getindex( index )] = 0
+
+                # Bottom-left corner
+                for i in range( max(n-p,s), min(n,e+1) ):
+                    index = tuple( idx_front + [i]              + idx_back +
+                                   idx_diags + [slice(n-i,p+1)] + idx_back )
+                    self._data[self._getindex( index )] = 0
+
+        # Same state on all processes
+        self._sync     = False
+        self._modified = False
+
+    #--------------------------------------
+    # Private methods
+    #--------------------------------------
+    def _update_stale_ghost_regions( self, collective=True ):
+        """
+        Update the rows in the ghost regions if they are stale. The flag
+        '_sync' is the same on all processes, hence they all take part in the
+        update in the parallel case, with no communication for the decision.
+        Entries set on one process only cannot be detected by the others: the
+        update must then be requested explicitly. If the caller is not
+        collective, the update must always be requested explicitly in the
+        parallel case.
+
+        """
+        if self._space.parallel and (self._modified or not (collective or self._sync)):
+            raise RuntimeError( "Ghost regions of the symmetric matrix are not "
+                    "up-to-date: call 'update_ghost_regions' on all processes first." )
+
+        if not self._sync or self._modified:
+            self.update_ghost_regions()
+
+    # ...
+    def _get_local_data( self ):
+        """
+        Full stencil data of locally owned rows, with diagonal axes of length
+        2*p+1: the lower half is mirrored from the rows in the ghost regions.
+
+        """
+        self._update_stale_ghost_regions()
+
+        local = tuple( slice(s,e+1) for s,e in zip( self.starts, self.ends ) )
+        diags = (slice(None),) * self._ndim
+
+        return self._get_full_stencil( local + diags )
+
+    # ...
+    def _get_full_stencil( self, key ):
+        """
+        Entries of the full stencil (k < 0 included) for the selection 'key',
+        as in 'StencilMatrix.__getitem__'. They are computed for the selected
+        rows only: M[i,k] is stored for k >= 0, and M[i,-k] = M[i-k,k] is
+        taken from row i-k (zero if i-k is beyond the local ghost regions).
+
+        """
+        nd    = self._ndim
+        pp    = self.pads
+        shape = self._data.shape[:nd]
+
+        # Range [a,b) of selected rows in local data array, along each
+        # dimension, and index of the selection within this range
+        ranges = []
+        rows   = []
+        for i,s,r,n in zip( key[:nd], self.starts, self._row_pads, shape ):
+            i = self._shift_index( i, r-s )
+            if isinstance( i, slice ):
+                a,b,step = i.indices( n )
+                assert step > 0
+                ranges.append( (a,max( a,b )) )
+                rows  .append( slice(None,None,step) )
+            else:
+                i = i+n if i < 0 else i
+                ranges.append( (i,i+1) )
+                rows  .append( 0 )
+
+        full = np.zeros( [b-a for a,b in ranges] + [2*p+1 for p in pp], dtype=self._data.dtype )
+        fill = (slice(None),) * nd
+
+        for ll in np.ndindex( *self._data.shape[nd:] ):
+
+            kk   = (ll[0],) + tuple( l-p for l,p in zip( ll[1:], pp[1:] ) )
+            sign = self._diagonal_sign( kk )
+
+            # Unused slot of the plane k1 = 0
+            if sign < 0:
+                continue
+
+            # Upper half: M[i,k]
+            ii = tuple( slice(a,b) for a,b in ranges )
+            full[fill + tuple( p+k for p,k in zip( pp, kk ) )] = self._data[ii+ll]
+
+            # Lower half: M[i,-k] = M[i-k,k], for rows i-k in local data
+            if sign > 0:
+                src = [(max( a-k, 0 ), min( b-k, n )) for (a,b),k,n in zip( ranges, kk, shape )]
+                if all( c < d for c,d in src ):
+                    ii = tuple( slice(c,d) for c,d in src )
+                    jj = tuple( slice(c+k-a,d+k-a) for (c,d),(a,b),k in zip( src, ranges, kk ) )
+                    full[jj + tuple( p-k for p,k in zip( pp, kk ) )] = self._data[ii+ll]
+
+        diags = tuple( self._shift_index( k, p ) for k,p in zip( key[nd:], pp ) )
+
+        return full[tuple( rows ) + diags]
+
+    # ...
+    def _diagonal_index( self ):
+        """ Index l of the main diagonal (k=0) in the stencil data.
+        """
+        return (0,) + tuple( self.pads[1:] )
+
+    # ...
+    @staticmethod
+    def _diagonal_sign( kk ):
+        """ Sign of the first non-zero component of diagonal index k (0 if
+            k = 0): the entries with k < 0 are mirrored.
+        """
+        return next( (1 if k > 0 else -1 for k in kk if k != 0), 0 )
+
+    # ...
+    def _complete_key( self, key ):
+        """ Key with one index per row and diagonal dimension: as in
+            'StencilMatrix', missing indices select everything, e.g. M[i1,i2]
+            is the full stencil of row (i1,i2).
+        """
+        if not isinstance( key, tuple ):
+            key = (key,)
+        return key + (slice(None),) * (2*self._ndim-len( key ))
+
+    # ...
+    def _reads_lower_half( self, key ):
+        """ True if the complete key selects entries with k < 0 (lexicographic
+            order).
+        """
+        for k,p in zip( key[self._ndim:], self.pads ):
+            k = np.arange( -p, p+1 )[self._shift_index( k, p )]
+            if np.any( k < 0 ):
+                return True
+            if not np.any( k == 0 ):
+                return False
+
+        return False
+
+    # ...
+    def _getindex( self, key ):
+
+        nd = self._ndim
+        ii = key[:nd]
+        kk = key[nd:]
+
+        index = []
+
+        for i,s,r in zip( ii, self.starts, self._row_pads ):
+            x = self._shift_index( i, r-s )
+            index.append( x )
+
+        # Along first direction only k1 >= 0 is stored, with l1 = k1
+        for d,(k,p) in enumerate( zip( kk, self.pads ) ):
+            l = self._shift_index( k, p if d > 0 else 0 )
+            index.append( l )
+
+        return tuple(index)
+
 #===============================================================================
 del VectorSpace, Vector, LinearOperator
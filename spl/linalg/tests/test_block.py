@@ -90,6 +90,43 @@ def test_block_linear_operator_serial_dot( n1, n2, p1, p2, P1, P2  ):
     assert np.allclose( Y3.blocks[0].toarray(), y1.toarray(), rtol=1e-14, atol=1e-14 )
     assert np.allclose( Y3.blocks[1].toarray(), y2.toarray(), rtol=1e-14, atol=1e-14 )
 
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,16] )
+@pytest.mark.parametrize( 'n2', [8,12] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+
+def test_block_vector_serial_inplace( n1, n2, p1, p2, P1=True, P2=False ):
+
+    # Create vector space and product space
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    W = ProductSpace( V, V )
+
+    X = BlockVector( W )
+    Y = BlockVector( W )
+
+    # Fill in blocks with random values
+    for B in [X, Y]:
+        for b in B.blocks:
+            b[0:n1,0:n2] = np.random.random( (n1,n2) )
+
+    Xa = X.toarray()
+    Ya = Y.toarray()
+
+    # Work with existing vector: no new blocks are created
+    Z = W.empty()
+    blocks = Z.blocks
+
+    X.copy( out=Z )
+    Z.scale( 2.0 )
+    Z.axpy( -3.0, Y )
+    assert np.allclose( Z.toarray(), 2.0 * Xa - 3.0 * Ya, rtol=1e-14, atol=1e-14 )
+
+    Z.lincomb( 0.5, Y, 4.0, X )
+    assert np.allclose( Z.toarray(), 0.5 * Ya + 4.0 * Xa, rtol=1e-14, atol=1e-14 )
+
+    assert all( b1 is b2 for b1,b2 in zip( Z.blocks, blocks ) )
+
 #===============================================================================
 @pytest.mark.parametrize( 'n1', [8,16] )
 @pytest.mark.parametrize( 'n2', [8,12] )
@@ -75,3 +75,24 @@ def test_cg_tridiagonal( n ):
     # PYTEST
     #---------------------------------------------------------------------------
     assert err_norm < tol
+
+#===============================================================================
+@pytest.mark.parametrize( 'n', [5, 10, 13] )
+
+def test_cg_scipy_sparse( n ):
+    """
+    Test Conjugate Gradient algorithm with a scipy.sparse matrix, whose 'dot'
+    method has no 'out' argument.
+
+    """
+    from scipy.sparse import diags
+    from spl.linalg.iterative_solvers import cg
+
+    A  = diags( [-1.0, 2.0, -1.0], [-1, 0, 1], shape=(n,n), format='csr' )
+    xe = 2.0 * np.random.random( n ) - 1.0
+    b  = A.dot( xe )
+
+    x, info = cg( A, b, tol=1e-12 )
+
+    assert info['success']
+    assert np.linalg.norm( x-xe ) < 1e-13
@@ -0,0 +1,173 @@
+# -*- coding: UTF-8 -*-
+
+import pytest
+import numpy as np
+from scipy.sparse               import csr_matrix, dia_matrix
+from spl.linalg.direct_solvers  import BandedSolver, SparseSolver, DistributedBandedSolver
+
+#===============================================================================
+def banded_matrix( n, l, u ):
+    """ Random diagonally dominant banded matrix, in dense format.
+    """
+    A = np.zeros( (n,n) )
+    for k in range( -l, u+1 ):
+        A += np.diag( np.random.random( n-abs( k ) ), k )
+    A += np.diag( [l+u+1.0]*n )
+    return A
+
+# ... convert dense matrix to LAPACK banded format (see DGBTRF function)
+def to_bnd( A, l, u ):
+
+    cmat  = csr_matrix( A )
+    A_bnd = np.zeros( (1+u+2*l, cmat.shape[1]), dtype=A.dtype )
+
+    for i,j in zip( *cmat.nonzero() ):
+        A_bnd[l+u+i-j, j] = cmat[i,j]
+
+    return A_bnd
+
+#===============================================================================
+@pytest.mark.parametrize( 'n', [4,17] )
+@pytest.mark.parametrize( 'l', [0,1,3] )
+@pytest.mark.parametrize( 'u', [0,2] )
+@pytest.mark.parametrize( 'nrhs', [1,5] )
+@pytest.mark.parametrize( 'order', ['C','F'] )
+@pytest.mark.parametrize( 'kind', ['banded','sparse'] )
+
+def test_direct_solver_matrix_rhs( n, l, u, nrhs, order, kind ):
+
+    A = banded_matrix( n, l, u )
+
+    if kind == 'banded':
+        solver = BandedSolver( u, l, to_bnd( A, l, u ) )
+    else:
+        solver = SparseSolver( dia_matrix( A ) )
+
+    B = np.array( np.random.random( (n,nrhs) ), order=order )
+    X = np.linalg.solve( A, B )
+
+    # All right-hand sides at once
+    assert np.allclose( solver.solve( B ), X, rtol=1e-13, atol=1e-13 )
+
+    # Output argument
+    out = np.zeros( (n,nrhs), order=order )
+    assert solver.solve( B, out=out ) is out
+    assert np.allclose( out, X, rtol=1e-13, atol=1e-13 )
+
+    # One right-hand side at a time
+    for j in range( nrhs ):
+        assert np.allclose( solver.solve( B[:,j] ), X[:,j], rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n', [4,17] )
+@pytest.mark.parametrize( 'l', [0,1,3] )
+@pytest.mark.parametrize( 'u', [0,2] )
+@pytest.mark.parametrize( 'nrhs', [1,5] )
+
+def test_distributed_banded_solver_ser( n, l, u, nrhs ):
+
+    from mpi4py import MPI
+
+    A = banded_matrix( n, l, u )
+    B = np.random.random( (n,nrhs) )
+    X = np.linalg.solve( A, B )
+
+    # Single process: same as BandedSolver
+    solver = DistributedBandedSolver( u, l, to_bnd( A, l, u ), MPI.COMM_SELF, [0], [n-1] )
+
+    assert solver.finfo == 0
+    assert np.allclose( solver.solve( B ), X, rtol=1e-13, atol=1e-13 )
+    assert np.allclose( solver.solve( B[:,0] ), X[:,0], rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n', [13,40] )
+@pytest.mark.parametrize( 'l', [0,1,3] )
+@pytest.mark.parametrize( 'u', [0,2,3] )
+@pytest.mark.parametrize( 'nrhs', [1,5] )
+@pytest.mark.parallel
+
+def test_distributed_banded_solver_par( n, l, u, nrhs ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n],
+                 pads    = [max( l, u, 1 )],
+                 periods = [False],
+                 reorder = False,
+                 comm    = comm )
+
+    s, = cart.starts
+    e, = cart.ends
+
+    # Same matrix and right-hand side on all processes
+    rng = np.random.RandomState( 0 )
+    A = np.zeros( (n,n) )
+    for k in range( -l, u+1 ):
+        A += np.diag( rng.random_sample( n-abs( k ) ), k )
+    A += np.diag( [l+u+1.0]*n )
+    B = rng.random_sample( (n,nrhs) )
+    X = np.linalg.solve( A, B )
+
+    solver = DistributedBandedSolver( u, l, to_bnd( A, l, u ), comm,
+                                      cart.global_starts[0], cart.global_ends[0] )
+
+    # Only local rows of right-hand side are given
+    out = np.empty( (e-s+1,nrhs) )
+    assert solver.solve( B[s:e+1], out=out ) is out
+    assert np.allclose( out, X[s:e+1], rtol=1e-13, atol=1e-13 )
+    assert np.allclose( solver.solve( B[s:e+1,0] ), X[s:e+1,0], rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n', [13,40] )
+@pytest.mark.parametrize( 'l,u', [(1,2),(3,0)] )
+@pytest.mark.parametrize( 'mat_dtype,rhs_dtype,out_dtype,tol', [(np.float32   , np.float32   , np.float32   , 1e-5 ),
+                                                                (np.float64   , np.float32   , np.float64   , 1e-6 ),
+                                                                (np.float64   , np.complex128, np.complex128, 1e-13),
+                                                                (np.complex128, np.complex128, np.complex128, 1e-13)] )
+@pytest.mark.parallel
+
+def test_distributed_banded_solver_dtype_par( n, l, u, mat_dtype, rhs_dtype, out_dtype, tol ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n],
+                 pads    = [max( l, u, 1 )],
+                 periods = [False],
+                 reorder = False,
+                 comm    = comm )
+
+    s, = cart.starts
+    e, = cart.ends
+
+    # Same matrix and right-hand side on all processes
+    rng = np.random.RandomState( 0 )
+    A = np.zeros( (n,n), dtype=mat_dtype )
+    for k in range( -l, u+1 ):
+        A += np.diag( rng.random_sample( n-abs( k ) ), k )
+    if np.iscomplexobj( A ):
+        A += 1j * np.diag( rng.random_sample( n ) )
+    A += np.diag( [l+u+1.0]*n ).astype( mat_dtype )
+    B = rng.random_sample( (n,3) ).astype( rhs_dtype )
+    if np.iscomplexobj( B ):
+        B += 1j * rng.random_sample( (n,3) )
+    X = np.linalg.solve( A.astype( complex ), B.astype( complex ) )
+
+    solver = DistributedBandedSolver( u, l, to_bnd( A, l, u ), comm,
+                                      cart.global_starts[0], cart.global_ends[0] )
+
+    # Solution has the common type of matrix and right-hand side
+    x = solver.solve( B[s:e+1] )
+    assert solver.dtype == mat_dtype
+    assert x.dtype == out_dtype
+    assert np.allclose( x, X[s:e+1], rtol=tol, atol=tol )
+
+#===============================================================================
+# SCRIPT FUNCTIONALITY
+#===============================================================================
+if __name__ == "__main__":
+    import sys
+    pytest.main( sys.argv )
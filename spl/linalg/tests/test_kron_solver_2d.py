@@ -8,7 +8,7 @@ from spl.ddm.cart               import Cart
 from scipy.sparse               import csc_matrix, dia_matrix, kron
 from scipy.sparse.linalg        import splu
 from spl.linalg.stencil         import StencilVectorSpace, StencilVector, StencilMatrix
-from spl.linalg.kron            import kronecker_solve_2d_par
+from spl.linalg.kron            import KroneckerStencilMatrix_2D, kronecker_solve_2d_par
 from spl.linalg.direct_solvers  import SparseSolver, BandedSolver
 
 # ... return X, solution of (A1 kron A2)X = Y
@@ -41,6 +41,86 @@ def to_bnd(A):
     return A_bnd, la, ua
 # ...
 
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [7,15] )
+@pytest.mark.parametrize( 'n2', [8,12] )
+@pytest.mark.parametrize( 'p1', [1,2,3] )
+@pytest.mark.parametrize( 'p2', [1,2,3] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'compiled', [True, False] )
+def test_kron_stencil_matrix_2d_dot( n1, n2, p1, p2, P1, compiled, monkeypatch, P2=False ):
+
+    from spl.linalg import kernels
+
+    if compiled and kernels.numba is None:
+        pytest.skip( 'numba is not available' )
+
+    monkeypatch.setattr( kernels, 'enabled', compiled )
+
+    V  = StencilVectorSpace([n1, n2], [p1, p2], [P1, P2])
+    V1 = StencilVectorSpace([n1], [p1], [P1])
+    V2 = StencilVectorSpace([n2], [p2], [P2])
+
+    A1 = StencilMatrix(V1, V1)
+    A2 = StencilMatrix(V2, V2)
+    A1._data[:] = np.random.random(A1._data.shape)
+    A2._data[:] = np.random.random(A2._data.shape)
+    A1.remove_spurious_entries()
+    A2.remove_spurious_entries()
+
+    M = KroneckerStencilMatrix_2D(V, V, A1, A2)
+
+    X = StencilVector(V)
+    X[0:n1, 0:n2] = np.random.random((n1, n2))
+    X.update_ghost_regions()
+
+    Y = M.dot(X)
+    Y_glob = kron(A1.tocsr(), A2.tocsr()).dot(X.toarray())
+
+    assert np.allclose( Y.toarray(), Y_glob, rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [7,15] )
+@pytest.mark.parametrize( 'n2', [8,12] )
+@pytest.mark.parametrize( 'p1', [1,2,3] )
+@pytest.mark.parametrize( 'p2', [1,2,3] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parallel
+def test_kron_stencil_matrix_2d_dot_par( n1, n2, p1, p2, P1, P2=False ):
+
+    comm = MPI.COMM_WORLD
+
+    cart = Cart(npts = [n1, n2], pads = [p1, p2], periods = [P1, P2],\
+                reorder = False, comm = comm)
+
+    V  = StencilVectorSpace(cart)
+    V1 = StencilVectorSpace([n1], [p1], [P1])
+    V2 = StencilVectorSpace([n2], [p2], [P2])
+
+    [s1, s2] = V.starts
+    [e1, e2] = V.ends
+
+    # Same matrices on all processes
+    rng = np.random.RandomState(0)
+    A1 = StencilMatrix(V1, V1)
+    A2 = StencilMatrix(V2, V2)
+    A1._data[:] = rng.random_sample(A1._data.shape)
+    A2._data[:] = rng.random_sample(A2._data.shape)
+    A1.remove_spurious_entries()
+    A2.remove_spurious_entries()
+
+    M = KroneckerStencilMatrix_2D(V, V, A1, A2)
+
+    X_glob = rng.random_sample((n1, n2))
+    X = StencilVector(V)
+    X[s1:e1+1, s2:e2+1] = X_glob[s1:e1+1, s2:e2+1]
+    X.update_ghost_regions()
+
+    Y = M.dot(X)
+    Y_glob = kron(A1.tocsr(), A2.tocsr()).dot(X_glob.flatten()).reshape(n1, n2)
+
+    assert np.allclose( Y[s1:e1+1, s2:e2+1], Y_glob[s1:e1+1, s2:e2+1], rtol=1e-13, atol=1e-13 )
+
 #===============================================================================
 @pytest.mark.parametrize( 'n1', [7,15] )
 @pytest.mark.parametrize( 'n2', [8,12] )
@@ -109,7 +189,7 @@ def test_kron_solver_2d_band_par( n1, n2, p1, p2, P1=False, P2=False ):
     # ...
 
     # ... Check data
-    #assert np.allclose( X[s1:e1+1, s2:e2+1], X_glob[s1:e1+1, s2:e2+1], rtol=1e-13, atol=1e-13 )
+    assert np.allclose( X[s1:e1+1, s2:e2+1], X_glob[s1:e1+1, s2:e2+1], rtol=1e-13, atol=1e-13 )
 #===============================================================================
 
 #===============================================================================
@@ -0,0 +1,262 @@
+# -*- coding: UTF-8 -*-
+
+import pytest
+import numpy as np
+from functools                  import reduce
+from mpi4py                     import MPI
+from scipy.sparse               import csc_matrix, kron
+from scipy.sparse.linalg        import splu
+from spl.ddm.cart               import Cart
+from spl.linalg.stencil         import StencilVectorSpace, StencilVector, StencilMatrix
+from spl.linalg.kron            import kronecker_solve
+from spl.linalg.direct_solvers  import SparseSolver, BandedSolver, DistributedBandedSolver
+from spl.linalg.basic           import LinearSolver
+
+#===============================================================================
+def matrix_1d( n, p, P, a ):
+    """ 1D stencil matrix: diagonally dominant, with a non-symmetric stencil.
+    """
+    V = StencilVectorSpace( [n], [p], [P] )
+    A = StencilMatrix( V, V )
+    A[:,-p:0   ] = -a
+    A[:, 0 :1  ] = 4*a*p
+    A[:, 1 :p+1] = -1
+    A.remove_spurious_entries()
+    return A
+
+# ... convert 1D stencil matrix to LAPACK banded format (see DGBTRF function)
+def to_bnd( A ):
+
+    cmat = A.tocsr().tocoo()
+    l    = max( 0, np.max( cmat.row - cmat.col ) )
+    u    = max( 0, np.max( cmat.col - cmat.row ) )
+    bmat = np.zeros( (1+u+2*l, cmat.shape[1]) )
+    for i,j,v in zip( cmat.row, cmat.col, cmat.data ):
+        bmat[l+u+i-j,j] = v
+
+    return bmat, l, u
+
+# ... solver of 1D problem, either banded or sparse
+def solver_1d( A, banded ):
+
+    if not banded:
+        return SparseSolver( A.tocsr() )
+
+    bmat, l, u = to_bnd( A )
+    return BandedSolver( u, l, bmat )
+
+# ... solver of 1D problem distributed along one direction of a Cartesian topology
+def distributed_solver_1d( A, cart, axis ):
+
+    bmat, l, u = to_bnd( A )
+    return DistributedBandedSolver( u, l, bmat, cart.subcomm[axis],
+                                    cart.global_starts[axis], cart.global_ends[axis] )
+
+# ... X, solution of (A1 kron A2 kron ... An)X = Y
+def kron_solve_seq_ref( matrices, Y ):
+
+    C = csc_matrix( reduce( kron, [A.tocsr() for A in matrices] ) )
+    return splu( C ).solve( Y.reshape(-1) ).reshape( Y.shape )
+
+# ... solver which counts the 1D problems it solves
+class CountingSolver( LinearSolver ):
+
+    def __init__( self, solver ):
+        self._solver = solver
+        self.nlines  = 0
+
+    @property
+    def space( self ):
+        return self._solver.space
+
+    def solve( self, rhs, out=None ):
+        self.nlines += 1 if rhs.ndim == 1 else rhs.shape[1]
+        return self._solver.solve( rhs, out=out )
+
+#===============================================================================
+def args_kron_solver():
+    for npts in [(9,), (7,8), (6,5,7), (5,6,6,5)]:
+        for pads in [(1,2,1,2), (2,1,3,1)]:
+            for periodic in [True, False]:
+                yield npts, pads[:len( npts )], periodic
+
+#===============================================================================
+# SERIAL TESTS
+#===============================================================================
+@pytest.mark.parametrize( 'npts,pads,periodic', list( args_kron_solver() ) )
+
+def test_kron_solver_nd_ser( npts, pads, periodic ):
+
+    nd   = len( npts )
+    Ps   = [periodic] * nd
+    V    = StencilVectorSpace( npts, pads, Ps )
+
+    # Periodic 1D problems use sparse solvers, the others banded solvers
+    matrices = [matrix_1d( n, p, P, d+2 ) for d,(n,p,P) in enumerate( zip( npts, pads, Ps ) )]
+    solvers  = [solver_1d( A, not P ) for A,P in zip( matrices, Ps )]
+
+    Y_glob = np.random.random( npts )
+    Y = StencilVector( V )
+    Y[tuple( slice(0,n) for n in npts )] = Y_glob
+    Y.update_ghost_regions()
+
+    X_glob = kron_solve_seq_ref( matrices, Y_glob )
+    X = kronecker_solve( solvers, Y )
+
+    assert X.ghost_regions_in_sync
+    assert np.allclose( X.toarray(), X_glob.reshape(-1), rtol=1e-13, atol=1e-13 )
+
+    # In-place solve
+    Z = kronecker_solve( solvers, Y, out=Y )
+    assert Z is Y
+    assert np.allclose( Y.toarray(), X_glob.reshape(-1), rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+# PARALLEL TESTS
+#===============================================================================
+@pytest.mark.parametrize( 'npts,pads,periodic', list( args_kron_solver() ) )
+@pytest.mark.parallel
+
+def test_kron_solver_nd_par( npts, pads, periodic ):
+
+    comm = MPI.COMM_WORLD
+
+    nd   = len( npts )
+    Ps   = [periodic] * nd
+    cart = Cart( npts = npts, pads = pads, periods = Ps, reorder = False, comm = comm )
+    V    = StencilVectorSpace( cart )
+
+    index = tuple( slice(s,e+1) for s,e in zip( V.starts, V.ends ) )
+
+    matrices = [matrix_1d( n, p, P, d+2 ) for d,(n,p,P) in enumerate( zip( npts, pads, Ps ) )]
+    solvers  = [solver_1d( A, not P ) for A,P in zip( matrices, Ps )]
+
+    # Same right-hand side on all processes
+    Y_glob = np.random.RandomState( 0 ).random_sample( npts )
+    Y = StencilVector( V )
+    Y[index] = Y_glob[index]
+    Y.update_ghost_regions()
+
+    X_glob = kron_solve_seq_ref( matrices, Y_glob )
+    X = kronecker_solve( solvers, Y )
+
+    assert X.ghost_regions_in_sync
+    assert np.allclose( X[index], X_glob[index], rtol=1e-13, atol=1e-13 )
+
+    # Each line is solved by only one process
+    counters = [CountingSolver( solver ) for solver in solvers]
+    kronecker_solve( counters, Y )
+
+    for d,counter in enumerate( counters ):
+        nlines = comm.allreduce( counter.nlines, op=MPI.SUM )
+        assert nlines == np.prod( npts ) // npts[d]
+
+#===============================================================================
+@pytest.mark.parametrize( 'npts,pads', [((14,16),(1,2)), ((9,8,10),(2,1,2))] )
+@pytest.mark.parallel
+
+def test_kron_solver_nd_stale_directions_par( npts, pads, monkeypatch ):
+
+    comm = MPI.COMM_WORLD
+
+    # Only first direction is split among processes (no periodicity)
+    nd     = len( npts )
+    Ps     = [False] * nd
+    nprocs = [comm.Get_size()] + [1]*(nd-1)
+    cart   = Cart( npts = npts, pads = pads, periods = Ps, reorder = False, comm = comm, nprocs = nprocs )
+    V      = StencilVectorSpace( cart )
+
+    index = tuple( slice(s,e+1) for s,e in zip( V.starts, V.ends ) )
+
+    matrices = [matrix_1d( n, p, P, d+2 ) for d,(n,p,P) in enumerate( zip( npts, pads, Ps ) )]
+    solvers  = [solver_1d( A, True ) for A in matrices]
+
+    Y_glob = np.random.RandomState( 0 ).random_sample( npts )
+    Y = StencilVector( V )
+    Y[index] = Y_glob[index]
+    Y.update_ghost_regions()
+
+    # Record directions along which ghost regions are updated
+    exchanged = []
+    start     = StencilVector._start_update_ghost_regions_parallel
+
+    def spy( self, direction ):
+        exchanged.append( direction )
+        return start( self, direction )
+
+    monkeypatch.setattr( StencilVector, '_start_update_ghost_regions_parallel', spy )
+
+    X_glob = kron_solve_seq_ref( matrices, Y_glob )
+    X = kronecker_solve( solvers, Y )
+
+    # Directions without neighbors are never exchanged
+    assert X.ghost_regions_in_sync
+    assert exchanged == ([0] if comm.Get_size() > 1 else [])
+    assert np.allclose( X[index], X_glob[index], rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'npts,pads', [((12,1),(2,1)), ((16,2,1),(2,1,1))] )
+@pytest.mark.parallel
+
+def test_kron_solver_nd_float32_par( npts, pads ):
+
+    comm = MPI.COMM_WORLD
+
+    # First direction (solved first) split among all processes: there are
+    # fewer lines than processes, hence some of them do not solve any line
+    nd     = len( npts )
+    Ps     = [False] * nd
+    nprocs = [comm.Get_size()] + [1]*(nd-1)
+    cart   = Cart( npts = npts, pads = pads, periods = Ps, reorder = False, comm = comm, nprocs = nprocs )
+    V      = StencilVectorSpace( cart, dtype=np.float32 )
+
+    index = tuple( slice(s,e+1) for s,e in zip( V.starts, V.ends ) )
+
+    matrices = [matrix_1d( n, p, P, d+2 ) for d,(n,p,P) in enumerate( zip( npts, pads, Ps ) )]
+    solvers  = [solver_1d( A, True ) for A in matrices]
+
+    Y_glob = np.random.RandomState( 0 ).random_sample( npts ).astype( np.float32 )
+    Y = StencilVector( V )
+    Y[index] = Y_glob[index]
+    Y.update_ghost_regions()
+
+    X_glob = kron_solve_seq_ref( matrices, Y_glob.astype( float ) )
+    X = kronecker_solve( solvers, Y )
+
+    assert np.allclose( X[index], X_glob[index], rtol=1e-5, atol=1e-6 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'npts,pads', [((13,),(2,)), ((14,16),(1,2)), ((9,8,10),(2,1,2))] )
+@pytest.mark.parallel
+
+def test_kron_solver_nd_distributed_par( npts, pads ):
+
+    comm = MPI.COMM_WORLD
+
+    nd   = len( npts )
+    Ps   = [False] * nd
+    cart = Cart( npts = npts, pads = pads, periods = Ps, reorder = False, comm = comm )
+    V    = StencilVectorSpace( cart )
+
+    index = tuple( slice(s,e+1) for s,e in zip( V.starts, V.ends ) )
+
+    matrices = [matrix_1d( n, p, P, d+2 ) for d,(n,p,P) in enumerate( zip( npts, pads, Ps ) )]
+    solvers  = [distributed_solver_1d( A, cart, d ) for d,A in enumerate( matrices )]
+
+    # Same right-hand side on all processes
+    Y_glob = np.random.RandomState( 0 ).random_sample( npts )
+    Y = StencilVector( V )
+    Y[index] = Y_glob[index]
+    Y.update_ghost_regions()
+
+    X_glob = kron_solve_seq_ref( matrices, Y_glob )
+    X = kronecker_solve( solvers, Y )
+
+    assert np.allclose( X[index], X_glob[index], rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+# SCRIPT FUNCTIONALITY
+#===============================================================================
+if __name__ == "__main__":
+    import sys
+    pytest.main( sys.argv )
@@ -0,0 +1,110 @@
+# -*- coding: UTF-8 -*-
+
+import pytest
+import numpy as np
+from functools                  import reduce
+from mpi4py                     import MPI
+from scipy.sparse               import kron
+from spl.ddm.cart               import Cart
+from spl.linalg.stencil         import StencilVectorSpace, StencilVector, StencilMatrix
+from spl.linalg.kron            import KroneckerStencilMatrix
+
+#===============================================================================
+def matrix_1d( n, p, P, rng ):
+    """ 1D stencil matrix with random entries (same on all processes).
+    """
+    V = StencilVectorSpace( [n], [p], [P] )
+    A = StencilMatrix( V, V )
+    A._data[:] = rng.random_sample( A._data.shape )
+    A.remove_spurious_entries()
+    return A
+
+#===============================================================================
+def args_kron_matrix():
+    for npts in [(9,), (7,8), (6,5,7)]:
+        for pads,mpads in [((1,2,1),(1,2,1)), ((3,2,2),(1,2,1))]:
+            for periodic in [True, False]:
+                yield npts, pads[:len( npts )], mpads[:len( npts )], periodic
+
+#===============================================================================
+# SERIAL TESTS
+#===============================================================================
+@pytest.mark.parametrize( 'npts,pads,mpads,periodic', list( args_kron_matrix() ) )
+
+def test_kron_stencil_matrix_ser( npts, pads, mpads, periodic ):
+
+    rng  = np.random.RandomState( 0 )
+    nd   = len( npts )
+    V    = StencilVectorSpace( npts, pads, [periodic]*nd )
+    mats = [matrix_1d( n, p, periodic, rng ) for n,p in zip( npts, mpads )]
+
+    M = KroneckerStencilMatrix( V, V, *mats )
+    C = reduce( kron, [A.tocsr() for A in mats] ).toarray()
+
+    X = StencilVector( V )
+    X[tuple( slice(0,n) for n in npts )] = rng.random_sample( npts )
+    X.update_ghost_regions()
+
+    # Sparse format
+    assert M.tocoo().shape == C.shape
+    assert np.allclose( M.toarray(), C, rtol=1e-14, atol=1e-14 )
+
+    # Matrix-vector product, with and without output argument
+    Y   = M.dot( X )
+    out = StencilVector( V )
+    assert M.dot( X, out=out ) is out
+    assert Y.ghost_regions_in_sync
+    assert np.allclose( Y.toarray(), C.dot( X.toarray() ), rtol=1e-13, atol=1e-13 )
+    assert np.allclose( out.toarray(), Y.toarray(), rtol=1e-14, atol=1e-14 )
+
+    # Transpose
+    T = M.transpose()
+    assert isinstance( T, KroneckerStencilMatrix )
+    assert np.allclose( T.toarray(), C.T, rtol=1e-14, atol=1e-14 )
+    assert np.allclose( T.dot( X ).toarray(), C.T.dot( X.toarray() ), rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+# PARALLEL TESTS
+#===============================================================================
+@pytest.mark.parametrize( 'npts,pads,mpads,periodic', [((20,),(2,),(1,),True),
+                                                        ((14,16),(1,2),(1,2),False),
+                                                        ((14,16),(3,2),(1,2),True),
+                                                        ((12,11,13),(2,1,2),(1,1,2),False)] )
+@pytest.mark.parallel
+
+def test_kron_stencil_matrix_par( npts, pads, mpads, periodic ):
+
+    comm = MPI.COMM_WORLD
+
+    rng  = np.random.RandomState( 0 )
+    nd   = len( npts )
+    cart = Cart( npts = npts, pads = pads, periods = [periodic]*nd, reorder = False, comm = comm )
+    V    = StencilVectorSpace( cart )
+    mats = [matrix_1d( n, p, periodic, rng ) for n,p in zip( npts, mpads )]
+
+    index = tuple( slice(s,e+1) for s,e in zip( V.starts, V.ends ) )
+
+    M = KroneckerStencilMatrix( V, V, *mats )
+    C = reduce( kron, [A.tocsr() for A in mats] )
+
+    X_glob = rng.random_sample( npts )
+    X = StencilVector( V )
+    X[index] = X_glob[index]
+    X.update_ghost_regions()
+
+    Y_glob = C.dot( X_glob.reshape(-1) ).reshape( npts )
+    Y = M.dot( X )
+
+    assert np.allclose( Y[index], Y_glob[index], rtol=1e-13, atol=1e-13 )
+
+    Z_glob = C.T.dot( X_glob.reshape(-1) ).reshape( npts )
+    Z = M.transpose().dot( X )
+
+    assert np.allclose( Z[index], Z_glob[index], rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+# SCRIPT FUNCTIONALITY
+#===============================================================================
+if __name__ == "__main__":
+    import sys
+    pytest.main( sys.argv )
@@ -0,0 +1,142 @@
+import numpy as np
+import pytest
+from functools import partial
+
+from spl.linalg.stencil           import StencilVectorSpace, StencilVector, StencilMatrix
+from spl.linalg.iterative_solvers import cg, mixed_precision_refinement
+
+#===============================================================================
+def assemble_laplacian_2d( V ):
+    """
+    Symmetric positive definite matrix: 5-point Laplacian plus identity,
+    with unit grid spacing.
+    """
+    M = StencilMatrix( V, V )
+    s1,s2 = V.starts
+    e1,e2 = V.ends
+
+    M[s1:e1+1,s2:e2+1, 0, 0] =  5.0
+    M[s1:e1+1,s2:e2+1,-1, 0] = -1.0
+    M[s1:e1+1,s2:e2+1, 1, 0] = -1.0
+    M[s1:e1+1,s2:e2+1, 0,-1] = -1.0
+    M[s1:e1+1,s2:e2+1, 0, 1] = -1.0
+    M.remove_spurious_entries()
+
+    return M
+
+#===============================================================================
+# SERIAL TESTS
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,21] )
+@pytest.mark.parametrize( 'n2', [9,16] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+
+def test_stencil_float32_conversion( n1, n2, P1, P2, p1=1, p2=1 ):
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    W = V.astype( np.float32 )
+
+    # Only one space for each data type
+    assert W.dtype == np.float32
+    assert V.astype( float ) is V
+    assert W.astype( np.float64 ) is V
+    assert V.astype( 'float32' ) is W
+
+    M = assemble_laplacian_2d( V )
+    x = StencilVector( V )
+    x[0:n1,0:n2] = np.random.random( (n1,n2) )
+    x.update_ghost_regions()
+
+    # Conversion of vectors and matrices
+    M32 = M.astype( np.float32 )
+    x32 = x.astype( np.float32 )
+
+    assert M32.domain is W and M32._data.dtype == np.float32
+    assert x32.space  is W and x32._data.dtype == np.float32
+    assert x32.astype( np.float64, out=V.zeros() ).space is V
+
+    # Products in single precision
+    y32 = M32.dot( x32 )
+    y   = M.dot( x )
+
+    assert y32._data.dtype == np.float32
+    assert np.allclose( y32.toarray(), y.toarray(), rtol=1e-6, atol=1e-6 )
+    assert np.isclose( x32.dot( y32 ), x.dot( y ), rtol=1e-5 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,21] )
+@pytest.mark.parametrize( 'n2', [9,16] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+
+def test_mixed_precision_refinement_serial( n1, n2, P1, P2, p1=1, p2=1 ):
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    M = assemble_laplacian_2d( V )
+
+    # Manufacture right-hand-side vector from exact solution
+    xe = StencilVector( V )
+    xe[0:n1,0:n2] = 2.0 * np.random.random( (n1,n2) ) - 1.0
+    xe.update_ghost_regions()
+    b  = M.dot( xe )
+
+    # Inner solver in single precision cannot reach tolerance by itself
+    solver = partial( cg, tol=1e-4, maxiter=100 )
+    x, info = mixed_precision_refinement( M, b, solver, tol=1e-12, maxiter=20 )
+
+    assert info['success']
+    assert x.space is V
+    assert np.allclose( x.toarray(), xe.toarray(), rtol=1e-11, atol=1e-11 )
+
+#===============================================================================
+# PARALLEL TESTS
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,21] )
+@pytest.mark.parametrize( 'n2', [9,16] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+@pytest.mark.parallel
+
+def test_mixed_precision_refinement_parallel( n1, n2, P1, P2, p1=1, p2=1 ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2],
+                 pads    = [p1,p2],
+                 periods = [P1,P2],
+                 reorder = False,
+                 comm    = comm )
+
+    V = StencilVectorSpace( cart )
+    M = assemble_laplacian_2d( V )
+
+    s1,s2 = V.starts
+    e1,e2 = V.ends
+
+    xg = 2.0 * np.random.RandomState( 0 ).random_sample( (n1,n2) ) - 1.0
+    xe = StencilVector( V )
+    xe[s1:e1+1,s2:e2+1] = xg[s1:e1+1,s2:e2+1]
+    xe.update_ghost_regions()
+    b  = M.dot( xe )
+
+    # Ghost regions of single precision vectors
+    b32 = b.astype( np.float32 )
+    b32.update_ghost_regions()
+    b.update_ghost_regions()
+    assert np.allclose( b32._data, b._data, rtol=1e-6, atol=1e-6 )
+
+    solver = partial( cg, tol=1e-4, maxiter=100 )
+    x, info = mixed_precision_refinement( M, b, solver, tol=1e-12, maxiter=20 )
+
+    assert info['success']
+    assert np.allclose( x[s1:e1+1,s2:e2+1], xg[s1:e1+1,s2:e2+1], rtol=1e-11, atol=1e-11 )
+
+#===============================================================================
+# SCRIPT FUNCTIONALITY
+#===============================================================================
+if __name__ == "__main__":
+    import sys
+    pytest.main( sys.argv )
@@ -93,3 +93,53 @@ def test_pcg(n, p):
     #---------------------------------------------------------------------------
     assert err_norm1 < tol and err_norm2 < tol
 
+
+#===============================================================================
+@pytest.mark.parametrize( 'n', [5, 8] )
+@pytest.mark.parametrize( 'p', [1, 2] )
+def test_pcg_3d(n, p):
+    """
+    Test Jacobi preconditioner and preconditioned Conjugate Gradient algorithm
+    on 3D linear system.
+
+    Parameters
+    ----------
+    n : int
+        Number of rows along each dimension.
+
+    p : int
+        Padding along each dimension.
+
+    """
+    from spl.linalg.iterative_solvers import pcg, jacobi
+    from spl.linalg.stencil import StencilVectorSpace, StencilMatrix, StencilVector
+
+    V = StencilVectorSpace([n,n+1,n+2], [p,p,p], [False,True,False])
+
+    # Symmetric positive definite matrix: 2*p on main diagonal and -1/(3*p)
+    # on the other diagonals of each direction
+    A = StencilMatrix(V, V)
+    for d in range(3):
+        for k in range(1,p+1):
+            for sign in [-1,1]:
+                kk = [0,0,0]; kk[d] = sign*k
+                A[(slice(None),)*3 + tuple(kk)] = -1/(3*p)
+    A[:,:,:,0,0,0] = 2*p
+    A.remove_spurious_entries()
+
+    # Build exact solution
+    xe = StencilVector(V)
+    xe[0:n,0:n+1,0:n+2] = np.random.random((n,n+1,n+2))
+    xe.update_ghost_regions()
+
+    b = A.dot(xe)
+
+    # Jacobi preconditioner divides by diagonal
+    y = jacobi(A, b)
+    assert np.allclose(y.toarray(), b.toarray() / (2*p), rtol=1e-14, atol=1e-14)
+
+    # Solve linear system using PCG
+    x, info = pcg( A, b, pc="jacobi", tol=1e-12 )
+
+    assert info['success']
+    assert np.linalg.norm((x-xe).toarray()) < 1e-10
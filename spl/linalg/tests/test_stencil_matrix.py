@@ -5,6 +5,31 @@ import numpy as np
 from random import random
 
 from spl.linalg.stencil import StencilVectorSpace, StencilVector, StencilMatrix
+from spl.linalg.stencil import SymmetricStencilMatrix
+
+#===============================================================================
+def fill_symmetric_2d( M, npts ):
+    """
+    Fill in locally owned rows of 2D stencil matrix M with the entries of a
+    symmetric matrix A[i,j] = g(i,j), with g(i,j) = g(j,i). If M is a
+    SymmetricStencilMatrix, only the stored diagonals (k >= 0) are set.
+    """
+    n1,n2 = npts
+    p1,p2 = M.pads
+    s1,s2 = M.starts
+    e1,e2 = M.ends
+
+    g = lambda i1,i2,j1,j2: (1.0 + i1 + j1 + (i1*j1) % 5) / (3.0 + i2 + j2 + (i2*j2) % 3)
+
+    i1, i2 = np.ix_( range(s1,e1+1), range(s2,e2+1) )
+    upper = isinstance( M, SymmetricStencilMatrix )
+    for k1 in range(-p1,p1+1):
+        for k2 in range(-p2,p2+1):
+            if upper and (k1,k2) < (0,0):
+                continue
+            M[s1:e1+1,s2:e2+1,k1,k2] = g( i1, i2, (i1+k1) % n1, (i2+k2) % n2 )
+
+    M.remove_spurious_entries()
 
 #===============================================================================
 # SERIAL TESTS
@@ -152,6 +177,585 @@ def test_stencil_matrix_2d_serial_dot( n1, n2, p1, p2, P1, P2 ):
     # Check data in 1D array
     assert np.allclose( ya, ya_exact, rtol=1e-13, atol=1e-13 )
 
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [5,12] )
+@pytest.mark.parametrize( 'n2', [7,10] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+
+def test_stencil_matrix_2d_serial_dot_stale_directions( n1, n2, p1, p2, monkeypatch, P1=True, P2=False ):
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    M = StencilMatrix( V, V )
+    x = StencilVector( V )
+
+    M._data[:] = np.random.random( M._data.shape )
+    M.remove_spurious_entries()
+    x[0:n1,0:n2] = np.random.random( (n1,n2) )
+    x.update_ghost_regions()
+
+    # Ghost regions of output are stale only along the periodic direction
+    y = M.dot( x )
+    assert y.ghost_regions_sync == (False, True)
+
+    # Record directions along which ghost regions are updated
+    exchanged = []
+    update    = StencilVector._update_ghost_regions_serial
+
+    def spy( self, direction ):
+        exchanged.append( direction )
+        update( self, direction )
+
+    monkeypatch.setattr( StencilVector, '_update_ghost_regions_serial', spy )
+
+    z = M.dot( y )
+    assert exchanged == [0]
+
+    Ma = M.toarray()
+    assert np.allclose( z.toarray(), Ma.dot( Ma.dot( x.toarray() ) ), rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [5,8] )
+@pytest.mark.parametrize( 'n2', [6] )
+@pytest.mark.parametrize( 'n3', [5,7] )
+@pytest.mark.parametrize( 'p1', [1,2] )
+@pytest.mark.parametrize( 'p2', [1,3] )
+@pytest.mark.parametrize( 'p3', [2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P3', [True, False] )
+@pytest.mark.parametrize( 'sync', [True, False] )
+
+def test_stencil_matrix_3d_serial_dot( n1, n2, n3, p1, p2, p3, P1, P3, sync, P2=True ):
+
+    # Create vector space, stencil matrix, and stencil vectors
+    V = StencilVectorSpace( [n1,n2,n3], [p1,p2,p3], [P1,P2,P3] )
+    M = StencilMatrix( V, V )
+    x = StencilVector( V )
+    y = StencilVector( V )
+
+    # Fill in stencil matrix with random values
+    M._data[:] = np.random.random( M._data.shape )
+
+    # If any dimension is not periodic, set corresponding periodic corners to zero
+    M.remove_spurious_entries()
+
+    # Fill in vector with random values, then update ghost regions
+    # (or let matrix-vector product update them)
+    x[0:n1,0:n2,0:n3] = np.random.random( (n1,n2,n3) )
+    if sync:
+        x.update_ghost_regions()
+    else:
+        x.ghost_regions_in_sync = False
+
+    # Compute matrix-vector product, storing result in existing vector
+    z = M.dot( x, out=y )
+
+    assert z is y
+    assert x.ghost_regions_in_sync
+
+    # Convert stencil objects to Numpy arrays
+    Ma = M.toarray()
+    xa = x.toarray()
+    ya = y.toarray()
+
+    # Exact result using Numpy dot product
+    ya_exact = np.dot( Ma, xa )
+
+    # Check data in 1D array
+    assert np.allclose( ya, ya_exact, rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [2,5] )
+@pytest.mark.parametrize( 'n2', [6] )
+@pytest.mark.parametrize( 'n3', [3,7] )
+@pytest.mark.parametrize( 'p1', [1,2] )
+@pytest.mark.parametrize( 'p2', [1] )
+@pytest.mark.parametrize( 'p3', [1,3] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P3', [True, False] )
+@pytest.mark.parametrize( 'remove_spurious', [True, False] )
+
+def test_stencil_matrix_3d_serial_tocoo( n1, n2, n3, p1, p2, p3, P1, P3, remove_spurious, P2=True ):
+
+    V = StencilVectorSpace( [n1,n2,n3], [p1,p2,p3], [P1,P2,P3] )
+    M = StencilMatrix( V, V )
+
+    # Fill in stencil matrix with random values (and some zeros)
+    M._data[:] = np.random.random( M._data.shape )
+    M._data[M._data < 0.2] = 0.0
+
+    # Exact result: add entries one by one to dense matrix
+    nn = [n1,n2,n3]
+    pp = [p1,p2,p3]
+    PP = [P1,P2,P3]
+    Ma_exact = np.zeros( (n1*n2*n3,)*2 )
+    for i1 in range(n1):
+        for i2 in range(n2):
+            for i3 in range(n3):
+                for k1 in range(-p1,p1+1):
+                    for k2 in range(-p2,p2+1):
+                        for k3 in range(-p3,p3+1):
+                            ii = [i1,i2,i3]
+                            jj = [i+k for i,k in zip( ii, [k1,k2,k3] )]
+                            if remove_spurious and not all( P or 0 <= j < n
+                                    for j,n,P in zip( jj, nn, PP ) ):
+                                continue
+                            I = np.ravel_multi_index( ii, nn )
+                            J = np.ravel_multi_index( [j % n for j,n in zip( jj, nn )], nn )
+                            Ma_exact[I,J] += M[i1,i2,i3,k1,k2,k3]
+
+    coo = M.tocoo( remove_spurious=remove_spurious )
+    csr = M.tocsr( remove_spurious=remove_spurious )
+
+    assert np.all( coo.data != 0 )
+    assert csr.has_canonical_format
+    assert np.allclose( coo.toarray(), Ma_exact, rtol=1e-14, atol=1e-14 )
+    assert np.allclose( csr.toarray(), Ma_exact, rtol=1e-14, atol=1e-14 )
+
+    # Same result if spurious entries are removed from stencil data
+    if remove_spurious:
+        M.remove_spurious_entries()
+        assert np.allclose( M.tocsr().toarray(), Ma_exact, rtol=1e-14, atol=1e-14 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [5,8] )
+@pytest.mark.parametrize( 'n2', [4,9] )
+@pytest.mark.parametrize( 'p1', [1,2] )
+@pytest.mark.parametrize( 'p2', [1,3] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+
+def test_stencil_matrix_2d_serial_tocsr_local( n1, n2, p1, p2, P1, P2 ):
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    M = StencilMatrix( V, V )
+    M._data[:] = np.random.random( M._data.shape )
+
+    A_diag, A_offd, col_map = M.tocsr_local( remove_spurious=True )
+
+    # Single process owns all columns
+    assert A_offd.shape == (n1*n2, 0)
+    assert A_offd.nnz   == 0
+    assert len( col_map ) == 0
+    assert np.array_equal( A_diag.toarray(), M.tocsr( remove_spurious=True ).toarray() )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [5,12] )
+@pytest.mark.parametrize( 'n2', [7,10] )
+@pytest.mark.parametrize( 'p1', [1,2,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+
+def test_stencil_matrix_2d_serial_symmetric( n1, n2, p1, p2, P1, P2 ):
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    M = StencilMatrix( V, V )
+    S = SymmetricStencilMatrix( V, V )
+
+    fill_symmetric_2d( M, [n1,n2] )
+    fill_symmetric_2d( S, [n1,n2] )
+
+    # Only upper half is stored
+    assert S._data.shape[2:] == (p1+1, 2*p2+1)
+    assert not S.ghost_regions_in_sync
+
+    # Mirrored entries of boundary rows are correct straight after assembly
+    assert np.array_equal( S[0,n2-1,-p1:0,:], M[0,n2-1,-p1:0,:] )
+    assert S.ghost_regions_in_sync
+
+    # Row-only keys select the full stencil
+    assert S[0,n2-1].shape == (2*p1+1, 2*p2+1)
+    assert np.array_equal( S[0,n2-1], M[0,n2-1] )
+    assert np.array_equal( S[0:n1,0], M[0:n1,0] )
+
+    # Conversion to other formats
+    Ma = M.toarray()
+    assert np.allclose( Ma, Ma.T, rtol=1e-14, atol=1e-14 )
+    assert np.allclose( S.toarray(), Ma, rtol=1e-14, atol=1e-14 )
+    assert np.allclose( S.tocsr().toarray(), Ma, rtol=1e-14, atol=1e-14 )
+    assert S.ghost_regions_in_sync
+
+    # Mirrored access to lower half, and to full rows
+    for i1 in range(n1):
+        for i2 in range(n2):
+            for k1 in range(-p1,0):
+                for k2 in range(-p2,p2+1):
+                    assert S[i1,i2,k1,k2] == M[i1,i2,k1,k2]
+            assert np.array_equal( S[i1,i2,:,:], M[i1,i2,:,:] )
+
+    assert np.array_equal( S[0:n1,0:n2,-p1:1,1:], M[0:n1,0:n2,-p1:1,1:] )
+    assert np.array_equal( S[0:n1,1,:,-1], M[0:n1,1,:,-1] )
+
+    with pytest.raises( IndexError ):
+        S[0,0,-1,0] = 1.0
+    with pytest.raises( IndexError ):
+        S[0,0,:,:] = 1.0
+    with pytest.raises( IndexError ):
+        S[0,0,0,-1] = 1.0
+
+    # Redundant half of the plane k1 = 0 is mirrored too
+    assert S[1,1,0,-1] == S[1,0,0,1]
+    assert np.array_equal( S[0:n1,0:n2,0,:], M[0:n1,0:n2,0,:] )
+
+    # Matrix-vector product
+    x = StencilVector( V )
+    x[0:n1,0:n2] = np.random.random( (n1,n2) )
+    x.update_ghost_regions()
+
+    y = S.dot( x )
+    assert np.allclose( y.toarray(), M.dot( x ).toarray(), rtol=1e-13, atol=1e-13 )
+
+    # Ghost regions are updated automatically after setting entries
+    S[0,0,0,0] += 1.0
+    M[0,0,0,0] += 1.0
+    assert not S.ghost_regions_in_sync
+
+    y = S.dot( x )
+    assert S.ghost_regions_in_sync
+    assert np.allclose( y.toarray(), M.dot( x ).toarray(), rtol=1e-13, atol=1e-13 )
+
+    # Conversion to general matrix
+    G = S.tostencil()
+    assert type( G ) is StencilMatrix
+    assert np.allclose( G.toarray(), M.toarray(), rtol=1e-14, atol=1e-14 )
+
+    # Copy
+    T = S.copy()
+    assert isinstance( T, SymmetricStencilMatrix )
+    assert np.allclose( T.toarray(), M.toarray(), rtol=1e-14, atol=1e-14 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [5,12] )
+@pytest.mark.parametrize( 'n2', [7,10] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+
+def test_stencil_matrix_2d_serial_compact( n1, n2, p1, p2, P1, P2 ):
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    M = StencilMatrix( V, V )
+    C = StencilMatrix( V, V, compact=True )
+
+    # No ghost rows are stored
+    assert C.compact and not M.compact
+    assert C._data.shape == (n1, n2, 2*p1+1, 2*p2+1)
+
+    # Assembly with the same pattern as the examples
+    mat = np.random.random( (n1, n2, 2*p1+1, 2*p2+1) )
+    for i1 in range(n1):
+        for i2 in range(n2):
+            M[i1,i2,:,:] += mat[i1,i2]
+            C[i1,i2,:,:] += mat[i1,i2]
+    M.remove_spurious_entries()
+    C.remove_spurious_entries()
+
+    assert np.array_equal( C[:,:,:,:], M[0:n1,0:n2,:,:] )
+    assert np.allclose( C.toarray(), M.toarray(), rtol=1e-14, atol=1e-14 )
+    assert np.allclose( C.copy().toarray(), M.toarray(), rtol=1e-14, atol=1e-14 )
+
+    x = StencilVector( V )
+    x[0:n1,0:n2] = np.random.random( (n1,n2) )
+    x.update_ghost_regions()
+
+    assert np.allclose( C.dot( x ).toarray(), M.dot( x ).toarray(), rtol=1e-13, atol=1e-13 )
+
+    # Rows outside local range cannot be accessed, also with slices
+    with pytest.raises( IndexError ):
+        C[-1,0,0,0] = 1.0
+    with pytest.raises( IndexError ):
+        C[-1:2,0,0,0] = 1.0
+    with pytest.raises( IndexError ):
+        C[0:n1+1,0,0,0]
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [5,12] )
+@pytest.mark.parametrize( 'n2', [7,10] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+
+def test_stencil_matrix_2d_serial_lincomb( n1, n2, p1, p2, P1, P2 ):
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    M = StencilMatrix( V, V )
+    C = StencilMatrix( V, V, compact=True )
+    S = SymmetricStencilMatrix( V, V )
+
+    M._data[:] = np.random.random( M._data.shape )
+    C._data[:] = np.random.random( C._data.shape )
+    M.remove_spurious_entries()
+    C.remove_spurious_entries()
+    fill_symmetric_2d( S, [n1,n2] )
+
+    Ma = M.toarray()
+    Ca = C.toarray()
+    Sa = S.toarray()
+    dt = 0.25
+
+    # Same layout: result has the same type and layout
+    for A,Aa in [(M,Ma), (C,Ca), (S,Sa)]:
+        for R,Ra in [(A + dt*A, (1+dt)*Aa), (A - A*dt, (1-dt)*Aa), (3*A, 3*Aa)]:
+            assert type( R ) is type( A )
+            assert R.compact == A.compact
+            assert np.allclose( R.toarray(), Ra, rtol=1e-14, atol=1e-14 )
+
+    # Mixed layouts: general matrix
+    for R,Ra in [(M + dt*S, Ma + dt*Sa), (S - M, Sa - Ma), (C + M, Ca + Ma), (C - dt*S, Ca - dt*Sa)]:
+        assert type( R ) is StencilMatrix
+        assert np.allclose( R.toarray(), Ra, rtol=1e-14, atol=1e-14 )
+
+    # In-place updates do not create new data
+    data = M._data
+    M.axpy( dt, S )
+    M -= C
+    M *= 2.0
+    assert M._data is data
+    assert np.allclose( M.toarray(), 2.0*(Ma + dt*Sa - Ca), rtol=1e-14, atol=1e-14 )
+
+    # Upper half cannot hold a general matrix
+    with pytest.raises( AssertionError ):
+        S.axpy( 1.0, M )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [5,12] )
+@pytest.mark.parametrize( 'n2', [7,10] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+@pytest.mark.parametrize( 'compact', [True, False] )
+
+def test_stencil_matrix_2d_serial_transpose( n1, n2, p1, p2, P1, P2, compact ):
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    M = StencilMatrix( V, V, compact=compact )
+    S = SymmetricStencilMatrix( V, V )
+    x = StencilVector( V )
+
+    M._data[:] = np.random.random( M._data.shape )
+    M.remove_spurious_entries()
+    fill_symmetric_2d( S, [n1,n2] )
+    x[0:n1,0:n2] = np.random.random( (n1,n2) )
+    x.update_ghost_regions()
+
+    for A in [M, S]:
+
+        Aa = A.toarray()
+        T  = A.transpose()
+        y  = A.dot_transpose( x )
+
+        assert type( T ) is type( A )
+        assert T.compact == A.compact
+        assert np.allclose( T.toarray(), Aa.T, rtol=1e-14, atol=1e-14 )
+        assert np.allclose( y.toarray(), Aa.T.dot( x.toarray() ), rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [7,12] )
+@pytest.mark.parametrize( 'n2', [9,10] )
+@pytest.mark.parametrize( 'p1', [1,2] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+
+def test_stencil_matrix_2d_serial_matmul( n1, n2, p1, p2, P1, P2 ):
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    A = StencilMatrix( V, V )
+    B = StencilMatrix( V, V, compact=True )
+    S = SymmetricStencilMatrix( V, V )
+
+    A._data[:] = np.random.random( A._data.shape )
+    B._data[:] = np.random.random( B._data.shape )
+    A.remove_spurious_entries()
+    B.remove_spurious_entries()
+    fill_symmetric_2d( S, [n1,n2] )
+
+    Aa = A.toarray()
+    Ba = B.toarray()
+    Sa = S.toarray()
+
+    # Product has wider stencil
+    C = A.matmul( B )
+    W = V.with_pads( [2*p1,2*p2] )
+
+    assert C.domain is W
+    assert C.pads == (2*p1,2*p2)
+    assert np.allclose( C.toarray(), Aa.dot( Ba ), rtol=1e-13, atol=1e-13 )
+    assert np.allclose( (S @ A @ B).toarray(), Sa.dot( Aa ).dot( Ba ), rtol=1e-13, atol=1e-13 )
+
+    # Galerkin triple product
+    G = S.triple_product( B )
+    assert G.pads == (3*p1,3*p2)
+    assert np.allclose( G.toarray(), Ba.T.dot( Sa ).dot( Ba ), rtol=1e-13, atol=1e-13 )
+
+    # Factors between different spaces are not supported
+    U = StencilVectorSpace( [n1+1,n2], [p1,p2], [P1,P2] )
+    with pytest.raises( ValueError ):
+        S.triple_product( StencilMatrix( U, U ) )
+    with pytest.raises( ValueError ):
+        S.triple_product( B, R=StencilMatrix( U, U ) )
+
+    # Product acts on vectors with wider ghost regions
+    x = StencilVector( V )
+    y = StencilVector( W )
+    x[0:n1,0:n2] = np.random.random( (n1,n2) )
+    y[0:n1,0:n2] = x[0:n1,0:n2]
+    y.update_ghost_regions()
+
+    assert np.allclose( C.dot( y ).toarray(), Aa.dot( Ba.dot( x.toarray() ) ), rtol=1e-13, atol=1e-13 )
+
+    # Linear combinations with different pads use the wider stencil
+    dt = 0.25
+    for R,Ra in [(A + dt*C, Aa + dt*Aa.dot( Ba )), (C - S, Aa.dot( Ba ) - Sa), (S + B @ A, Sa + Ba.dot( Aa ))]:
+        assert R.domain is W
+        assert np.allclose( R.toarray(), Ra, rtol=1e-13, atol=1e-13 )
+
+    # In-place update only with a narrower (or same) stencil
+    D    = C.copy()
+    data = D._data
+    D.axpy( dt, A )
+    D -= B
+    assert D._data is data
+    assert np.allclose( D.toarray(), Aa.dot( Ba ) + dt*Aa - Ba, rtol=1e-13, atol=1e-13 )
+
+    with pytest.raises( AssertionError ):
+        A.axpy( 1.0, C )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [5,12] )
+@pytest.mark.parametrize( 'n2', [7,10] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+
+def test_stencil_matrix_2d_serial_diagonal_scaling( n1, n2, p1, p2, P1, P2 ):
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    M = StencilMatrix( V, V )
+    C = StencilMatrix( V, V, compact=True )
+    S = SymmetricStencilMatrix( V, V )
+    d = StencilVector( V )
+
+    M._data[:] = np.random.random( M._data.shape )
+    C._data[:] = np.random.random( C._data.shape )
+    M.remove_spurious_entries()
+    C.remove_spurious_entries()
+    fill_symmetric_2d( S, [n1,n2] )
+    d[0:n1,0:n2] = np.random.random( (n1,n2) ) + 1.0
+    d.update_ghost_regions()
+
+    D = np.diag( d.toarray() )
+
+    for A in [M, C, S]:
+
+        Aa = A.toarray()
+
+        # Diagonal (periodic wrap-around of small domains is not included)
+        out  = StencilVector( V )
+        diag = A.diagonal( out=out )
+        assert diag is out
+        assert np.array_equal( diag.toarray(), A[0:n1,0:n2,0,0].reshape( -1 ) )
+
+        # Symmetric scaling
+        B = A.copy().scale_symmetric( d )
+        assert type( B ) is type( A )
+        assert np.allclose( B.toarray(), D.dot( Aa ).dot( D ), rtol=1e-14, atol=1e-14 )
+
+        # Scaling of rows and columns does not preserve symmetry
+        if isinstance( A, SymmetricStencilMatrix ):
+            with pytest.raises( TypeError ):
+                A.scale_rows( d )
+            with pytest.raises( TypeError ):
+                A.scale_cols( d )
+            assert np.array_equal( A.toarray(), Aa )
+            A = A.tostencil()
+
+        B = A.copy().scale_rows( d )
+        assert np.allclose( B.toarray(), D.dot( Aa ), rtol=1e-14, atol=1e-14 )
+
+        B = A.copy().scale_cols( d )
+        assert np.allclose( B.toarray(), Aa.dot( D ), rtol=1e-14, atol=1e-14 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'npts', [(13,),(8,11),(5,6,7)] )
+@pytest.mark.parametrize( 'pads', [(1,1,1),(2,3,1)] )
+@pytest.mark.parametrize( 'periodic', [True, False] )
+@pytest.mark.parametrize( 'compact', [True, False] )
+
+def test_stencil_matrix_compiled_dot( npts, pads, periodic, compact, monkeypatch ):
+
+    from spl.linalg import kernels
+
+    if kernels.numba is None:
+        pytest.skip( 'numba is not available' )
+
+    nd = len( npts )
+    pp = pads[:nd]
+    V  = StencilVectorSpace( npts, pp, [periodic]*nd )
+    M  = StencilMatrix( V, V, compact=compact )
+    x  = StencilVector( V )
+
+    M._data[:] = np.random.random( M._data.shape )
+    M.remove_spurious_entries()
+    x[tuple( slice(0,n) for n in npts )] = np.random.random( npts )
+    x.update_ghost_regions()
+
+    # Compiled kernel
+    monkeypatch.setattr( kernels, 'enabled', True )
+    y1 = M.dot( x )
+
+    # Pure numpy implementation
+    monkeypatch.setattr( kernels, 'enabled', False )
+    y2 = M.dot( x )
+
+    assert np.allclose( y1.toarray(), y2.toarray(), rtol=1e-14, atol=1e-14 )
+    assert np.allclose( y1.toarray(), M.toarray().dot( x.toarray() ), rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'npts', [(13,),(8,11),(5,6,7)] )
+@pytest.mark.parametrize( 'pads', [(1,1,1),(2,3,1)] )
+@pytest.mark.parametrize( 'periodic', [True, False] )
+
+def test_stencil_matrix_symmetric_compiled_dot( npts, pads, periodic, monkeypatch ):
+
+    from spl.linalg import kernels
+
+    if kernels.numba is None:
+        pytest.skip( 'numba is not available' )
+
+    nd = len( npts )
+    pp = pads[:nd]
+    V  = StencilVectorSpace( npts, pp, [periodic]*nd )
+    S  = SymmetricStencilMatrix( V, V )
+    x  = StencilVector( V )
+
+    S._data[:] = np.random.random( S._data.shape )
+    S.remove_spurious_entries()
+    x[tuple( slice(0,n) for n in npts )] = np.random.random( npts )
+    x.update_ghost_regions()
+
+    # Compiled kernel
+    monkeypatch.setattr( kernels, 'enabled', True )
+    y1 = S.dot( x )
+
+    # Pure numpy implementation
+    monkeypatch.setattr( kernels, 'enabled', False )
+    y2 = S.dot( x )
+
+    # Full matrix (unused slots k < 0 of the plane k1 = 0 are random here)
+    Sa = S.toarray()
+    y3 = S.tostencil().dot( x )
+
+    assert np.allclose( Sa, Sa.T, rtol=1e-14, atol=1e-14 )
+
+    assert np.allclose( y1.toarray(), y2.toarray(), rtol=1e-14, atol=1e-14 )
+    assert np.allclose( y1.toarray(), y3.toarray(), rtol=1e-13, atol=1e-13 )
+
 #===============================================================================
 # PARALLEL TESTS
 #===============================================================================
@@ -270,6 +874,506 @@ def test_stencil_matrix_2d_parallel_dot( n1, n2, p1, p2, P1, P2, reorder ):
     # Check data in 1D array
     assert np.allclose( ya, ya_exact, rtol=1e-13, atol=1e-13 )
 
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [ 8,21] )
+@pytest.mark.parametrize( 'n2', [13] )
+@pytest.mark.parametrize( 'n3', [12] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [2] )
+@pytest.mark.parametrize( 'p3', [1] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P3', [True, False] )
+@pytest.mark.parametrize( 'sync', ['all', 'none', 'partial'] )
+@pytest.mark.parametrize( 'exchange', ['shift', 'neighbor'] )
+@pytest.mark.parallel
+
+def test_stencil_matrix_3d_parallel_dot( n1, n2, n3, p1, p2, p3, P1, P3, sync, exchange, P2=True ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2,n3],
+                 pads    = [p1,p2,p3],
+                 periods = [P1,P2,P3],
+                 reorder = False,
+                 comm    = comm )
+
+    # Create vector space, stencil matrix, and stencil vector
+    V = StencilVectorSpace( cart, exchange=exchange )
+    M = StencilMatrix( V, V )
+    x = StencilVector( V )
+
+    s1,s2,s3 = V.starts
+    e1,e2,e3 = V.ends
+
+    # Fill in stencil matrix with random values
+    M._data[:] = np.random.random( M._data.shape )
+
+    # If any dimension is not periodic, set corresponding periodic corners to zero
+    M.remove_spurious_entries()
+
+    # Fill in vector with global values, then update ghost regions
+    # (or let matrix-vector product update all/some of them)
+    xg = np.random.RandomState( 0 ).random_sample( (n1,n2,n3) )
+    x[s1:e1+1,s2:e2+1,s3:e3+1] = xg[s1:e1+1,s2:e2+1,s3:e3+1]
+    if sync == 'all':
+        x.update_ghost_regions()
+    elif sync == 'none':
+        x.ghost_regions_in_sync = False
+    else:
+        x.update_ghost_regions( direction=0 )
+        x.update_ghost_regions( direction=2 )
+        x.ghost_regions_sync = (True, False, True)
+
+    # Compute matrix-vector product
+    y = M.dot(x)
+
+    assert x.ghost_regions_in_sync
+
+    # Exact result using Scipy sparse dot product (global rows from all processes)
+    Ms = comm.allreduce( M.tocsr(), op=MPI.SUM )
+    ya_exact = Ms.dot( xg.reshape(-1) ).reshape( n1,n2,n3 )
+
+    # Check data in local rows
+    assert np.allclose( y[s1:e1+1,s2:e2+1,s3:e3+1], ya_exact[s1:e1+1,s2:e2+1,s3:e3+1],
+                        rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,21] )
+@pytest.mark.parametrize( 'n2', [13] )
+@pytest.mark.parametrize( 'n3', [6] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [2] )
+@pytest.mark.parametrize( 'p3', [1] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P3', [True, False] )
+@pytest.mark.parallel
+
+def test_stencil_matrix_3d_parallel_tocsr_local( n1, n2, n3, p1, p2, p3, P1, P3, P2=True ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2,n3],
+                 pads    = [p1,p2,p3],
+                 periods = [P1,P2,P3],
+                 reorder = False,
+                 comm    = comm )
+
+    V = StencilVectorSpace( cart )
+    M = StencilMatrix( V, V )
+    x = StencilVector( V )
+
+    s1,s2,s3 = V.starts
+    e1,e2,e3 = V.ends
+
+    M._data[:] = np.random.random( M._data.shape )
+    M.remove_spurious_entries()
+
+    xg = np.random.RandomState( 0 ).random_sample( (n1,n2,n3) )
+    x[s1:e1+1,s2:e2+1,s3:e3+1] = xg[s1:e1+1,s2:e2+1,s3:e3+1]
+    x.update_ghost_regions()
+
+    y = M.dot( x )
+
+    # Local product with diagonal and off-diagonal blocks
+    A_diag, A_offd, col_map = M.tocsr_local()
+
+    nl = (e1-s1+1) * (e2-s2+1) * (e3-s3+1)
+    assert A_diag.shape == (nl, nl)
+    assert A_offd.shape == (nl, len( col_map ))
+    assert np.all( np.diff( col_map ) > 0 )
+
+    # Ghost columns are not owned by local process
+    jj = np.unravel_index( col_map, (n1,n2,n3) )
+    assert not np.any( np.logical_and.reduce( [(s <= j) & (j <= e)
+            for j,s,e in zip( jj, V.starts, V.ends )] ) )
+
+    x_local = x[s1:e1+1,s2:e2+1,s3:e3+1].reshape(-1)
+    x_ghost = xg.reshape(-1)[col_map]
+    y_local = A_diag.dot( x_local ) + A_offd.dot( x_ghost )
+
+    assert np.allclose( y_local, y[s1:e1+1,s2:e2+1,s3:e3+1].reshape(-1), rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,21] )
+@pytest.mark.parametrize( 'n2', [13,24] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+@pytest.mark.parallel
+
+def test_stencil_matrix_2d_parallel_symmetric( n1, n2, p1, p2, P1, P2 ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2],
+                 pads    = [p1,p2],
+                 periods = [P1,P2],
+                 reorder = False,
+                 comm    = comm )
+
+    V = StencilVectorSpace( cart )
+    M = StencilMatrix( V, V )
+    S = SymmetricStencilMatrix( V, V )
+    x = StencilVector( V )
+
+    s1,s2 = V.starts
+    e1,e2 = V.ends
+
+    fill_symmetric_2d( M, [n1,n2] )
+    fill_symmetric_2d( S, [n1,n2] )
+
+    xg = np.random.RandomState( 0 ).random_sample( (n1,n2) )
+    x[s1:e1+1,s2:e2+1] = xg[s1:e1+1,s2:e2+1]
+    x.update_ghost_regions()
+
+    # Matrix-vector product (ghost regions of S are updated first)
+    y = S.dot( x )
+    z = M.dot( x )
+
+    assert S.ghost_regions_in_sync
+    assert np.allclose( y[s1:e1+1,s2:e2+1], z[s1:e1+1,s2:e2+1], rtol=1e-13, atol=1e-13 )
+
+    # Local rows of the full matrix
+    assert np.allclose( S.tocsr().toarray(), M.tocsr().toarray(), rtol=1e-14, atol=1e-14 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,21] )
+@pytest.mark.parametrize( 'n2', [13,24] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parallel
+
+def test_stencil_matrix_2d_parallel_symmetric_partial_update( n1, n2, p1, p2, P1, P2=False ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2],
+                 pads    = [p1,p2],
+                 periods = [P1,P2],
+                 reorder = False,
+                 comm    = comm )
+
+    V = StencilVectorSpace( cart )
+    M = StencilMatrix( V, V )
+    S = SymmetricStencilMatrix( V, V )
+    x = StencilVector( V )
+
+    s1,s2 = V.starts
+    e1,e2 = V.ends
+
+    fill_symmetric_2d( M, [n1,n2] )
+    fill_symmetric_2d( S, [n1,n2] )
+
+    xg = np.random.RandomState( 0 ).random_sample( (n1,n2) )
+    x[s1:e1+1,s2:e2+1] = xg[s1:e1+1,s2:e2+1]
+    x.update_ghost_regions()
+
+    S.dot( x )
+
+    # Only process 0 modifies its rows: the ghost regions of S are stale there
+    # only, but all processes must take part in the update
+    if comm.rank == 0:
+        S[s1:e1+1,s2:e2+1,0,0] *= 2.0
+        M[s1:e1+1,s2:e2+1,0,0] *= 2.0
+
+        assert not S.ghost_regions_in_sync
+        with pytest.raises( RuntimeError ):
+            S.dot( x )
+
+    S.update_ghost_regions()
+
+    y = S.dot( x )
+    z = M.dot( x )
+
+    assert S.ghost_regions_in_sync
+    assert np.allclose( y[s1:e1+1,s2:e2+1], z[s1:e1+1,s2:e2+1], rtol=1e-13, atol=1e-13 )
+
+    # Same with spurious entries removed on boundary processes only
+    S.remove_spurious_entries()
+
+    assert np.allclose( S.tocsr().toarray(), M.tocsr().toarray(), rtol=1e-14, atol=1e-14 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,21] )
+@pytest.mark.parametrize( 'n2', [13,24] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+@pytest.mark.parallel
+
+def test_stencil_matrix_2d_parallel_compact( n1, n2, p1, p2, P1, P2 ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2],
+                 pads    = [p1,p2],
+                 periods = [P1,P2],
+                 reorder = False,
+                 comm    = comm )
+
+    V = StencilVectorSpace( cart )
+    M = StencilMatrix( V, V )
+    C = StencilMatrix( V, V, compact=True )
+    x = StencilVector( V )
+
+    s1,s2 = V.starts
+    e1,e2 = V.ends
+
+    assert C._data.shape == (e1-s1+1, e2-s2+1, 2*p1+1, 2*p2+1)
+
+    fill_symmetric_2d( M, [n1,n2] )
+    fill_symmetric_2d( C, [n1,n2] )
+
+    xg = np.random.RandomState( 0 ).random_sample( (n1,n2) )
+    x[s1:e1+1,s2:e2+1] = xg[s1:e1+1,s2:e2+1]
+    x.ghost_regions_in_sync = False
+
+    y = C.dot( x )
+    z = M.dot( x )
+
+    assert np.allclose( y[s1:e1+1,s2:e2+1], z[s1:e1+1,s2:e2+1], rtol=1e-13, atol=1e-13 )
+    assert np.allclose( C.tocsr().toarray(), M.tocsr().toarray(), rtol=1e-14, atol=1e-14 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,21] )
+@pytest.mark.parametrize( 'n2', [13,24] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+@pytest.mark.parallel
+
+def test_stencil_matrix_2d_parallel_lincomb( n1, n2, p1, p2, P1, P2 ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2],
+                 pads    = [p1,p2],
+                 periods = [P1,P2],
+                 reorder = False,
+                 comm    = comm )
+
+    V = StencilVectorSpace( cart )
+    M = StencilMatrix( V, V )
+    S = SymmetricStencilMatrix( V, V )
+    x = StencilVector( V )
+
+    s1,s2 = V.starts
+    e1,e2 = V.ends
+
+    M._data[:] = np.random.random( M._data.shape )
+    M.remove_spurious_entries()
+    fill_symmetric_2d( S, [n1,n2] )
+
+    xg = np.random.RandomState( 0 ).random_sample( (n1,n2) )
+    x[s1:e1+1,s2:e2+1] = xg[s1:e1+1,s2:e2+1]
+    x.update_ghost_regions()
+
+    # Implicit time stepping: A = M + dt*S
+    dt = 0.25
+    A  = M + dt*S
+    B  = S + S*dt
+
+    y = A.dot( x )
+    z = M.dot( x ) + dt * S.dot( x )
+    assert np.allclose( y[s1:e1+1,s2:e2+1], z[s1:e1+1,s2:e2+1], rtol=1e-13, atol=1e-13 )
+
+    y = B.dot( x )
+    z = S.dot( x ) * (1+dt)
+    assert isinstance( B, SymmetricStencilMatrix )
+    assert np.allclose( y[s1:e1+1,s2:e2+1], z[s1:e1+1,s2:e2+1], rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,21] )
+@pytest.mark.parametrize( 'n2', [13,24] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+@pytest.mark.parametrize( 'compact', [True, False] )
+@pytest.mark.parallel
+
+def test_stencil_matrix_2d_parallel_transpose( n1, n2, p1, p2, P1, P2, compact ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2],
+                 pads    = [p1,p2],
+                 periods = [P1,P2],
+                 reorder = False,
+                 comm    = comm )
+
+    V = StencilVectorSpace( cart )
+    M = StencilMatrix( V, V, compact=compact )
+    x = StencilVector( V )
+    y = StencilVector( V )
+
+    s1,s2 = V.starts
+    e1,e2 = V.ends
+
+    M._data[:] = np.random.random( M._data.shape )
+    M.remove_spurious_entries()
+
+    x[s1:e1+1,s2:e2+1] = np.random.random( (e1-s1+1,e2-s2+1) )
+    y[s1:e1+1,s2:e2+1] = np.random.random( (e1-s1+1,e2-s2+1) )
+    x.update_ghost_regions()
+    y.update_ghost_regions()
+
+    # Definition of transpose: (A^T x, y) = (x, A y)
+    z = M.dot_transpose( x )
+    assert np.isclose( z.dot( y ), x.dot( M.dot( y ) ), rtol=1e-13, atol=1e-13 )
+
+    # Transposed matrix in stencil format
+    T = M.transpose()
+    w = T.dot( x )
+    assert np.allclose( w[s1:e1+1,s2:e2+1], z[s1:e1+1,s2:e2+1], rtol=1e-13, atol=1e-13 )
+
+    # Transpose of transpose
+    B = T.transpose()
+    assert np.allclose( B._get_local_data(), M._get_local_data(), rtol=1e-14, atol=1e-14 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [24,29] )
+@pytest.mark.parametrize( 'n2', [24,32] )
+@pytest.mark.parametrize( 'p1', [1,2] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+@pytest.mark.parallel
+
+def test_stencil_matrix_2d_parallel_matmul( n1, n2, p1, p2, P1, P2 ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2],
+                 pads    = [p1,p2],
+                 periods = [P1,P2],
+                 reorder = False,
+                 comm    = comm )
+
+    V = StencilVectorSpace( cart )
+    A = StencilMatrix( V, V )
+    B = StencilMatrix( V, V )
+    x = StencilVector( V )
+
+    s1,s2 = V.starts
+    e1,e2 = V.ends
+
+    A._data[:] = np.random.random( A._data.shape )
+    B._data[:] = np.random.random( B._data.shape )
+    A.remove_spurious_entries()
+    B.remove_spurious_entries()
+
+    xg = np.random.RandomState( 0 ).random_sample( (n1,n2) )
+    x[s1:e1+1,s2:e2+1] = xg[s1:e1+1,s2:e2+1]
+    x.update_ghost_regions()
+
+    # Same distribution in space with wider padding
+    C = A.matmul( B )
+    G = A.triple_product( B )
+
+    for M in [C, G]:
+        W = M.domain
+        assert W.starts == V.starts
+        assert W.ends   == V.ends
+
+    # Products act on vectors with wider ghost regions
+    y2 = C.domain.zeros()
+    y3 = G.domain.zeros()
+    y2[s1:e1+1,s2:e2+1] = xg[s1:e1+1,s2:e2+1]
+    y3[s1:e1+1,s2:e2+1] = xg[s1:e1+1,s2:e2+1]
+    y2.update_ghost_regions()
+    y3.update_ghost_regions()
+
+    z2 = A.dot( B.dot( x ) )
+    z3 = B.dot_transpose( A.dot( B.dot( x ) ) )
+
+    assert np.allclose( C.dot( y2 )[s1:e1+1,s2:e2+1], z2[s1:e1+1,s2:e2+1], rtol=1e-13, atol=1e-13 )
+    assert np.allclose( G.dot( y3 )[s1:e1+1,s2:e2+1], z3[s1:e1+1,s2:e2+1], rtol=1e-13, atol=1e-13 )
+
+    # Linear combination with different pads, e.g. implicit time stepping
+    dt = 0.25
+    D  = A + dt*C
+    z  = A.dot( x ) + dt*z2
+
+    assert D.domain is C.domain
+    assert np.allclose( D.dot( y2 )[s1:e1+1,s2:e2+1], z[s1:e1+1,s2:e2+1], rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,21] )
+@pytest.mark.parametrize( 'n2', [13,24] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+@pytest.mark.parallel
+
+def test_stencil_matrix_2d_parallel_diagonal_scaling( n1, n2, p1, p2, P1, P2 ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2],
+                 pads    = [p1,p2],
+                 periods = [P1,P2],
+                 reorder = False,
+                 comm    = comm )
+
+    V = StencilVectorSpace( cart )
+    M = StencilMatrix( V, V )
+    S = SymmetricStencilMatrix( V, V )
+    x = StencilVector( V )
+
+    s1,s2 = V.starts
+    e1,e2 = V.ends
+
+    M._data[:] = np.random.random( M._data.shape )
+    M.remove_spurious_entries()
+    fill_symmetric_2d( S, [n1,n2] )
+
+    x[s1:e1+1,s2:e2+1] = np.random.random( (e1-s1+1,e2-s2+1) )
+    x.update_ghost_regions()
+
+    for A in [M, S]:
+
+        # Jacobi scaling: unit diagonal
+        d = A.diagonal()
+        d[s1:e1+1,s2:e2+1] = 1.0 / np.sqrt( abs( d[s1:e1+1,s2:e2+1] ) )
+
+        B = A.copy().scale_symmetric( d )
+        assert np.allclose( B.diagonal()[s1:e1+1,s2:e2+1], np.sign( A[s1:e1+1,s2:e2+1,0,0] ), rtol=1e-14, atol=1e-14 )
+
+        # Compare with products: D*A*D*x
+        d.update_ghost_regions()
+        dx = x.copy()
+        dx[s1:e1+1,s2:e2+1] *= d[s1:e1+1,s2:e2+1]
+        dx.update_ghost_regions()
+        y  = A.dot( dx )
+        y[s1:e1+1,s2:e2+1] *= d[s1:e1+1,s2:e2+1]
+
+        z  = B.dot( x )
+        assert np.allclose( z[s1:e1+1,s2:e2+1], y[s1:e1+1,s2:e2+1], rtol=1e-13, atol=1e-13 )
+
 #===============================================================================
 # SCRIPT FUNCTIONALITY
 #===============================================================================
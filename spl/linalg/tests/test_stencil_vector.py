@@ -3,7 +3,30 @@
 import pytest
 import numpy as np
 
-from spl.linalg.stencil import StencilVectorSpace, StencilVector
+from spl.linalg.stencil import StencilVectorSpace, StencilVector, StencilMultiVector
+from spl.linalg.stencil import StencilMatrix, SymmetricStencilMatrix
+
+#===============================================================================
+def add_padded_to_global( data, starts, pads, npts, periods, out ):
+    """
+    Add all entries of a padded local array (ghost regions included) to a
+    global array, wrapping around periodic directions and discarding the
+    entries beyond non-periodic boundaries.
+
+    """
+    grids = []
+    for d,(s,p,n,P) in enumerate( zip( starts, pads, npts, periods ) ):
+        i = np.arange( s-p, s-p+data.shape[d] )
+        if P:
+            i = i % n
+        else:
+            # Index n marks the entries to be discarded
+            i[(i < 0) | (i >= n)] = n
+        grids.append( i )
+
+    tmp = np.zeros( [n+1 for n in npts] )
+    np.add.at( tmp, np.ix_( *grids ), data )
+    out += tmp[tuple( slice(0,n) for n in npts )]
 
 #===============================================================================
 # SERIAL TESTS
@@ -117,6 +140,144 @@ def test_stencil_vector_2d_serial_math( n1, n2, p1, p2, P1=True, P2=False ):
 @pytest.mark.parametrize( 'p1', [1,2] )
 @pytest.mark.parametrize( 'p2', [1,2] )
 
+def test_stencil_vector_2d_serial_sync_directions( n1, n2, p1, p2, P1=True, P2=True ):
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    x = StencilVector( V )
+    y = StencilVector( V )
+
+    for i1 in range(n1):
+        for i2 in range(n2):
+            x[i1,i2] = 10*i1 + i2
+            y[i1,i2] = 10*i2 - i1
+
+    # Reference: full update
+    z = x.copy()
+    z.update_ghost_regions()
+
+    # Update of single directions only marks those directions
+    x.ghost_regions_in_sync = False
+    assert x.ghost_regions_sync == (False, False)
+    x.update_ghost_regions( direction=0 )
+    assert x.ghost_regions_sync == (True, False)
+    assert not x.ghost_regions_in_sync
+    x.update_ghost_regions( direction=1 )
+    assert x.ghost_regions_in_sync
+    assert np.all( x._data == z._data )
+
+    # Linear combinations: direction is up-to-date only if it is for all terms
+    y.ghost_regions_sync = (False, True)
+    assert (x + y).ghost_regions_sync == (False, True)
+    assert (2 * y).ghost_regions_sync == (False, True)
+    assert x.copy().axpy( 1.0, y ).ghost_regions_sync == (False, True)
+
+    # Split-phase update only exchanges (and marks) the requested directions
+    y.start_update_ghost_regions( directions=[0] )
+    y.finish_update_ghost_regions()
+    assert y.ghost_regions_in_sync
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [1,7] )
+@pytest.mark.parametrize( 'n2', [1,5] )
+@pytest.mark.parametrize( 'p1', [1,2] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+
+def test_stencil_vector_2d_serial_inplace( n1, n2, p1, p2, P1=True, P2=False ):
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    x = StencilVector( V )
+    y = StencilVector( V )
+
+    for i1 in range(n1):
+        for i2 in range(n2):
+            x[i1,i2] = 10*i1 + i2
+            y[i1,i2] = 10*i2 - i1
+
+    xa = x.toarray()
+    ya = y.toarray()
+
+    # Empty vector: data is allocated, but not initialized
+    z = V.empty()
+    assert isinstance( z, StencilVector )
+    assert z.space is V
+    assert z._data.shape == x._data.shape
+    assert not z.ghost_regions_in_sync
+
+    # Copy into existing vector
+    zdata = z._data
+    w = x.copy( out=z )
+    assert w is z
+    assert z._data is zdata
+    assert np.all( z.toarray() == xa )
+
+    # In-place scaling and update
+    assert z.scale( 3.0 ) is z
+    assert np.all( z.toarray() == 3.0 * xa )
+
+    assert z.axpy( -2.0, y ) is z
+    assert z._data is zdata
+    assert np.allclose( z.toarray(), 3.0 * xa - 2.0 * ya, rtol=1e-15, atol=1e-15 )
+
+    # Linear combinations, also with aliased arguments
+    z.lincomb( 2.0, x, 0.5, y )
+    assert np.allclose( z.toarray(), 2.0 * xa + 0.5 * ya, rtol=1e-15, atol=1e-15 )
+
+    z.lincomb( -1.0, y, 2.0, z )
+    assert np.allclose( z.toarray(), 4.0 * xa, rtol=1e-15, atol=1e-15 )
+
+    z.lincomb( 0.5, z )
+    assert np.allclose( z.toarray(), 2.0 * xa, rtol=1e-15, atol=1e-15 )
+    assert z._data is zdata
+
+#===============================================================================
+@pytest.mark.parametrize( 'dtype', [np.int32, np.int64, np.float32] )
+
+def test_stencil_vector_2d_serial_axpy_dtype( dtype, n1=7, n2=5, p1=2, p2=1, P1=True, P2=False ):
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2], dtype=dtype )
+    x = StencilVector( V )
+    y = StencilVector( V )
+
+    x[0:n1,0:n2] = np.arange( n1*n2 ).reshape( n1, n2 )
+    y[0:n1,0:n2] = 1
+
+    # Types not supported by BLAS are updated with numpy
+    assert y.axpy( 2, x ) is y
+    assert y.toarray().dtype == dtype
+    assert np.array_equal( y.toarray(), 1 + 2 * x.toarray() )
+
+#===============================================================================
+def test_vector_default_inplace():
+
+    from spl.linalg.basic import Vector
+
+    # Subclass which only implements the abstract interface
+    class ArrayVector( Vector ):
+        def __init__( self, data ): self._data = np.asarray( data, dtype=float )
+        space    = None
+        dot      = lambda self, v: np.dot( self._data, v._data )
+        copy     = lambda self, out=None: ArrayVector( self._data.copy() )
+        __mul__  = lambda self, a: ArrayVector( self._data * a )
+        __rmul__ = __mul__
+        __add__  = lambda self, v: ArrayVector( self._data + v._data )
+        __sub__  = lambda self, v: ArrayVector( self._data - v._data )
+        def __imul__( self, a ): self._data *= a;       return self
+        def __iadd__( self, v ): self._data += v._data; return self
+        def __isub__( self, v ): self._data -= v._data; return self
+
+    x = ArrayVector( [1.0, 2.0, 3.0] )
+    y = ArrayVector( [0.5, 0.5, 0.5] )
+
+    assert x.scale( 2.0 ) is x
+    assert x.axpy( -2.0, y ) is x
+    assert np.array_equal( x._data, [1.0, 3.0, 5.0] )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [1,7] )
+@pytest.mark.parametrize( 'n2', [1,5] )
+@pytest.mark.parametrize( 'p1', [1,2] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+
 def test_stencil_vector_2d_serial_dot( n1, n2, p1, p2, P1=True, P2=False ):
 
 
@@ -137,6 +298,226 @@ def test_stencil_vector_2d_serial_dot( n1, n2, p1, p2, P1=True, P2=False ):
     assert z1 == z_exact
     assert z2 == z_exact
 
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [1,7] )
+@pytest.mark.parametrize( 'n2', [1,5] )
+@pytest.mark.parametrize( 'p1', [1,2] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+
+def test_stencil_vector_2d_serial_from_buffer( n1, n2, p1, p2, P1=True, P2=False ):
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+
+    # External padded array is adopted without copy
+    data = np.zeros( (n1+2*p1, n2+2*p2) )
+    x = StencilVector.from_buffer( V, data )
+
+    assert x.space is V
+    assert x.data is data
+    assert not x.ghost_regions_in_sync
+
+    xa = np.random.random( (n1,n2) )
+    data[p1:-p1,p2:-p2] = xa
+    x.update_ghost_regions()
+
+    # Owned region and array export are views of external array
+    assert np.shares_memory( x.owned_data, data )
+    assert np.shares_memory( np.asarray( x ), data )
+    assert np.array_equal( np.asarray( x ), xa )
+    assert np.array_equal( x.toarray(), xa.reshape(-1) )
+    assert not np.shares_memory( np.array( x, copy=True ), data )
+    assert np.asarray( x, dtype=np.float32 ).dtype == np.float32
+
+    # Changes to vector are seen by the caller
+    x *= 2.0
+    x.owned_data[0,0] = -1.0
+    assert data[p1,p2] == -1.0
+    assert np.array_equal( data[p1:-p1,p2:-p2].reshape(-1)[1:], 2.0*xa.reshape(-1)[1:] )
+
+    # Arithmetic with numpy scalars returns StencilVector
+    y = np.float64( 3.0 ) * x
+    assert isinstance( y, StencilVector )
+
+    # Buffer-like object
+    z = StencilVector.from_buffer( V, memoryview( data ), ghost_regions_in_sync=True )
+    assert np.shares_memory( z.data, data )
+    assert z.ghost_regions_in_sync
+
+    # Wrong shape, type or memory layout
+    with pytest.raises( AssertionError ):
+        StencilVector.from_buffer( V, np.zeros( (n1,n2) ) )
+    with pytest.raises( AssertionError ):
+        StencilVector.from_buffer( V, data.astype( np.float32 ) )
+    if n1+2*p1 > 1 and n2+2*p2 > 1:
+        with pytest.raises( AssertionError ):
+            StencilVector.from_buffer( V, np.asfortranarray( data ) )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [2,7] )
+@pytest.mark.parametrize( 'n2', [3,5] )
+@pytest.mark.parametrize( 'p1', [1,2] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'nvec', [1,3] )
+
+def test_stencil_multivector_2d_serial( n1, n2, p1, p2, nvec, P1=True, P2=False ):
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    X = StencilMultiVector( V, nvec )
+    Y = StencilMultiVector( V, nvec )
+
+    assert X.space is V
+    assert X.nvec  == nvec
+    assert X._data.shape == (n1+2*p1, n2+2*p2, nvec)
+
+    X[0:n1,0:n2,:] = np.random.random( (n1,n2,nvec) )
+    Y[0:n1,0:n2,:] = np.random.random( (n1,n2,nvec) )
+    X.update_ghost_regions()
+    Y.update_ghost_regions()
+
+    xs = [X.get_vector( j ) for j in range( nvec )]
+    ys = [Y.get_vector( j ) for j in range( nvec )]
+
+    # Ghost regions are the same as for single vectors
+    for j,x in enumerate( xs ):
+        z = x.copy()
+        z.update_ghost_regions()
+        assert np.all( z._data == X._data[...,j] )
+
+    # Batched inner products
+    assert np.allclose( X.dot( Y ), [x.dot( y ) for x,y in zip( xs, ys )], rtol=1e-14, atol=1e-14 )
+
+    # Batched matrix-vector product, with full and symmetric matrices
+    M = StencilMatrix( V, V )
+    S = SymmetricStencilMatrix( V, V )
+    M._data[...] = np.random.random( M._data.shape )
+    for k1 in range(0,p1+1):
+        for k2 in range(-p2 if k1 > 0 else 0,p2+1):
+            S[:,:,k1,k2] = 1.0 + 0.1*k1 + 0.01*abs( k2 )
+    S.remove_spurious_entries()
+
+    for A in [M, S]:
+        X.ghost_regions_in_sync = False
+        Z = A.dot( X )
+        assert isinstance( Z, StencilMultiVector )
+        assert not Z.ghost_regions_in_sync
+        for j,x in enumerate( xs ):
+            assert np.allclose( Z.get_vector( j ).toarray(), A.dot( x ).toarray(), rtol=1e-13, atol=1e-13 )
+
+    # Set single vector
+    W = X.copy()
+    W.set_vector( 0, ys[0] )
+    assert np.all( W[0:n1,0:n2,0] == Y[0:n1,0:n2,0] )
+    assert np.all( X[0:n1,0:n2,0] == xs[0][0:n1,0:n2] )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [4,7] )
+@pytest.mark.parametrize( 'n2', [5,8] )
+@pytest.mark.parametrize( 'p1', [1,2] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+
+def test_stencil_vector_2d_serial_accumulate( n1, n2, p1, p2, P1, P2 ):
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    x = StencilVector( V )
+
+    # Contributions to all entries, including ghost regions
+    x._data[:] = np.random.random( x._data.shape )
+
+    xg = np.zeros( (n1,n2) )
+    add_padded_to_global( x._data, V.starts, V.pads, V.npts, V.periods, xg )
+
+    x.accumulate_ghost_regions()
+
+    assert not x.ghost_regions_in_sync
+    assert np.allclose( x.toarray().reshape( n1,n2 ), xg, rtol=1e-14, atol=1e-14 )
+    assert np.all( x._data[:p1,:] == 0 ) and np.all( x._data[-p1:,:] == 0 )
+    assert np.all( x._data[:,:p2] == 0 ) and np.all( x._data[:,-p2:] == 0 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [4,7] )
+@pytest.mark.parametrize( 'n2', [5,8] )
+@pytest.mark.parametrize( 'p1', [1,2] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'slab_size', [2**20, 7] )
+
+def test_stencil_vector_2d_serial_memmap( n1, n2, p1, p2, P1, slab_size, tmp_path, monkeypatch, P2=False ):
+
+    from spl.linalg import stencil
+
+    # Small slabs: loops over several slabs along x1
+    monkeypatch.setattr( stencil, '_slab_size', slab_size )
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    M = StencilMatrix( V, V )
+    M._data[:] = np.random.random( M._data.shape )
+    M.remove_spurious_entries()
+
+    # New file: all components equal to zero
+    x = V.memmap( str( tmp_path / 'x.dat' ) )
+    assert isinstance( x._data, np.memmap )
+    assert x.space is V
+    assert x.ghost_regions_in_sync
+    assert np.all( x._data == 0 )
+
+    xa = np.random.random( (n1,n2) )
+    x[0:n1,0:n2] = xa
+    x.update_ghost_regions()
+    x._data.flush()
+
+    # Reference vector in memory
+    y = StencilVector( V )
+    y[0:n1,0:n2] = xa
+    y.update_ghost_regions()
+
+    assert np.array_equal( x.toarray(), y.toarray() )
+    assert np.isclose( x.dot( x ), y.dot( y ), rtol=1e-14, atol=1e-14 )
+
+    # Matrix-vector product with output stored on disk
+    z = M.dot( x, out=V.memmap( str( tmp_path / 'z.dat' ) ) )
+    assert isinstance( z._data, np.memmap )
+    assert np.allclose( z.toarray(), M.toarray().dot( xa.reshape(-1) ), rtol=1e-13, atol=1e-13 )
+
+    # Existing read-only file: same data, stored ghost regions are trusted
+    w = V.memmap( str( tmp_path / 'x.dat' ), mode='r' )
+    assert not w._data.flags.writeable
+    assert w.ghost_regions_in_sync
+    assert np.array_equal( w._data, x._data )
+
+    # Matrix-vector product with read-only input
+    u = M.dot( w )
+    assert np.allclose( u.toarray(), z.toarray(), rtol=1e-13, atol=1e-13 )
+    assert np.array_equal( w._data, x._data )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [4,7] )
+@pytest.mark.parametrize( 'n2', [5,8] )
+@pytest.mark.parametrize( 'p1', [1,2] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+
+def test_stencil_vector_2d_serial_memmap_hdf5( n1, n2, p1, p2, tmp_path, P1=True, P2=False ):
+
+    h5py = pytest.importorskip( 'h5py' )
+
+    V = StencilVectorSpace( [n1,n2], [p1,p2], [P1,P2] )
+    x = StencilVector( V )
+    x[0:n1,0:n2] = np.random.random( (n1,n2) )
+    x.update_ghost_regions()
+
+    # Contiguous dataset with shape of padded array
+    filename = str( tmp_path / 'x.h5' )
+    with h5py.File( filename, mode='w' ) as h5:
+        dset   = h5.create_dataset( 'x', data=x._data )
+        offset = dset.id.get_offset()
+
+    # Zero-copy view of dataset
+    y = V.memmap( filename, mode='r', offset=offset )
+
+    assert np.array_equal( y._data, x._data )
+    assert y.dot( x ) == x.dot( x )
+
 #===============================================================================
 # PARALLEL TESTS
 #===============================================================================
@@ -166,6 +547,56 @@ def test_stencil_vector_2d_parallel_init( n1, n2, p1, p2, P1=True, P2=False ):
     assert x.ends   == V.ends
     assert np.all( x[:,:] == 0.0 )
 
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,23] )
+@pytest.mark.parametrize( 'n2', [8,25] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,3] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+@pytest.mark.parallel
+
+def test_stencil_vector_2d_parallel_from_buffer( n1, n2, p1, p2, P1, P2 ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2],
+                 pads    = [p1,p2],
+                 periods = [P1,P2],
+                 reorder = False,
+                 comm    = comm )
+
+    V = StencilVectorSpace( cart )
+
+    s1,s2 = V.starts
+    e1,e2 = V.ends
+
+    xg = np.random.RandomState( 0 ).random_sample( (n1,n2) )
+
+    # External array with local padded layout
+    data = np.zeros( (e1-s1+1+2*p1, e2-s2+1+2*p2) )
+    data[p1:-p1,p2:-p2] = xg[s1:e1+1,s2:e2+1]
+
+    x = StencilVector.from_buffer( V, data )
+    x.update_ghost_regions()
+
+    # Owned region is the local block, without copies
+    assert np.shares_memory( np.asarray( x ), data )
+    assert np.array_equal( np.asarray( x ), xg[s1:e1+1,s2:e2+1] )
+    assert np.isclose( x.dot( x ), np.sum( xg**2 ), rtol=1e-14, atol=1e-14 )
+
+    # Ghost regions of external array are updated
+    y = StencilVector( V )
+    y[s1:e1+1,s2:e2+1] = xg[s1:e1+1,s2:e2+1]
+    y.update_ghost_regions()
+    assert np.array_equal( data, y._data )
+
+    # Fortran-ordered array is not compatible with ghost region exchange
+    with pytest.raises( AssertionError ):
+        StencilVector.from_buffer( V, np.asfortranarray( data ) )
+
 #===============================================================================
 @pytest.mark.parametrize( 'n1', [20,67] )
 @pytest.mark.parametrize( 'n2', [23,65] )
@@ -264,6 +695,287 @@ def test_stencil_vector_2d_parallel_dot( n1, n2, p1, p2, P1, P2 ):
     assert res1 == res_ex
     assert res2 == res_ex
 
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,23] )
+@pytest.mark.parametrize( 'n2', [8,25] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+@pytest.mark.parametrize( 'exchange', ['shift', 'neighbor'] )
+@pytest.mark.parallel
+
+def test_stencil_vector_2d_parallel_start_finish_update( n1, n2, p1, p2, P1, P2, exchange ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2],
+                 pads    = [p1,p2],
+                 periods = [P1,P2],
+                 reorder = False,
+                 comm    = comm )
+
+    V = StencilVectorSpace( cart )
+    W = StencilVectorSpace( cart, exchange=exchange )
+    x = StencilVector( V )
+    y = StencilVector( W )
+
+    for i1 in range( V.starts[0], V.ends[0]+1 ):
+        for i2 in range( V.starts[1], V.ends[1]+1 ):
+            x[i1,i2] = 100*i1 + i2
+            y[i1,i2] = 100*i1 + i2
+
+    # Blocking update (reference)
+    x.update_ghost_regions()
+
+    # Split-phase update
+    y.ghost_regions_in_sync = False
+    y.start_update_ghost_regions()
+    y._progress_ghost_regions()
+    y.finish_update_ghost_regions()
+
+    assert y.ghost_regions_in_sync
+    assert np.all( x._data == y._data )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,23] )
+@pytest.mark.parametrize( 'n2', [8,25] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+@pytest.mark.parametrize( 'exchange', ['shift', 'neighbor'] )
+@pytest.mark.parallel
+
+def test_stencil_vector_2d_parallel_stale_direction_update( n1, n2, p1, p2, P1, P2, exchange ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2],
+                 pads    = [p1,p2],
+                 periods = [P1,P2],
+                 reorder = False,
+                 comm    = comm )
+
+    V = StencilVectorSpace( cart, exchange=exchange )
+    x = StencilVector( V )
+
+    s1, s2 = V.starts
+    e1, e2 = V.ends
+
+    for i1 in range( s1, e1+1 ):
+        for i2 in range( s2, e2+1 ):
+            x[i1,i2] = 100*i1 + i2
+    x.update_ghost_regions()
+
+    # Modify elements which are only needed by the neighbors along direction 0
+    for i1 in [*range( s1, s1+p1 ), *range( e1-p1+1, e1+1 )]:
+        for i2 in range( s2+p2, e2-p2+1 ):
+            x[i1,i2] = -x[i1,i2]
+    x.ghost_regions_sync = (False, True)
+
+    # Reference: full update
+    y = x.copy()
+    y.update_ghost_regions()
+
+    # Only direction 0 is exchanged
+    x.start_update_ghost_regions( directions=[0] )
+    x._progress_ghost_regions()
+    x.finish_update_ghost_regions()
+
+    assert x.ghost_regions_in_sync
+    assert np.all( x._data == y._data )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,23] )
+@pytest.mark.parametrize( 'n2', [8,25] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+@pytest.mark.parallel
+
+def test_stencil_vector_2d_parallel_persistent_update( n1, n2, p1, p2, P1, P2 ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2],
+                 pads    = [p1,p2],
+                 periods = [P1,P2],
+                 reorder = False,
+                 comm    = comm )
+
+    V = StencilVectorSpace( cart )
+    x = StencilVector( V )
+
+    s1, s2 = V.starts
+    e1, e2 = V.ends
+
+    for k in range( 3 ):
+
+        # New values at each iteration
+        xg = np.random.RandomState( k ).random_sample( (n1,n2) )
+        x[s1:e1+1,s2:e2+1] = xg[s1:e1+1,s2:e2+1]
+        x.update_ghost_regions()
+
+        # Persistent requests are created only once
+        if k == 0:
+            requests = x._persistent_requests
+        assert x._persistent_requests is requests
+
+        # Compare to ghost regions of a new vector
+        y = StencilVector( V )
+        y[s1:e1+1,s2:e2+1] = xg[s1:e1+1,s2:e2+1]
+        y.update_ghost_regions()
+
+        assert np.all( x._data == y._data )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,13] )
+@pytest.mark.parametrize( 'n2', [9] )
+@pytest.mark.parametrize( 'n3', [7,10] )
+@pytest.mark.parametrize( 'p1', [1,2] )
+@pytest.mark.parametrize( 'p2', [2] )
+@pytest.mark.parametrize( 'p3', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+@pytest.mark.parametrize( 'P3', [True, False] )
+@pytest.mark.parallel
+
+def test_stencil_vector_3d_parallel_neighbor_update( n1, n2, n3, p1, p2, p3, P1, P2, P3 ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2,n3],
+                 pads    = [p1,p2,p3],
+                 periods = [P1,P2,P3],
+                 reorder = False,
+                 comm    = comm )
+
+    V = StencilVectorSpace( cart, exchange='shift'    )
+    W = StencilVectorSpace( cart, exchange='neighbor' )
+    x = StencilVector( V )
+    y = StencilVector( W )
+
+    s1, s2, s3 = V.starts
+    e1, e2, e3 = V.ends
+
+    xg = np.random.RandomState( 0 ).random_sample( (n1,n2,n3) )
+    x[s1:e1+1,s2:e2+1,s3:e3+1] = xg[s1:e1+1,s2:e2+1,s3:e3+1]
+    y[s1:e1+1,s2:e2+1,s3:e3+1] = xg[s1:e1+1,s2:e2+1,s3:e3+1]
+
+    # Same ghost regions (including corners) with both exchange engines
+    x.update_ghost_regions()
+    y.update_ghost_regions()
+
+    assert W.exchange == 'neighbor'
+    assert np.all( x._data == y._data )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,23] )
+@pytest.mark.parametrize( 'n2', [8,25] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+@pytest.mark.parallel
+
+def test_stencil_multivector_2d_parallel( n1, n2, p1, p2, P1, P2, nvec=3 ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2],
+                 pads    = [p1,p2],
+                 periods = [P1,P2],
+                 reorder = False,
+                 comm    = comm )
+
+    V = StencilVectorSpace( cart )
+    X = StencilMultiVector( V, nvec )
+    M = StencilMatrix( V, V )
+
+    s1,s2 = V.starts
+    e1,e2 = V.ends
+
+    xg = np.random.RandomState( 0 ).random_sample( (n1,n2,nvec) )
+    X[s1:e1+1,s2:e2+1,:] = xg[s1:e1+1,s2:e2+1,:]
+    X.ghost_regions_in_sync = False
+
+    M._data[...] = np.random.RandomState( comm.rank ).random_sample( M._data.shape )
+    M.remove_spurious_entries()
+
+    # Batched product: ghost regions of all vectors are updated at once
+    Y = M.dot( X )
+    assert X.ghost_regions_in_sync
+
+    for j in range( nvec ):
+        x = StencilVector( V )
+        x[s1:e1+1,s2:e2+1] = xg[s1:e1+1,s2:e2+1,j]
+        x.update_ghost_regions()
+
+        assert np.all( X._data[...,j] == x._data )
+        assert np.allclose( Y[s1:e1+1,s2:e2+1,j], M.dot( x )[s1:e1+1,s2:e2+1], rtol=1e-13, atol=1e-13 )
+
+    # Batched inner products (global)
+    res = X.dot( X )
+    assert np.allclose( res, np.sum( xg**2, axis=(0,1) ), rtol=1e-13, atol=1e-13 )
+
+#===============================================================================
+@pytest.mark.parametrize( 'n1', [8,23] )
+@pytest.mark.parametrize( 'n2', [8,25] )
+@pytest.mark.parametrize( 'p1', [1,3] )
+@pytest.mark.parametrize( 'p2', [1,2] )
+@pytest.mark.parametrize( 'P1', [True, False] )
+@pytest.mark.parametrize( 'P2', [True, False] )
+@pytest.mark.parallel
+
+def test_stencil_vector_2d_parallel_accumulate( n1, n2, p1, p2, P1, P2 ):
+
+    from mpi4py       import MPI
+    from spl.ddm.cart import Cart
+
+    comm = MPI.COMM_WORLD
+    cart = Cart( npts    = [n1,n2],
+                 pads    = [p1,p2],
+                 periods = [P1,P2],
+                 reorder = False,
+                 comm    = comm )
+
+    V = StencilVectorSpace( cart )
+    x = StencilVector( V )
+
+    s1, s2 = V.starts
+    e1, e2 = V.ends
+
+    # Each process contributes to its owned entries and to its ghost regions
+    x._data[:] = np.random.RandomState( comm.rank ).random_sample( x._data.shape )
+
+    # Reference: sum of contributions from all processes
+    xg = np.zeros( (n1,n2) )
+    add_padded_to_global( x._data, V.starts, V.pads, V.npts, V.periods, xg )
+    comm.Allreduce( MPI.IN_PLACE, xg, op=MPI.SUM )
+
+    x.accumulate_ghost_regions()
+    assert not x.ghost_regions_in_sync
+    assert np.allclose( x[s1:e1+1,s2:e2+1], xg[s1:e1+1,s2:e2+1], rtol=1e-14, atol=1e-14 )
+
+    # Ghost regions are filled with the accumulated values by a normal update
+    y = StencilVector( V )
+    y[s1:e1+1,s2:e2+1] = xg[s1:e1+1,s2:e2+1]
+    y.update_ghost_regions()
+    x.update_ghost_regions()
+    assert np.allclose( x._data, y._data, rtol=1e-14, atol=1e-14 )
+
 #===============================================================================
 if __name__ == "__main__":
     import sys
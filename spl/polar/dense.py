@@ -3,7 +3,8 @@
 # Copyright 2018 Yaman Güçlü
 
 import numpy as np
-from scipy.sparse import coo_matrix
+from scipy.sparse      import coo_matrix
+from scipy.linalg.blas import get_blas_funcs
 
 from spl.linalg.basic import VectorSpace, Vector, LinearOperator
 
@@ -46,6 +47,11 @@ class DenseVectorSpace( VectorSpace ):
     #-------------------------------------
     # Other properties/methods
     #-------------------------------------
+    def empty( self ):
+        data = np.empty( self.dimension, dtype=self.dtype )
+        return DenseVector( self, data )
+
+    # ...
     @property
     def dtype( self ):
         return self._dtype
@@ -79,8 +85,13 @@ class DenseVector( Vector ):
         return np.dot( self._data, v._data )
 
     # ...
-    def copy( self ):
-        return DenseVector( self._space, self._data.copy() )
+    def copy( self, out=None ):
+        if out is None:
+            return DenseVector( self._space, self._data.copy() )
+        assert isinstance( out, DenseVector )
+        assert out._space is self._space
+        np.copyto( out._data, self._data )
+        return out
 
     # ...
     def __mul__( self, a ):
@@ -121,6 +132,23 @@ class DenseVector( Vector ):
         self._data -= v._data
         return self
 
+    # ...
+    def scale( self, a ):
+        self._data *= a
+        return self
+
+    # ...
+    def axpy( self, a, x ):
+        assert isinstance( x, DenseVector )
+        assert x._space is self._space
+        y = self._data
+        if y.dtype.char in 'fdFD' and y.flags.c_contiguous:
+            axpy = get_blas_funcs( 'axpy', (y,) )
+            axpy( x._data, y, a=a )
+        else:
+            y += a * x._data
+        return self
+
     #-------------------------------------
     # Other properties/methods
     #-------------------------------------